@@ -0,0 +1,139 @@
+import asyncio
+from pyrogram.errors import FloodWait
+import config
+import db as db_module
+from forwarder import ForwardEngine
+from ratelimit import rate_limiter
+from realtime import fan_out, sessions, user_client
+
+backfill_tasks = {}  # (user_id, source_id) -> asyncio.Task
+
+
+async def backfill_source(
+    client,
+    engine: ForwardEngine,
+    user_id: int,
+    source_id: int,
+    target_ids: list,
+    from_id: int = 0,
+    to_id: int = 0,
+) -> dict:
+    """Copy a source's history into its targets, oldest first.
+
+    Each page is fetched once and fanned out to every target through the same
+    dedup, filter and forward engine as realtime updates. After each page the
+    checkpoint of every target moves up to its first message that was not
+    delivered (only this run's jobs are awaited, not the whole engine), so a
+    run without from_id resumes where the least advanced target stopped.
+
+    The run ends early, with ``stopped`` set in the stats, once the engine is
+    stopped (e.g. /realtime off on the session it shares).
+    """
+    if not to_id:
+        to_id = await _latest_message_id(client, source_id)
+
+    start = from_id
+    if not start:
+        starts = []
+        for target_id in target_ids:
+            checkpoint = await db_module.get_backfill_checkpoint(user_id, source_id, target_id)
+            starts.append(checkpoint["last_message_id"] + 1 if checkpoint else 1)
+        start = min(starts, default=1)
+
+    stats = {
+        "from_id": start,
+        "to_id": to_id,
+        "scanned": 0,
+        "queued": 0,
+        "failed": 0,
+        "stopped": False,
+    }
+    page_size = config.BACKFILL_PAGE_SIZE
+    stuck = set()  # targets with an undelivered message; their checkpoint stays
+
+    for page_start in range(start, to_id + 1, page_size):
+        if engine.stopped():
+            stats["stopped"] = True
+            break
+        page_end = min(page_start + page_size, to_id + 1)
+        messages = await _fetch_page(
+            client, user_id, source_id, list(range(page_start, page_end))
+        )
+
+        jobs = []
+        for msg in messages:
+            if msg.empty or msg.service:
+                continue
+            stats["scanned"] += 1
+            jobs.extend(await fan_out(engine, source_id, target_ids, msg, user_id))
+        stats["queued"] += len(jobs)
+
+        # Checkpoint only what was delivered
+        first_failed = {}
+        for job in jobs:
+            if not await job.done:
+                stats["failed"] += 1
+                first_failed.setdefault(job.target_id, job.message.id)
+        for target_id in target_ids:
+            if target_id in stuck:
+                continue
+            last_id = page_end - 1
+            if target_id in first_failed:
+                stuck.add(target_id)
+                last_id = first_failed[target_id] - 1
+            await db_module.save_backfill_checkpoint(
+                user_id, source_id, target_id, last_id, to_id
+            )
+
+    return stats
+
+
+async def run_backfill(
+    user_id: int, source_id: int, target_ids: list, from_id: int = 0, to_id: int = 0
+) -> dict:
+    """Backfill through the user's realtime session, or a temporary client."""
+    session = sessions.get(user_id)
+    if session:
+        return await backfill_source(
+            session.client, session.engine, user_id, source_id, target_ids, from_id, to_id
+        )
+
+    user_data = await db_module.get_user(user_id)
+    async with user_client(user_id, user_data["session_string"], "backfill") as client:
+        engine = ForwardEngine(client)
+        engine.start()
+        try:
+            return await backfill_source(
+                client, engine, user_id, source_id, target_ids, from_id, to_id
+            )
+        finally:
+            await engine.stop()
+
+
+async def stop_all_backfills():
+    """Cancel running backfills on shutdown and wait until their engines and
+    temporary clients are closed."""
+    tasks = list(backfill_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _latest_message_id(client, source_id: int) -> int:
+    async for msg in client.get_chat_history(source_id, limit=1):
+        return msg.id
+    return 0
+
+
+async def _fetch_page(client, user_id: int, source_id: int, message_ids: list) -> list:
+    while True:
+        # Respect a FloodWait the account got while forwarding, and share ours
+        pause = rate_limiter.client_delay(user_id)
+        if pause > 0:
+            await asyncio.sleep(pause)
+        try:
+            return await client.get_messages(source_id, message_ids)
+        except FloodWait as e:
+            wait = max(e.value, config.FLOOD_WAIT_DELAY)
+            print(f"⏳ FloodWait {wait}s for {client.name}")
+            rate_limiter.pause_client(user_id, wait)
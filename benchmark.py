@@ -0,0 +1,112 @@
+"""Micro-benchmark of the SQLite forward hot path under each PRAGMA setting.
+
+Usage: python benchmark.py [rows]
+
+Runs the filter lookup, dedup check, forwarded-message upserts and the
+log → DB sync (sync.sync_pending over `rows` logged entries) against a
+throwaway database once per variant: WAL only, each PRAGMA of the
+"performance" profile on its own, then the full "safe" and "performance"
+profiles.
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import config
+import db as db_module
+import logger
+import sync
+from filters import FilterConfig, _filter_cache
+
+USER_ID, SOURCE, TARGET = 1, -1001, -1002
+
+
+def _variants() -> list:
+    performance = db_module.SQLITE_PROFILES["performance"]
+    variants = [("wal only", {})]
+    for name, value in performance.items():
+        variants.append((f"{name}={value}", {name: value}))
+    variants.append(("profile: safe", db_module.SQLITE_PROFILES["safe"]))
+    variants.append(("profile: performance", performance))
+    return variants
+
+
+async def _timed(count: int, coro_fn) -> float:
+    """Microseconds per call of coro_fn(i) over count calls."""
+    start = time.perf_counter()
+    for i in range(count):
+        await coro_fn(i)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+async def _run(rows: int) -> dict:
+    await db_module.upsert_forwarded_messages(
+        (
+            {"user_id": USER_ID, "source": SOURCE, "target": TARGET, "message_id": i,
+             "forwarded_at": "2026-01-01T00:00:00", "media_type": "video"}
+            for i in range(rows)
+        ),
+        chunk_size=config.SYNC_BATCH_SIZE,
+    )
+    await FilterConfig(user_id=USER_ID, source_chat_id=SOURCE).save()
+    lookups = min(rows, 2000)
+
+    async def filter_lookup(i):
+        _filter_cache.clear()  # measure the DB, not the cache
+        await FilterConfig.get(USER_ID, SOURCE)
+
+    async def dedup_check(i):
+        await db_module.was_forwarded(USER_ID, SOURCE, TARGET, i * 7 % rows)
+
+    async def single_upsert(i):
+        await db_module.upsert_forwarded_message(
+            USER_ID, SOURCE, TARGET, rows + i, forwarded_at="2026-01-02T00:00:00"
+        )
+
+    start = time.perf_counter()
+    await db_module.upsert_forwarded_messages(
+        (
+            {"user_id": USER_ID, "source": SOURCE, "target": TARGET, "message_id": rows * 2 + i}
+            for i in range(rows)
+        ),
+        chunk_size=config.SYNC_BATCH_SIZE,
+    )
+    bulk = rows / (time.perf_counter() - start)
+
+    for i in range(rows):
+        await logger.log_message(USER_ID, SOURCE, TARGET, rows * 3 + i, "video")
+    start = time.perf_counter()
+    synced = await sync.sync_pending()
+    sync_rate = synced / (time.perf_counter() - start)
+
+    return {
+        "filter µs": await _timed(lookups, filter_lookup),
+        "dedup µs": await _timed(lookups, dedup_check),
+        "upsert µs": await _timed(min(rows, 500), single_upsert),
+        "bulk rows/s": bulk,
+        "sync rows/s": sync_rate,
+    }
+
+
+async def main(rows: int):
+    columns = ["filter µs", "dedup µs", "upsert µs", "bulk rows/s", "sync rows/s"]
+    print(f"{'variant':<28}" + "".join(f"{c:>14}" for c in columns))
+    for label, pragmas in _variants():
+        with tempfile.TemporaryDirectory() as tmp:
+            config.SQLITE_PATH = os.path.join(tmp, "bench.db")
+            logger.LOG_DIR = os.path.join(tmp, "log")
+            db_module.SQLITE_PROFILES["bench"] = pragmas
+            config.SQLITE_PROFILE = "bench"
+            try:
+                result = await _run(rows)
+            finally:
+                await db_module.close_db()
+                if logger._writer:
+                    logger._writer.close()
+                    logger._writer = None
+        print(f"{label:<28}" + "".join(f"{result[c]:>14,.1f}" for c in columns))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000))
@@ -1,8 +1,7 @@
 import os
 import asyncio
 import aiofiles
-from pyrogram import Client, filters
-from pyrogram.errors import FloodWait
+from pyrogram import Client, filters, idle
 from pyrogram.types import Message
 import config
 import db as db_module
@@ -16,8 +15,6 @@ bot = Client(
 )
 
 ADMIN_IDS = config.ADMIN_IDS
-user_clients = {}  # Store user client sessions
-realtime_running = {}
 
 
 def is_admin(user_id):
@@ -31,12 +28,15 @@ async def get_adminonly():
 
 # Import modules
 from filters import FilterConfig, MediaType, SourceConfig, TargetConfig
-from logger import log_message
-from sync import is_message_forwarded, get_forwarded_message_ids
+from realtime import realtime_running, start_realtime_forward, stop_all_sessions
+from backfill import backfill_tasks, run_backfill, stop_all_backfills
+from sync import start_sync_task, stop_sync_task
 from menu import (
     build_main_menu_keyboard,
     build_filter_keyboard,
     handle_callback,
+    keyboard_cache_stats,
+    router as callback_router,
 )
 
 # ============ HELP COMMAND ============
@@ -56,17 +56,20 @@ async def help_command(client, message):
 • `/targets` - Danh sách target
 
 **📨 Source Management:**
-• `/addsource [source_id]` - Thêm source vào target hiện tại
-• `/removesource [source_id]` - Xóa source
+• `/addsource [source_id] [target_id ...]` - Thêm source vào một hoặc nhiều target
+• `/removesource [source_id] [target_id]` - Xóa source (hoặc chỉ khỏi một target)
 • `/list` - Danh sách sources
 
 **⚡ Realtime:**
 • `/realtime on` - Bật realtime
 • `/realtime off` - Tắt realtime
+• `/backfill [source_id] [from_id] [to_id]` - Forward lịch sử cũ (tự tiếp tục từ checkpoint)
 
 **⚙️ Filter:**
 • `/config [source_id]` - Cấu hình filter
 • `/default [min]_[max]` - Duration mặc định
+• `/bulkset [target_id|all] [field]=[value]` - Sửa filter mọi nguồn của target
+• `/routefilter [source_id] [target_id] [field]=[value]|reset` - Filter riêng cho một cặp source ➔ target
 • `/menu` - Menu inline
 
 **📊 Stats:**
@@ -74,6 +77,8 @@ async def help_command(client, message):
 
 **🔧 Admin:**
 • `/adminonly` - Toggle admin only
+• `/rebuildstats` - Tính lại bảng thống kê
+• `/vacuum` - VACUUM database một lần (bật incremental auto_vacuum)
 """
     await message.reply(help_text, parse_mode="markdown")
 
@@ -162,7 +167,7 @@ async def list_targets(client, message):
     if await get_adminonly() and not is_admin(message.from_user.id):
         return await message.reply("❌ Bạn không có quyền.")
 
-    targets = await TargetConfig.get_all(message.from_user.id)
+    targets = await TargetConfig.get_all_with_sources(message.from_user.id)
 
     if not targets:
         return await message.reply(
@@ -170,9 +175,8 @@ async def list_targets(client, message):
         )
 
     text = "📂 **Danh sách Target:**\n\n"
-    for target in targets:
-        sources = await target.get_sources()
-        enabled = sum(1 for s in sources if s.enabled)
+    for target, sources in targets:
+        enabled = sum(1 for s, _ in sources if s.enabled)
         status = "🟢" if target.enabled else "🔴"
         text += f"{status} `{target.target_chat_id}` - {target.name}\n"
         text += f"   └── {len(sources)} sources ({enabled} 🟢)\n\n"
@@ -199,39 +203,46 @@ async def add_source(client, message):
 
     try:
         source_id = int(message.command[1])
+        target_ids = [int(arg) for arg in message.command[2:]]
     except (IndexError, ValueError):
-        return await message.reply("❗ Dùng: /addsource [source_id]")
-
-    # If multiple targets, ask which one to use
-    if len(targets) == 1:
-        target_id = targets[0].target_chat_id
-    else:
-        # Show list of targets for user to choose
-        text = "Chọn target để thêm source:\n\n"
-        for i, t in enumerate(targets):
-            text += f"/selecttarget_{i} - {t.name or t.target_chat_id}\n"
-        await message.reply(text)
-        return
-
-    source_config = SourceConfig(
-        user_id=message.from_user.id,
-        source_chat_id=source_id,
-        target_chat_id=target_id,
-        enabled=True,
-    )
-    await source_config.save()
+        return await message.reply("❗ Dùng: /addsource [source_id] [target_id ...]")
+
+    known = {t.target_chat_id for t in targets}
+    if not target_ids and len(targets) == 1:
+        target_ids = [targets[0].target_chat_id]
+    if not target_ids or not known.issuperset(target_ids):
+        # Several targets (or an unknown one): ask which ones to use
+        text = "❗ Dùng: /addsource [source_id] [target_id ...]\n\nTarget:\n"
+        for t in targets:
+            text += f"• `{t.target_chat_id}` - {t.name}\n"
+        return await message.reply(text, parse_mode="markdown")
+
+    is_new = await SourceConfig.get(message.from_user.id, source_id) is None
+    for target_id in target_ids:
+        source_config = SourceConfig(
+            user_id=message.from_user.id,
+            source_chat_id=source_id,
+            target_chat_id=target_id,
+            enabled=True,
+        )
+        await source_config.save()
+
+    # Create default filter, shared by all targets of the source
+    if is_new:
+        filter_config = FilterConfig(
+            user_id=message.from_user.id,
+            source_chat_id=source_id,
+            media_types=[MediaType.VIDEO],
+            min_duration=60,
+            enabled=True,
+        )
+        await filter_config.save()
 
-    # Create default filter
-    filter_config = FilterConfig(
-        user_id=message.from_user.id,
-        source_chat_id=source_id,
-        media_types=[MediaType.VIDEO],
-        min_duration=60,
-        enabled=True,
+    await message.reply(
+        f"✅ Đã thêm source: `{source_id}` ➔ "
+        + ", ".join(f"`{target_id}`" for target_id in target_ids),
+        parse_mode="markdown",
     )
-    await filter_config.save()
-
-    await message.reply(f"✅ Đã thêm source: `{source_id}` ➔ `{target_id}`")
 
 
 # ============ REMOVE SOURCE ============
@@ -244,11 +255,15 @@ async def remove_source(client, message):
 
     try:
         source_id = int(message.command[1])
+        target_id = int(message.command[2]) if len(message.command) > 2 else None
     except (IndexError, ValueError):
-        return await message.reply("❗ Dùng: /removesource [source_id]")
+        return await message.reply("❗ Dùng: /removesource [source_id] [target_id]")
 
-    await SourceConfig.delete(message.from_user.id, source_id)
-    await message.reply(f"✅ Đã xóa source `{source_id}`")
+    await SourceConfig.delete(message.from_user.id, source_id, target_id)
+    if target_id is None:
+        await message.reply(f"✅ Đã xóa source `{source_id}`")
+    else:
+        await message.reply(f"✅ Đã xóa source `{source_id}` khỏi target `{target_id}`")
 
 
 # ============ LIST SOURCES ============
@@ -259,16 +274,15 @@ async def list_sources(client, message):
     if await get_adminonly() and not is_admin(message.from_user.id):
         return await message.reply("❌ Bạn không có quyền.")
 
-    targets = await TargetConfig.get_all(message.from_user.id)
+    targets = await TargetConfig.get_all_with_sources(message.from_user.id)
 
     if not targets:
         return await message.reply("📋 Chưa có target nào.")
 
     text = "📋 **Danh sách:**\n\n"
-    for target in targets:
-        sources = await target.get_sources()
+    for target, sources in targets:
         text += f"📂 `{target.target_chat_id}` - {target.name}\n"
-        for src in sources:
+        for src, _ in sources:
             status = "🟢" if src.enabled else "🔴"
             text += f"   {status} {src.source_chat_id}\n"
         text += "\n"
@@ -316,6 +330,122 @@ async def menu_command(client, message):
     )
 
 
+# ============ BULK FILTER UPDATE ============
+
+_BULK_INT_FIELDS = ("min_duration", "max_duration", "min_file_size", "max_file_size")
+_BULK_BOOL_FIELDS = (
+    "enabled",
+    "remove_caption",
+    "remove_forward_header",
+    "require_caption",
+    "require_hashtags",
+)
+_BULK_LIST_FIELDS = ("dc_ids", "block_list", "only_from_users", "block_from_users")
+_BULK_ALIASES = {"media": "media_types", "block": "block_list"}
+
+
+def _parse_bulk_field(assignment: str) -> tuple:
+    """Parse `field=value` from /bulkset into (field, python value)."""
+    name, sep, raw = assignment.partition("=")
+    name = _BULK_ALIASES.get(name.lower(), name.lower())
+    if not sep:
+        raise ValueError(assignment)
+    if name == "media_types":
+        return name, [MediaType(m.strip().lower()) for m in raw.split(",") if m.strip()]
+    if name in _BULK_INT_FIELDS:
+        return name, None if raw.lower() in ("", "none", "∞") else int(raw)
+    if name in _BULK_BOOL_FIELDS:
+        if raw.lower() not in ("on", "off", "true", "false", "1", "0"):
+            raise ValueError(assignment)
+        return name, raw.lower() in ("on", "true", "1")
+    if name in _BULK_LIST_FIELDS:
+        items = [item.strip() for item in raw.split(",") if item.strip()]
+        return name, items if name == "block_list" else [int(i) for i in items]
+    raise ValueError(assignment)
+
+
+@bot.on_message(filters.command("bulkset"))
+async def bulk_set(client, message):
+    if await get_adminonly() and not is_admin(message.from_user.id):
+        return await message.reply("❌ Bạn không có quyền.")
+
+    usage = (
+        "❗ Dùng: /bulkset [target_id|all] [field]=[value] ...\n"
+        "Ví dụ: /bulkset -100123456789 media=video,photo min_duration=30 remove_caption=on\n"
+        "Field: media, min_duration, max_duration, min_file_size, max_file_size, "
+        "enabled, remove_caption, remove_forward_header, require_caption, "
+        "require_hashtags, block, dc_ids, only_from_users, block_from_users"
+    )
+    try:
+        scope = message.command[1]
+        target_id = None if scope.lower() == "all" else int(scope)
+        fields = dict(_parse_bulk_field(arg) for arg in message.command[2:])
+        if not fields:
+            raise ValueError(scope)
+    except (IndexError, ValueError):
+        return await message.reply(usage)
+
+    updated = await FilterConfig.bulk_update(message.from_user.id, target_id, **fields)
+    where = "tất cả target" if target_id is None else f"target `{target_id}`"
+    await message.reply(
+        f"✅ Đã cập nhật {', '.join(fields)} cho {updated} nguồn của {where}.",
+        parse_mode="markdown",
+    )
+
+
+# ============ ROUTE FILTER ============
+
+
+@bot.on_message(filters.command("routefilter"))
+async def route_filter(client, message):
+    if await get_adminonly() and not is_admin(message.from_user.id):
+        return await message.reply("❌ Bạn không có quyền.")
+
+    usage = (
+        "❗ Dùng: /routefilter [source_id] [target_id] [field]=[value] ...\n"
+        "hoặc: /routefilter [source_id] [target_id] reset\n"
+        "Filter riêng cho source ➔ target này, các target khác giữ filter chung.\n"
+        "Field giống /bulkset."
+    )
+    try:
+        source_id = int(message.command[1])
+        target_id = int(message.command[2])
+        args = message.command[3:]
+        reset = [arg.lower() for arg in args] == ["reset"]
+        fields = {} if reset else dict(_parse_bulk_field(arg) for arg in args)
+        if not reset and not fields:
+            raise ValueError(source_id)
+    except (IndexError, ValueError):
+        return await message.reply(usage)
+
+    user_id = message.from_user.id
+    if not await SourceConfig.get(user_id, source_id, target_id):
+        return await message.reply(
+            f"❗ Source `{source_id}` chưa được thêm vào target `{target_id}`.",
+            parse_mode="markdown",
+        )
+
+    current = await FilterConfig.get(user_id, source_id, target_id)
+    if reset:
+        if current.target_chat_id == target_id:
+            await current.delete()
+        return await message.reply(
+            f"✅ `{source_id}` ➔ `{target_id}` dùng lại filter chung của source.",
+            parse_mode="markdown",
+        )
+
+    # Start from what the edge uses today
+    edge_filter = current.copy()
+    edge_filter.target_chat_id = target_id
+    for name, value in fields.items():
+        setattr(edge_filter, name, value)
+    await edge_filter.save()
+    await message.reply(
+        f"✅ Đã đặt {', '.join(fields)} cho `{source_id}` ➔ `{target_id}`.",
+        parse_mode="markdown",
+    )
+
+
 # ============ DEFAULT CONFIG ============
 
 
@@ -353,14 +483,9 @@ async def stats_command(client, message):
     if await get_adminonly() and not is_admin(message.from_user.id):
         return await message.reply("❌ Bạn không có quyền.")
 
-    total = await db_module.count_forwarded_messages(message.from_user.id)
-
     # Count by media type
-    media_stats = {}
-    all_msgs = await db_module.get_all_forwarded_messages(message.from_user.id)
-    for doc in all_msgs:
-        mt = doc.get("media_type", "unknown")
-        media_stats[mt] = media_stats.get(mt, 0) + 1
+    media_stats = await db_module.count_forwarded_by(message.from_user.id, "media_type")
+    total = sum(media_stats.values())
 
     text = f"📊 **Thống kê:**\n\n"
     text += f"• Tổng tin nhắn đã forward: {total}\n\n"
@@ -368,9 +493,55 @@ async def stats_command(client, message):
     for mt, count in media_stats.items():
         text += f"  • {mt}: {count}\n"
 
+    if is_admin(message.from_user.id):
+        cache = FilterConfig.cache_stats()
+        text += (
+            f"\n🗂 Filter cache: {cache['size']}/{cache['maxsize']}, "
+            f"hit {cache['hit_rate']:.0%} ({cache['hits']}/{cache['hits'] + cache['misses']})\n"
+        )
+        keyboards = keyboard_cache_stats()
+        text += (
+            f"⌨️ Keyboard cache: {keyboards['size']}/{keyboards['maxsize']}, "
+            f"hit {keyboards['hit_rate']:.0%}\n"
+        )
+        routes = sorted(
+            callback_router.stats().items(), key=lambda item: item[1]["avg_ms"], reverse=True
+        )
+        if routes:
+            text += "\n⏱ Callback chậm nhất:\n"
+            for name, route in routes[:5]:
+                text += (
+                    f"  • {name}: {route['avg_ms']:.1f}ms tb, {route['max_ms']:.1f}ms max "
+                    f"({route['calls']} lần)\n"
+                )
+
     await message.reply(text, parse_mode="markdown")
 
 
+@bot.on_message(filters.command("rebuildstats"))
+async def rebuild_stats_command(client, message):
+    if not is_admin(message.from_user.id):
+        return await message.reply("❌ Bạn không có quyền.")
+
+    status = await message.reply("⏳ Đang tính lại thống kê...")
+    rows = await db_module.rebuild_forwarded_stats()
+    await status.edit(f"✅ Đã tính lại thống kê ({rows} nhóm).")
+
+
+@bot.on_message(filters.command("vacuum"))
+async def vacuum_command(client, message):
+    if not is_admin(message.from_user.id):
+        return await message.reply("❌ Bạn không có quyền.")
+
+    # One full VACUUM switches an old database to incremental auto_vacuum;
+    # it rewrites the file and blocks other writes until it finishes
+    status = await message.reply("⏳ Đang VACUUM database, forward sẽ chậm lại...")
+    result = await db_module.compact_db(config.VACUUM_PAGES, convert=True)
+    await status.edit(
+        f"✅ VACUUM xong: auto_vacuum incremental, WAL {result['wal_pages']} trang."
+    )
+
+
 # ============ REALTIME COMMAND ============
 
 
@@ -404,121 +575,71 @@ async def toggle_realtime(client, message):
         await message.reply("❗ Dùng: /realtime on|off")
 
 
-# ============ REALTIME FORWARD TASK ============
-
-
-async def forward_message(
-    user_client, source_id: int, target_id: int, message, user_id: int
-):
-    """Forward a single message to target"""
-    # Check if already forwarded
-    if await is_message_forwarded(user_id, source_id, target_id, message.id):
-        return False
+# ============ BACKFILL COMMAND ============
 
-    # Get filter config
-    filter_config = await FilterConfig.get(user_id, source_id)
 
-    # Check if message matches filter
-    if not filter_config.matches(message):
-        return False
+@bot.on_message(filters.command("backfill"))
+async def backfill_command(client, message):
+    if await get_adminonly() and not is_admin(message.from_user.id):
+        return await message.reply("❌ Bạn không có quyền.")
 
     try:
-        await user_client.copy_message(
-            chat_id=target_id, from_chat_id=source_id, message_id=message.id
+        source_id = int(message.command[1])
+        from_id = int(message.command[2]) if len(message.command) > 2 else 0
+        to_id = int(message.command[3]) if len(message.command) > 3 else 0
+    except (IndexError, ValueError):
+        return await message.reply(
+            "❗ Dùng: /backfill [source_id] [from_id] [to_id]\nVí dụ: /backfill -100123456789"
         )
 
-        # Log message ID to file
-        media_type = None
-        if message.video:
-            media_type = "video"
-        elif message.photo:
-            media_type = "photo"
-        elif message.document:
-            media_type = "document"
-        elif message.audio:
-            media_type = "audio"
-
-        await log_message(user_id, source_id, target_id, message.id, media_type)
-
-        return True
-    except FloodWait as e:
-        await asyncio.sleep(e.value)
-        return await forward_message(
-            user_client, source_id, target_id, message, user_id
-        )
-    except Exception as e:
-        print(f"Forward error: {e}")
-        return False
+    user_id = message.from_user.id
+    user_data = await db_module.get_user(user_id)
+    if not user_data or not user_data.get("session_string"):
+        return await message.reply("❗ Vui lòng /login [session_string] trước.")
 
+    target_ids = (await SourceConfig.get_routes(user_id)).get(source_id)
+    if not target_ids:
+        return await message.reply(f"❗ Source `{source_id}` chưa được thêm.")
 
-async def realtime_message_handler(
-    client, message, user_id: int, source_id: int, target_id: int
-):
-    """Handle incoming messages for realtime forwarding"""
-    if not realtime_running.get(user_id, False):
-        return
+    key = (user_id, source_id)
+    if key in backfill_tasks and not backfill_tasks[key].done():
+        return await message.reply(f"⏳ Source `{source_id}` đang backfill.")
 
-    await forward_message(client, source_id, target_id, message, user_id)
+    await message.reply(
+        f"⏳ Bắt đầu backfill `{source_id}` ➔ "
+        + ", ".join(f"`{target_id}`" for target_id in target_ids)
+        + "..."
+    )
+    backfill_tasks[key] = asyncio.create_task(
+        _backfill_task(message, user_id, source_id, target_ids, from_id, to_id)
+    )
 
 
-async def start_realtime_forward(user_id: int):
-    """Background task for realtime message forwarding"""
-    user_data = await db_module.get_user(user_id)
-    session_string = user_data["session_string"]
-
-    from pyrogram import Client as UserClient
-    from pyrogram.types import Message
-
-    # Track processed message IDs to avoid duplicates
-    processed_ids = set()
-
-    async with UserClient(
-        name=f"realtime_{user_id}",
-        api_id=config.API_ID,
-        api_hash=config.API_HASH,
-        session_string=session_string,
-        workdir="sessions",
-    ) as user_client:
-        print(f"📡 Realtime forwarding started for user {user_id}")
-
-        # Get sources
-        sources = await SourceConfig.get_all(user_id)
-        source_targets = {
-            src.source_chat_id: src.target_chat_id for src in sources if src.enabled
-        }
-
-        if not source_targets:
-            print(f"⚠️ No enabled sources for user {user_id}")
-            return
-
-        # Listen to all chats (using iter_history for simplicity)
-        async def check_new_messages():
-            while realtime_running.get(user_id, False):
-                for source_id, target_id in source_targets.items():
-                    try:
-                        async for msg in user_client.get_chat_history(
-                            source_id, limit=10
-                        ):
-                            if msg.id not in processed_ids:
-                                processed_ids.add(msg.id)
-                                await forward_message(
-                                    user_client, source_id, target_id, msg, user_id
-                                )
-                    except Exception as e:
-                        print(f"Error checking {source_id}: {e}")
-
-                await asyncio.sleep(3)  # Check every 3 seconds
-
-        await check_new_messages()
-
-        # Listen for new messages
-        print(f"📡 Realtime forwarding started for user {user_id}")
-
-        async for dialog in user_client.get_dialogs():
-            source_config = await SourceConfig.get(user_id, dialog.chat.id)
-            if source_config and source_config.enabled:
-                # Set up message handler for this chat
-                pass
+async def _backfill_task(message, user_id, source_id, target_ids, from_id, to_id):
+    try:
+        stats = await run_backfill(user_id, source_id, target_ids, from_id, to_id)
+    except Exception as e:
+        await message.reply(
+            f"❌ Backfill `{source_id}` lỗi: {e}\nGõ lại lệnh để tiếp tục từ checkpoint."
+        )
+        return
+    finally:
+        backfill_tasks.pop((user_id, source_id), None)
+
+    if stats["stopped"]:
+        await message.reply(
+            f"⏹ Backfill `{source_id}` đã dừng vì phiên forward bị tắt "
+            f"(quét {stats['scanned']} tin).\nGõ lại lệnh để tiếp tục từ checkpoint."
+        )
+        return
+
+    text = (
+        f"✅ Backfill `{source_id}` xong (ID {stats['from_id']} - {stats['to_id']}): "
+        f"quét {stats['scanned']}, forward {stats['queued'] - stats['failed']} tin."
+    )
+    if stats["failed"]:
+        text += f"\n⚠️ {stats['failed']} tin lỗi, gõ lại lệnh để thử lại từ checkpoint."
+    await message.reply(text)
 
 
 # ============ MESSAGE HANDLER (REALTIME) ============
@@ -560,5 +681,18 @@ async def toggle_adminonly(client, message):
 
 # ============ START BOT ============
 
-print("🤖 Bot đã khởi động!")
-bot.run()
+
+async def main():
+    await bot.start()
+    start_sync_task()
+    print("🤖 Bot đã khởi động!")
+    await idle()
+    # Nothing may be forwarded or logged after the final sync below
+    await stop_all_backfills()
+    await stop_all_sessions()
+    await stop_sync_task()
+    await db_module.close_db()
+    await bot.stop()
+
+
+bot.run(main())
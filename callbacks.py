@@ -0,0 +1,153 @@
+import time
+
+# Telegram rejects callback_data longer than 64 bytes
+MAX_CALLBACK_DATA = 64
+_SEP = ":"
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _encode_int(value: int) -> str:
+    """Signed base-36; a 64-bit chat ID takes at most 14 characters."""
+    if value < 0:
+        return "-" + _encode_int(-value)
+    digits = []
+    while True:
+        value, rem = divmod(value, 36)
+        digits.append(_DIGITS[rem])
+        if not value:
+            return "".join(reversed(digits))
+
+
+def _decode_int(text: str) -> int:
+    return int(text, 36)
+
+
+class CallbackRoute:
+    """One callback schema: a short prefix code and its typed fields"""
+
+    __slots__ = (
+        "name",
+        "code",
+        "fields",
+        "handler",
+        "calls",
+        "errors",
+        "total",
+        "slowest",
+    )
+
+    def __init__(self, name: str, code: str, fields: tuple):
+        self.name = name
+        self.code = code
+        self.fields = fields  # int or str per packed field
+        self.handler = None
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0  # seconds spent in the handler
+        self.slowest = 0.0
+
+
+class CallbackRouter:
+    """Registry of callback schemas with dict-based dispatch.
+
+    callback_data is ``code:field:field``, ints packed as signed base-36, so
+    parsing is a split plus one dict lookup however many routes exist. Routes
+    declared without a handler (buttons that only prompt for a command) and
+    unknown data are just acknowledged.
+    """
+
+    def __init__(self):
+        self._routes = {}  # name -> CallbackRoute
+        self._codes = {}  # code -> CallbackRoute
+
+    def define(self, name: str, code: str, *fields) -> CallbackRoute:
+        if name in self._routes or code in self._codes:
+            raise ValueError(f"Duplicate callback route {name!r} / {code!r}")
+        if _SEP in code:
+            raise ValueError(f"Callback code may not contain {_SEP!r}: {code!r}")
+        route = CallbackRoute(name, code, fields)
+        self._routes[name] = route
+        self._codes[code] = route
+        return route
+
+    def route(self, name: str, code: str, *fields):
+        """Decorator: define a route and handle it with
+        ``handler(client, callback_query, user_id, *fields)``."""
+
+        def decorator(handler):
+            self.define(name, code, *fields).handler = handler
+            return handler
+
+        return decorator
+
+    def pack(self, name: str, *values) -> str:
+        route = self._routes[name]
+        if len(values) != len(route.fields):
+            raise ValueError(
+                f"{name} takes {len(route.fields)} fields, got {len(values)}"
+            )
+        parts = [route.code]
+        for kind, value in zip(route.fields, values):
+            if kind is int:
+                parts.append(_encode_int(int(value)))
+            else:
+                value = str(value)
+                if _SEP in value:
+                    raise ValueError(
+                        f"{name}: field may not contain {_SEP!r}: {value!r}"
+                    )
+                parts.append(value)
+        data = _SEP.join(parts)
+        if len(data.encode()) > MAX_CALLBACK_DATA:
+            raise ValueError(
+                f"{name}: callback data longer than {MAX_CALLBACK_DATA} bytes"
+            )
+        return data
+
+    def unpack(self, data: str):
+        """(route, args) for callback data, or (None, ()) if it matches no route."""
+        parts = data.split(_SEP)
+        route = self._codes.get(parts[0])
+        if route is None or len(parts) - 1 != len(route.fields):
+            return None, ()
+        try:
+            args = tuple(
+                _decode_int(text) if kind is int else text
+                for kind, text in zip(route.fields, parts[1:])
+            )
+        except ValueError:
+            return None, ()
+        return route, args
+
+    async def dispatch(self, client, callback_query):
+        route, args = self.unpack(callback_query.data or "")
+        if route is None or route.handler is None:
+            await callback_query.answer()
+            return
+
+        start = time.perf_counter()
+        try:
+            await route.handler(
+                client, callback_query, callback_query.from_user.id, *args
+            )
+        except Exception:
+            route.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            route.calls += 1
+            route.total += elapsed
+            route.slowest = max(route.slowest, elapsed)
+
+    def stats(self) -> dict:
+        """Per-route call count, errors and average/max handler latency (ms)"""
+        return {
+            route.name: {
+                "calls": route.calls,
+                "errors": route.errors,
+                "avg_ms": route.total / route.calls * 1000 if route.calls else 0.0,
+                "max_ms": route.slowest * 1000,
+            }
+            for route in self._routes.values()
+            if route.calls
+        }
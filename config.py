@@ -11,19 +11,47 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", "your_bot_token")
 
 # ============ DATABASE (SQLite) ============
 SQLITE_PATH = os.getenv("SQLITE_PATH", "forward_bot.db")
+# Read-only connections kept open for queries (0 = use the writer for everything)
+SQLITE_READERS = int(os.getenv("SQLITE_READERS", "4"))
+# PRAGMA profile from db.SQLITE_PROFILES: "performance" or "safe" (fsync every commit)
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "performance")
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", 256))  # prepared statements per connection
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000))  # ms a write waits for another connection's lock
 
 # ============ ADMIN ============
 ADMIN_IDS = list(map(int, os.getenv("ADMIN_IDS", "123456789").split(",")))
 
 # ============ LOGGER (Message ID Logging) ============
-LOG_FILE = os.getenv("LOG_FILE", "message_ids.log")
+LOG_FILE = os.getenv("LOG_FILE", "message_ids.log")  # legacy JSON-lines log (migrated)
+LOG_DIR = os.getenv("LOG_DIR", "message_log")  # segment files + committed offset
+LOG_SEGMENT_SIZE = int(os.getenv("LOG_SEGMENT_SIZE", 4 * 1024 * 1024))  # bytes per segment
 
 # ============ SYNC (Log → DB) ============
 SYNC_INTERVAL = int(os.getenv("SYNC_INTERVAL", 300))  # seconds (default: 5 minutes)
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", 5000))  # log entries per DB transaction
+SYNC_FLUSH_THRESHOLD = int(os.getenv("SYNC_FLUSH_THRESHOLD", 1000))  # sync early at this backlog
+SYNC_RESTART_DELAY = int(os.getenv("SYNC_RESTART_DELAY", 5))  # seconds before restarting a crashed sync
+
+# ============ RETENTION & MAINTENANCE ============
+FORWARDED_RETENTION_DAYS = int(os.getenv("FORWARDED_RETENTION_DAYS", 0))  # days of rows kept in the DB (0 = forever)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "")  # monthly archive DBs for pruned rows (empty = discard)
+MAINTENANCE_INTERVAL = int(os.getenv("MAINTENANCE_INTERVAL", 3600))  # seconds between prune/vacuum/checkpoint (needs retention)
+VACUUM_PAGES = int(os.getenv("VACUUM_PAGES", 1000))  # free pages released per maintenance pass
 
 # ============ REALTIME FORWARD ============
 REALTIME_CHECK_INTERVAL = int(os.getenv("REALTIME_CHECK_INTERVAL", 3))  # seconds
-REALTIME_BATCH_SIZE = int(os.getenv("REALTIME_BATCH_SIZE", 10))  # messages per batch
+REALTIME_GAP_LIMIT = int(os.getenv("REALTIME_GAP_LIMIT", 100))  # max messages per gap fill
+
+# ============ FORWARD ENGINE ============
+FORWARD_WORKERS = int(os.getenv("FORWARD_WORKERS", 4))  # parallel targets per user
+FORWARD_MAX_PENDING = int(os.getenv("FORWARD_MAX_PENDING", 1000))  # queued messages per user
+FORWARD_BATCH_SIZE = int(os.getenv("FORWARD_BATCH_SIZE", 100))  # messages per request (max 100)
+FORWARD_BATCH_WINDOW = float(os.getenv("FORWARD_BATCH_WINDOW", 0))  # seconds an idle target waits to collect a batch
+FORWARD_ALBUM_WINDOW = float(os.getenv("FORWARD_ALBUM_WINDOW", 0.5))  # seconds an album waits for its next part
+FORWARD_DRAIN_TIMEOUT = float(os.getenv("FORWARD_DRAIN_TIMEOUT", 10))  # max seconds stop() waits for the queue
+
+# ============ BACKFILL ============
+BACKFILL_PAGE_SIZE = int(os.getenv("BACKFILL_PAGE_SIZE", 200))  # message IDs per request (max 200)
 
 # ============ FORWARD OPTIONS (Defaults) ============
 DEFAULT_REMOVE_CAPTION = os.getenv("DEFAULT_REMOVE_CAPTION", "false").lower() == "true"
@@ -53,9 +81,20 @@ DEFAULT_BLOCK_LIST = (
     else []
 )
 
+# ============ FILTER CACHE ============
+FILTER_CACHE_SIZE = int(os.getenv("FILTER_CACHE_SIZE", 4096))  # max cached filters
+FILTER_CACHE_TTL = int(os.getenv("FILTER_CACHE_TTL", 600))  # seconds (0 = no expiry)
+KEYBOARD_CACHE_SIZE = int(os.getenv("KEYBOARD_CACHE_SIZE", 1024))  # rendered menu keyboards kept
+
+# ============ DEDUP INDEX ============
+DEDUP_WINDOW = int(os.getenv("DEDUP_WINDOW", 5000))  # newest IDs kept in memory per route
+
 # ============ SESSIONS FOLDER ============
 SESSIONS_FOLDER = os.getenv("SESSIONS_FOLDER", "sessions")
 
 # ============ RATE LIMITING ============
-FLOOD_WAIT_DELAY = int(os.getenv("FLOOD_WAIT_DELAY", 5))  # seconds to wait on FloodWait
-MESSAGE_DELAY = float(os.getenv("MESSAGE_DELAY", 0.5))  # seconds between messages
+FLOOD_WAIT_DELAY = int(os.getenv("FLOOD_WAIT_DELAY", 5))  # min seconds a client pauses on FloodWait
+MESSAGE_DELAY = float(os.getenv("MESSAGE_DELAY", 0.5))  # seconds between messages per target
+RATE_LIMIT_TARGET_BURST = int(os.getenv("RATE_LIMIT_TARGET_BURST", 3))  # messages sent back-to-back per target
+RATE_LIMIT_CLIENT = float(os.getenv("RATE_LIMIT_CLIENT", 10))  # requests/second per user client (0 = no limit)
+RATE_LIMIT_GLOBAL = float(os.getenv("RATE_LIMIT_GLOBAL", 30))  # requests/second for all clients (0 = no limit)
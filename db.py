@@ -1,23 +1,119 @@
+import os
 import json
+import asyncio
+from datetime import date, timedelta
+from contextlib import asynccontextmanager
 import aiosqlite
 import config
+from cache import LRUCache
 
+# One writer connection serialises all writes; reads borrow one of
+# SQLITE_READERS extra connections so they run alongside a write (WAL mode).
 _db: aiosqlite.Connection | None = None
+_readers: asyncio.Queue | None = None
+_init_lock = asyncio.Lock()
+
+# Connection PRAGMAs per SQLITE_PROFILE, applied on top of WAL/foreign keys.
+# "performance" trades the fsync of every commit for a checkpoint-time one
+# and keeps hot pages in memory. A crash (power loss, not a process crash)
+# can then lose the last commits, never corrupt the file. The message log
+# does not cover that: its committed pointer already moved past the synced
+# entries, so those forwarded rows (dedup history, stats) are gone. Use
+# "safe" when they must survive power loss.
+SQLITE_PROFILES = {
+    "safe": {
+        "synchronous": "FULL",
+    },
+    "performance": {
+        "synchronous": "NORMAL",
+        "cache_size": -64 * 1024,  # KiB, i.e. 64 MiB per connection
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+}
+
+
+async def _connect(readonly: bool = False) -> aiosqlite.Connection:
+    # sqlite3 keeps up to cached_statements prepared statements per connection,
+    # keyed by SQL text, so the constant hot-path queries are compiled once
+    conn = await aiosqlite.connect(
+        config.SQLITE_PATH, cached_statements=config.SQLITE_STATEMENT_CACHE
+    )
+    conn.row_factory = aiosqlite.Row
+    if not readonly:
+        # Only takes effect on a new, empty database; see compact_db()
+        await conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    await conn.execute("PRAGMA journal_mode=WAL")
+    await conn.execute("PRAGMA foreign_keys=ON")
+    # Maintenance writes on its own connection; wait for its lock, don't fail
+    await conn.execute(f"PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT)}")
+    for name, value in SQLITE_PROFILES[config.SQLITE_PROFILE].items():
+        await conn.execute(f"PRAGMA {name}={value}")
+    if readonly:
+        await conn.execute("PRAGMA query_only=ON")
+    return conn
 
 
 async def get_db() -> aiosqlite.Connection:
+    """The writer connection, created (with the schema) on first use"""
     global _db
     if _db is None:
-        _db = await aiosqlite.connect(config.SQLITE_PATH)
-        _db.row_factory = aiosqlite.Row
-        await _db.execute("PRAGMA journal_mode=WAL")
-        await _db.execute("PRAGMA foreign_keys=ON")
-        await _init_tables()
+        async with _init_lock:
+            # Another caller may have finished the init while we waited
+            if _db is None:
+                conn = await _connect()
+                await _init_tables(conn)
+                _db = conn
     return _db
 
 
-async def _init_tables():
-    await _db.executescript("""
+async def _get_readers() -> asyncio.Queue | None:
+    global _readers
+    if _readers is None:
+        await get_db()  # the schema must exist before readers open
+        async with _init_lock:
+            if _readers is None:
+                readers = asyncio.Queue()
+                for _ in range(config.SQLITE_READERS):
+                    readers.put_nowait(await _connect(readonly=True))
+                _readers = readers
+    return _readers
+
+
+@asynccontextmanager
+async def reader():
+    """Borrow a read-only connection from the pool for a few queries.
+
+    Falls back to the writer for an in-memory database or when the pool is
+    disabled with SQLITE_READERS=0.
+    """
+    if config.SQLITE_READERS <= 0 or config.SQLITE_PATH == ":memory:":
+        yield await get_db()
+        return
+    readers = await _get_readers()
+    conn = await readers.get()
+    try:
+        yield conn
+    finally:
+        readers.put_nowait(conn)
+
+
+async def close_db():
+    """Close the writer and every pooled reader"""
+    global _db, _readers
+    async with _init_lock:
+        if _readers is not None:
+            while not _readers.empty():
+                await _readers.get_nowait().close()
+            _readers = None
+        if _db is not None:
+            await _db.execute("PRAGMA optimize")
+            await _db.close()
+            _db = None
+
+
+async def _init_tables(conn: aiosqlite.Connection):
+    await conn.executescript("""
         CREATE TABLE IF NOT EXISTS users (
             user_id INTEGER PRIMARY KEY,
             session_string TEXT,
@@ -77,8 +173,157 @@ async def _init_tables():
             synced_at TEXT,
             UNIQUE(user_id, source, target, message_id)
         );
+
+        CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+            user_id INTEGER NOT NULL,
+            source_chat_id INTEGER NOT NULL,
+            target_chat_id INTEGER NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            to_message_id INTEGER,
+            updated_at TEXT,
+            PRIMARY KEY (user_id, source_chat_id, target_chat_id)
+        );
     """)
-    await _db.commit()
+    await conn.commit()
+    await _migrate(conn)
+
+
+# Schema changes applied in order on top of the base tables; PRAGMA
+# user_version records how many have run. Append only, never edit.
+_MIGRATIONS = [
+    # 1: stats and per-target lookups without scanning the user's rows
+    """
+    CREATE INDEX IF NOT EXISTS idx_forwarded_user_media
+        ON forwarded_messages (user_id, media_type);
+    CREATE INDEX IF NOT EXISTS idx_forwarded_user_target
+        ON forwarded_messages (user_id, target, message_id);
+    CREATE INDEX IF NOT EXISTS idx_sources_target
+        ON sources (user_id, target_chat_id);
+    """,
+    # 2: forwarded_stats rollup, kept current by triggers in the writer's
+    # transaction. NULL media_type/day are stored as '' so the key is unique.
+    """
+    CREATE TABLE IF NOT EXISTS forwarded_stats (
+        user_id INTEGER NOT NULL,
+        source INTEGER NOT NULL,
+        target INTEGER NOT NULL,
+        media_type TEXT NOT NULL DEFAULT '',
+        day TEXT NOT NULL DEFAULT '',
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, source, target, media_type, day)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS forwarded_stats_insert
+    AFTER INSERT ON forwarded_messages
+    BEGIN
+        INSERT INTO forwarded_stats (user_id, source, target, media_type, day, count)
+        VALUES (NEW.user_id, NEW.source, NEW.target, COALESCE(NEW.media_type, ''),
+                COALESCE(substr(NEW.forwarded_at, 1, 10), ''), 1)
+        ON CONFLICT(user_id, source, target, media_type, day)
+        DO UPDATE SET count = count + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS forwarded_stats_update
+    AFTER UPDATE OF media_type, forwarded_at ON forwarded_messages
+    WHEN OLD.media_type IS NOT NEW.media_type
+      OR substr(OLD.forwarded_at, 1, 10) IS NOT substr(NEW.forwarded_at, 1, 10)
+    BEGIN
+        UPDATE forwarded_stats SET count = count - 1
+        WHERE user_id = OLD.user_id AND source = OLD.source AND target = OLD.target
+          AND media_type = COALESCE(OLD.media_type, '')
+          AND day = COALESCE(substr(OLD.forwarded_at, 1, 10), '');
+        INSERT INTO forwarded_stats (user_id, source, target, media_type, day, count)
+        VALUES (NEW.user_id, NEW.source, NEW.target, COALESCE(NEW.media_type, ''),
+                COALESCE(substr(NEW.forwarded_at, 1, 10), ''), 1)
+        ON CONFLICT(user_id, source, target, media_type, day)
+        DO UPDATE SET count = count + 1;
+    END;
+
+    DELETE FROM forwarded_stats;
+    INSERT INTO forwarded_stats (user_id, source, target, media_type, day, count)
+    SELECT user_id, source, target, COALESCE(media_type, ''),
+           COALESCE(substr(forwarded_at, 1, 10), ''), COUNT(*)
+    FROM forwarded_messages
+    GROUP BY 1, 2, 3, 4, 5;
+    """,
+    # 3: retention. Pruned rows leave their route's highest message_id behind
+    # so replays of old messages are still recognised.
+    """
+    CREATE TABLE IF NOT EXISTS forwarded_watermarks (
+        user_id INTEGER NOT NULL,
+        source INTEGER NOT NULL,
+        target INTEGER NOT NULL,
+        message_id INTEGER NOT NULL,
+        PRIMARY KEY (user_id, source, target)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_forwarded_at
+        ON forwarded_messages (forwarded_at);
+    """,
+    # 4: fan-out. sources becomes a routing table with one row per
+    # (source, target) edge, and filters gain target_chat_id so an edge can
+    # override the source-wide filter (stored with target_chat_id = 0).
+    """
+    CREATE TABLE sources_new (
+        user_id INTEGER NOT NULL,
+        source_chat_id INTEGER NOT NULL,
+        target_chat_id INTEGER NOT NULL,
+        enabled INTEGER DEFAULT 1,
+        PRIMARY KEY (user_id, source_chat_id, target_chat_id)
+    );
+    INSERT INTO sources_new (user_id, source_chat_id, target_chat_id, enabled)
+    SELECT user_id, source_chat_id, target_chat_id, enabled FROM sources;
+    DROP TABLE sources;
+    ALTER TABLE sources_new RENAME TO sources;
+    CREATE INDEX IF NOT EXISTS idx_sources_target
+        ON sources (user_id, target_chat_id);
+
+    CREATE TABLE filters_new (
+        user_id INTEGER NOT NULL,
+        source_chat_id INTEGER NOT NULL,
+        target_chat_id INTEGER NOT NULL DEFAULT 0,
+        media_types TEXT DEFAULT '["all"]',
+        min_duration INTEGER DEFAULT 0,
+        max_duration INTEGER,
+        dc_ids TEXT DEFAULT '[]',
+        enabled INTEGER DEFAULT 1,
+        remove_caption INTEGER DEFAULT 0,
+        remove_forward_header INTEGER DEFAULT 0,
+        min_file_size INTEGER DEFAULT 0,
+        max_file_size INTEGER,
+        require_caption INTEGER DEFAULT 0,
+        require_hashtags INTEGER DEFAULT 0,
+        block_list TEXT DEFAULT '[]',
+        only_from_users TEXT DEFAULT '[]',
+        block_from_users TEXT DEFAULT '[]',
+        PRIMARY KEY (user_id, source_chat_id, target_chat_id)
+    );
+    INSERT INTO filters_new
+        (user_id, source_chat_id, media_types, min_duration, max_duration,
+         dc_ids, enabled, remove_caption, remove_forward_header,
+         min_file_size, max_file_size, require_caption, require_hashtags,
+         block_list, only_from_users, block_from_users)
+    SELECT user_id, source_chat_id, media_types, min_duration, max_duration,
+           dc_ids, enabled, remove_caption, remove_forward_header,
+           min_file_size, max_file_size, require_caption, require_hashtags,
+           block_list, only_from_users, block_from_users
+    FROM filters;
+    DROP TABLE filters;
+    ALTER TABLE filters_new RENAME TO filters;
+    """,
+]
+
+
+async def _migrate(conn: aiosqlite.Connection):
+    cursor = await conn.execute("PRAGMA user_version")
+    version = (await cursor.fetchone())[0]
+    if version >= len(_MIGRATIONS):
+        return
+    for number, script in enumerate(_MIGRATIONS[version:], start=version + 1):
+        await conn.executescript(f"BEGIN; {script} PRAGMA user_version = {number}; COMMIT;")
+        print(f"🗄️ Applied DB migration {number}")
+    # Refresh planner statistics so the new indexes are picked up
+    await conn.execute("ANALYZE")
+    await conn.commit()
 
 
 def row_to_dict(row: aiosqlite.Row | None) -> dict | None:
@@ -95,79 +340,113 @@ def rows_to_list(rows: list[aiosqlite.Row]) -> list[dict]:
 
 
 async def get_user(user_id: int) -> dict | None:
-    db = await get_db()
-    cursor = await db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-    return row_to_dict(await cursor.fetchone())
+    async with reader() as db:
+        cursor = await db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
+        return row_to_dict(await cursor.fetchone())
+
+
+def _upsert_sql(table: str, key: str, fields: dict) -> str:
+    """Single-statement INSERT ... ON CONFLICT(key) DO UPDATE for fields"""
+    columns = ", ".join([key, *fields])
+    placeholders = ", ".join("?" for _ in range(len(fields) + 1))
+    if not fields:
+        return f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) ON CONFLICT({key}) DO NOTHING"
+    sets = ", ".join(f"{k} = excluded.{k}" for k in fields)
+    return (
+        f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) "
+        f"ON CONFLICT({key}) DO UPDATE SET {sets}"
+    )
 
 
 async def upsert_user(user_id: int, **fields):
     """Set fields on a user row. Creates if not exists."""
     db = await get_db()
-    existing = await get_user(user_id)
-    if existing:
-        sets = ", ".join(f"{k} = ?" for k in fields)
-        vals = list(fields.values()) + [user_id]
-        await db.execute(f"UPDATE users SET {sets} WHERE user_id = ?", vals)
-    else:
-        keys = ", ".join(fields.keys())
-        placeholders = ", ".join("?" for _ in fields)
-        vals = list(fields.values())
-        await db.execute(
-            f"INSERT INTO users (user_id, {keys}) VALUES (?, {placeholders})",
-            [user_id] + vals,
-        )
+    await db.execute(_upsert_sql("users", "user_id", fields), [user_id, *fields.values()])
     await db.commit()
 
 
 # ─── Settings ────────────────────────────────────────────────────
 
 
+# Settings are read on every command (e.g. adminonly) and change rarely;
+# upsert_setting() invalidates, so the cache never needs to expire.
+_settings_cache = LRUCache(maxsize=256)
+_MISSING = object()
+
+
 async def get_setting(key: str) -> dict | None:
-    db = await get_db()
-    cursor = await db.execute("SELECT * FROM settings WHERE key = ?", (key,))
-    return row_to_dict(await cursor.fetchone())
+    cached = _settings_cache.get(key, _MISSING)
+    if cached is not _MISSING:
+        return cached
+
+    generation = _settings_cache.generation
+    async with reader() as db:
+        cursor = await db.execute("SELECT * FROM settings WHERE key = ?", (key,))
+        setting = row_to_dict(await cursor.fetchone())
+    _settings_cache.set(key, setting, generation)
+    return setting
 
 
 async def upsert_setting(key: str, **fields):
     db = await get_db()
-    existing = await get_setting(key)
-    if existing:
-        sets = ", ".join(f"{k} = ?" for k in fields)
-        vals = list(fields.values()) + [key]
-        await db.execute(f"UPDATE settings SET {sets} WHERE key = ?", vals)
-    else:
-        keys = ", ".join(fields.keys())
-        placeholders = ", ".join("?" for _ in fields)
-        vals = list(fields.values())
-        await db.execute(
-            f"INSERT INTO settings (key, {keys}) VALUES (?, {placeholders})",
-            [key] + vals,
-        )
+    await db.execute(_upsert_sql("settings", "key", fields), [key, *fields.values()])
     await db.commit()
+    _settings_cache.invalidate(key)
 
 
 # ─── Forwarded Messages ─────────────────────────────────────────
 
+_UPSERT_FORWARDED_SQL = """
+    INSERT INTO forwarded_messages (user_id, source, target, message_id, forwarded_at, media_type, synced_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, source, target, message_id)
+    DO UPDATE SET forwarded_at = excluded.forwarded_at,
+                  media_type = excluded.media_type,
+                  synced_at = excluded.synced_at
+"""
+
 
 async def get_forwarded_message(user_id: int, source: int, target: int, message_id: int) -> dict | None:
-    db = await get_db()
-    cursor = await db.execute(
-        """SELECT * FROM forwarded_messages
-           WHERE user_id = ? AND source = ? AND target = ? AND message_id = ?""",
-        (user_id, source, target, message_id),
-    )
-    return row_to_dict(await cursor.fetchone())
+    async with reader() as db:
+        cursor = await db.execute(
+            """SELECT * FROM forwarded_messages
+               WHERE user_id = ? AND source = ? AND target = ? AND message_id = ?""",
+            (user_id, source, target, message_id),
+        )
+        return row_to_dict(await cursor.fetchone())
+
+
+async def was_forwarded(user_id: int, source: int, target: int, message_id: int) -> bool:
+    """True if the message has a row, or lies below the route's pruned watermark"""
+    async with reader() as db:
+        cursor = await db.execute(
+            """SELECT 1 FROM forwarded_messages
+               WHERE user_id = ? AND source = ? AND target = ? AND message_id = ?
+               UNION ALL
+               SELECT 1 FROM forwarded_watermarks
+               WHERE user_id = ? AND source = ? AND target = ? AND message_id >= ?
+               LIMIT 1""",
+            (user_id, source, target, message_id) * 2,
+        )
+        return await cursor.fetchone() is not None
+
+
+async def get_forwarded_watermark(user_id: int, source: int, target: int) -> int:
+    """Highest message_id pruned from a route by retention (0 if none)"""
+    async with reader() as db:
+        cursor = await db.execute(
+            """SELECT message_id FROM forwarded_watermarks
+               WHERE user_id = ? AND source = ? AND target = ?""",
+            (user_id, source, target),
+        )
+        row = await cursor.fetchone()
+        return row["message_id"] if row else 0
 
 
 async def upsert_forwarded_message(user_id: int, source: int, target: int, message_id: int, **fields):
     db = await get_db()
     await db.execute(
-        """INSERT INTO forwarded_messages (user_id, source, target, message_id, forwarded_at, media_type, synced_at)
-           VALUES (?, ?, ?, ?, ?, ?, ?)
-           ON CONFLICT(user_id, source, target, message_id)
-           DO UPDATE SET forwarded_at = excluded.forwarded_at,
-                         media_type = excluded.media_type,
-                         synced_at = excluded.synced_at""",
+        _UPSERT_FORWARDED_SQL,
         (
             user_id,
             source,
@@ -181,33 +460,293 @@ async def upsert_forwarded_message(user_id: int, source: int, target: int, messa
     await db.commit()
 
 
+async def upsert_forwarded_messages(entries, chunk_size: int = 1000) -> int:
+    """Bulk upsert of forwarded messages with one transaction per chunk.
+
+    entries is any iterable of dicts with the upsert_forwarded_message
+    fields; it is consumed lazily, chunk_size rows at a time.
+    """
+    db = await get_db()
+    written = 0
+    rows = []
+    for entry in entries:
+        rows.append(
+            (
+                entry["user_id"],
+                entry["source"],
+                entry["target"],
+                entry["message_id"],
+                entry.get("forwarded_at"),
+                entry.get("media_type"),
+                entry.get("synced_at"),
+            )
+        )
+        if len(rows) >= chunk_size:
+            await _write_forwarded_chunk(db, rows)
+            written += len(rows)
+            rows = []
+    if rows:
+        await _write_forwarded_chunk(db, rows)
+        written += len(rows)
+    return written
+
+
+async def _write_forwarded_chunk(db: aiosqlite.Connection, rows: list):
+    # New rows bump forwarded_stats through triggers, inside this same commit
+    await db.executemany(_UPSERT_FORWARDED_SQL, rows)
+    await db.commit()
+
+
 async def count_forwarded_messages(user_id: int) -> int:
+    async with reader() as db:
+        cursor = await db.execute(
+            "SELECT COUNT(*) as cnt FROM forwarded_messages WHERE user_id = ?", (user_id,)
+        )
+        row = await cursor.fetchone()
+        return row["cnt"] if row else 0
+
+
+# Columns count_forwarded_by() can group on in the forwarded_stats rollup
+_STATS_GROUPS = {
+    "media_type": "NULLIF(media_type, '')",
+    "source": "source",
+    "target": "target",
+    "day": "NULLIF(day, '')",
+}
+
+
+async def count_forwarded_by(user_id: int, group: str = "media_type") -> dict:
+    """Forwarded message counts of a user grouped by media_type, source, target or day.
+
+    Reads the forwarded_stats rollup, so the cost depends on the number of
+    groups rather than the number of forwarded messages.
+    """
+    column = _STATS_GROUPS[group]
+    async with reader() as db:
+        cursor = await db.execute(
+            f"""SELECT {column} AS grp, SUM(count) AS cnt FROM forwarded_stats
+                WHERE user_id = ? GROUP BY grp HAVING cnt > 0""",
+            (user_id,),
+        )
+        return {r["grp"]: r["cnt"] for r in await cursor.fetchall()}
+
+
+async def rebuild_forwarded_stats(user_id: int = None) -> int:
+    """Recompute the forwarded_stats rollup from forwarded_messages.
+
+    Rebuilds one user, or everyone when user_id is None, in one transaction.
+    Returns the number of rollup rows written.
+    """
     db = await get_db()
+    where, params = "WHERE 1", []
+    if user_id is not None:
+        where += " AND user_id = ?"
+        params.append(user_id)
+    # Days before the retention cutoff were pruned from forwarded_messages;
+    # their counts only survive in the rollup, so leave them alone
+    cutoff = _retention_cutoff() if config.FORWARDED_RETENTION_DAYS > 0 else ""
+
+    await db.execute(
+        f"DELETE FROM forwarded_stats {where} AND (day >= ? OR day = '')", params + [cutoff]
+    )
     cursor = await db.execute(
-        "SELECT COUNT(*) as cnt FROM forwarded_messages WHERE user_id = ?", (user_id,)
+        f"""INSERT INTO forwarded_stats (user_id, source, target, media_type, day, count)
+            SELECT user_id, source, target, COALESCE(media_type, ''),
+                   COALESCE(substr(forwarded_at, 1, 10), '') AS d, COUNT(*)
+            FROM forwarded_messages {where} AND (d >= ? OR d = '')
+            GROUP BY 1, 2, 3, 4, 5""",
+        params + [cutoff],
     )
-    row = await cursor.fetchone()
-    return row["cnt"] if row else 0
+    await db.commit()
+    return cursor.rowcount
 
 
 async def get_forwarded_message_ids(user_id: int, source: int = None, target: int = None) -> set:
-    db = await get_db()
-    query = "SELECT message_id FROM forwarded_messages WHERE user_id = ?"
-    params = [user_id]
-    if source is not None:
-        query += " AND source = ?"
-        params.append(source)
-    if target is not None:
-        query += " AND target = ?"
-        params.append(target)
-    cursor = await db.execute(query, params)
-    rows = await cursor.fetchall()
-    return {r["message_id"] for r in rows}
+    async with reader() as db:
+        query = "SELECT message_id FROM forwarded_messages WHERE user_id = ?"
+        params = [user_id]
+        if source is not None:
+            query += " AND source = ?"
+            params.append(source)
+        if target is not None:
+            query += " AND target = ?"
+            params.append(target)
+        cursor = await db.execute(query, params)
+        rows = await cursor.fetchall()
+        return {r["message_id"] for r in rows}
+
+
+async def get_recent_forwarded_message_ids(user_id: int, source: int, target: int, limit: int) -> list:
+    """Newest forwarded message IDs of one route, highest first."""
+    async with reader() as db:
+        cursor = await db.execute(
+            """SELECT message_id FROM forwarded_messages
+               WHERE user_id = ? AND source = ? AND target = ?
+               ORDER BY message_id DESC LIMIT ?""",
+            (user_id, source, target, limit),
+        )
+        rows = await cursor.fetchall()
+        return [r["message_id"] for r in rows]
 
 
 async def get_all_forwarded_messages(user_id: int) -> list[dict]:
+    async with reader() as db:
+        cursor = await db.execute(
+            "SELECT * FROM forwarded_messages WHERE user_id = ?", (user_id,)
+        )
+        return rows_to_list(await cursor.fetchall())
+
+
+# ─── Retention & Maintenance ────────────────────────────────────
+
+
+def _retention_cutoff() -> str:
+    """First day (YYYY-MM-DD) still kept in forwarded_messages"""
+    return (date.today() - timedelta(days=config.FORWARDED_RETENTION_DAYS)).isoformat()
+
+
+def _month_slices(months: list, cutoff: str):
+    """(archive name, start, end) per YYYY-MM month, end capped at cutoff"""
+    for month in months:
+        if not month or len(month) != 7 or month[4] != "-":
+            continue  # not an ISO timestamp, never pruned
+        year, mon = int(month[:4]), int(month[5:])
+        next_month = f"{year + mon // 12:04d}-{mon % 12 + 1:02d}-01"
+        yield month.replace("-", "_"), f"{month}-01", min(next_month, cutoff)
+
+
+async def prune_forwarded_messages(days: int, archive_dir: str = "") -> int:
+    """Move forwarded rows older than days out of the hot database.
+
+    Work is done one calendar month at a time on a separate connection. Each
+    month is optionally copied into ARCHIVE_DIR/forwarded_YYYY_MM.db (attached
+    for the copy), the route watermarks are raised, and the rows are deleted,
+    all in one transaction. Returns the number of rows removed.
+    """
+    if days <= 0:
+        return 0
+    cutoff = _retention_cutoff()
+    conn = await _connect()
+    removed = 0
+    try:
+        cursor = await conn.execute(
+            """SELECT DISTINCT substr(forwarded_at, 1, 7) AS month
+               FROM forwarded_messages WHERE forwarded_at < ?""",
+            (cutoff,),
+        )
+        months = [r["month"] for r in await cursor.fetchall()]
+
+        for name, start, end in _month_slices(months, cutoff):
+            if archive_dir:
+                os.makedirs(archive_dir, exist_ok=True)
+                path = os.path.join(archive_dir, f"forwarded_{name}.db")
+                await conn.execute("ATTACH DATABASE ? AS archive", (path,))
+            try:
+                if archive_dir:
+                    await conn.execute("""
+                        CREATE TABLE IF NOT EXISTS archive.forwarded_messages (
+                            user_id INTEGER NOT NULL,
+                            source INTEGER NOT NULL,
+                            target INTEGER NOT NULL,
+                            message_id INTEGER NOT NULL,
+                            forwarded_at TEXT,
+                            media_type TEXT,
+                            synced_at TEXT,
+                            UNIQUE(user_id, source, target, message_id)
+                        )
+                    """)
+                    await conn.execute(
+                        """INSERT OR IGNORE INTO archive.forwarded_messages
+                               (user_id, source, target, message_id, forwarded_at, media_type, synced_at)
+                           SELECT user_id, source, target, message_id, forwarded_at, media_type, synced_at
+                           FROM main.forwarded_messages
+                           WHERE forwarded_at >= ? AND forwarded_at < ?""",
+                        (start, end),
+                    )
+                await conn.execute(
+                    """INSERT INTO forwarded_watermarks (user_id, source, target, message_id)
+                       SELECT user_id, source, target, MAX(message_id)
+                       FROM main.forwarded_messages
+                       WHERE forwarded_at >= ? AND forwarded_at < ?
+                       GROUP BY user_id, source, target
+                       ON CONFLICT(user_id, source, target)
+                       DO UPDATE SET message_id = MAX(message_id, excluded.message_id)""",
+                    (start, end),
+                )
+                cursor = await conn.execute(
+                    "DELETE FROM main.forwarded_messages WHERE forwarded_at >= ? AND forwarded_at < ?",
+                    (start, end),
+                )
+                removed += cursor.rowcount
+                await conn.commit()
+            finally:
+                if archive_dir:
+                    await conn.execute("DETACH DATABASE archive")
+    finally:
+        await conn.close()
+    return removed
+
+
+async def compact_db(vacuum_pages: int, convert: bool = False) -> dict:
+    """Return free pages to the OS and fold the WAL back into the database.
+
+    Free pages can only be released incrementally once auto_vacuum is
+    INCREMENTAL, which a database created before it was enabled only gets
+    from a full VACUUM. That rewrites the whole file under an exclusive lock,
+    so it only runs when convert is True (the admin /vacuum command).
+    """
+    conn = await _connect()
+    try:
+        cursor = await conn.execute("PRAGMA auto_vacuum")
+        incremental = (await cursor.fetchone())[0] == 2
+        if not incremental and convert:
+            print("🗄️ Converting database to incremental auto_vacuum (full VACUUM)")
+            await conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            await conn.execute("VACUUM")
+            incremental = True
+
+        cursor = await conn.execute("PRAGMA freelist_count")
+        free_pages = (await cursor.fetchone())[0]
+        if free_pages and incremental:
+            cursor = await conn.execute(f"PRAGMA incremental_vacuum({int(vacuum_pages)})")
+            await cursor.fetchall()
+        cursor = await conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        busy, wal_pages, _ = await cursor.fetchone()
+        return {
+            "free_pages": free_pages,
+            "wal_pages": wal_pages,
+            "checkpoint_busy": bool(busy),
+            "incremental": incremental,
+        }
+    finally:
+        await conn.close()
+
+
+# ─── Backfill Checkpoints ───────────────────────────────────────
+
+
+async def get_backfill_checkpoint(user_id: int, source: int, target: int) -> dict | None:
+    async with reader() as db:
+        cursor = await db.execute(
+            """SELECT * FROM backfill_checkpoints
+               WHERE user_id = ? AND source_chat_id = ? AND target_chat_id = ?""",
+            (user_id, source, target),
+        )
+        return row_to_dict(await cursor.fetchone())
+
+
+async def save_backfill_checkpoint(
+    user_id: int, source: int, target: int, last_message_id: int, to_message_id: int
+):
     db = await get_db()
-    cursor = await db.execute(
-        "SELECT * FROM forwarded_messages WHERE user_id = ?", (user_id,)
+    await db.execute(
+        """INSERT INTO backfill_checkpoints
+               (user_id, source_chat_id, target_chat_id, last_message_id, to_message_id, updated_at)
+           VALUES (?, ?, ?, ?, ?, datetime('now'))
+           ON CONFLICT(user_id, source_chat_id, target_chat_id)
+           DO UPDATE SET last_message_id = excluded.last_message_id,
+                         to_message_id = excluded.to_message_id,
+                         updated_at = excluded.updated_at""",
+        (user_id, source, target, last_message_id, to_message_id),
     )
-    return rows_to_list(await cursor.fetchall())
+    await db.commit()
@@ -0,0 +1,108 @@
+import asyncio
+import config
+import db as db_module
+from logger import get_unsynced_messages
+
+
+class _Route:
+    """Known forwarded IDs of one (user, source, target) route.
+
+    ``ids`` holds every ID in [low, high] that was forwarded, so anything above
+    ``high`` is new and anything in the window is answered from memory. IDs up
+    to ``floor`` (the retention watermark) were forwarded and pruned. Only IDs
+    between ``floor`` and ``low`` still need the database, unless they are in
+    ``ids`` as logged but not yet synced.
+    """
+
+    __slots__ = ("ids", "low", "high", "floor")
+
+    def __init__(self, ids, low: int, floor: int = 0):
+        self.ids = set(ids)
+        self.low = low
+        self.floor = floor
+        self.high = max(max(self.ids, default=0), floor)
+
+    def add(self, message_id: int):
+        self.ids.add(message_id)
+        if message_id > self.high:
+            self.high = message_id
+
+    def trim(self, keep: int):
+        # Drop the oldest IDs; by then they have long been synced to the DB,
+        # which answers for anything below ``low``.
+        ordered = sorted(self.ids)
+        dropped = ordered[: len(ordered) - keep]
+        if dropped:
+            self.ids.difference_update(dropped)
+            self.low = dropped[-1] + 1
+
+
+class DedupIndex:
+    """In-memory dedup index consulted before forwarded_messages"""
+
+    def __init__(self, window: int = 5000):
+        self.window = window
+        self._routes = {}  # (user_id, source, target) -> _Route
+        self._locks = {}
+        self._pending = None  # unsynced log entries grouped by route
+
+    async def warm(self, user_id: int, source: int, target: int) -> _Route:
+        key = (user_id, source, target)
+        route = self._routes.get(key)
+        if route is not None:
+            return route
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            route = self._routes.get(key)
+            if route is not None:
+                return route
+
+            ids = await db_module.get_recent_forwarded_message_ids(
+                user_id, source, target, self.window
+            )
+            # A full window may have older rows behind it; otherwise the
+            # route is completely in memory.
+            low = min(ids) if len(ids) >= self.window else 0
+
+            floor = await db_module.get_forwarded_watermark(user_id, source, target)
+            pending = await self._pending_for(key)
+            route = _Route(ids, low, floor)
+            for message_id in pending:
+                route.add(message_id)
+
+            self._routes[key] = route
+            self._locks.pop(key, None)
+            return route
+
+    async def _pending_for(self, key) -> list:
+        """Entries logged but not yet synced to the DB, read once per process."""
+        if self._pending is None:
+            self._pending = {}
+            for entry in await get_unsynced_messages():
+                route_key = (entry["user_id"], entry["source"], entry["target"])
+                self._pending.setdefault(route_key, []).append(entry["message_id"])
+        return self._pending.pop(key, [])
+
+    async def contains(self, user_id: int, source: int, target: int, message_id: int) -> bool:
+        route = await self.warm(user_id, source, target)
+        if message_id > route.high:
+            return False
+        if message_id <= route.floor:
+            return True
+        if message_id >= route.low:
+            return message_id in route.ids
+        # Unsynced IDs below a full DB window are only in memory
+        if message_id in route.ids:
+            return True
+        # Also checks the watermark, which retention may have raised since warm()
+        return await db_module.was_forwarded(user_id, source, target, message_id)
+
+    async def add(self, user_id: int, source: int, target: int, message_id: int):
+        route = await self.warm(user_id, source, target)
+        route.add(message_id)
+        if len(route.ids) > 2 * self.window:
+            route.trim(self.window)
+
+
+dedup_index = DedupIndex(config.DEDUP_WINDOW)
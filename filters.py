@@ -1,6 +1,50 @@
 import json
+import re
 from enum import Enum
+import config
 import db as db_module
+from cache import LRUCache
+
+# Process-wide filter cache keyed by (user_id, source_chat_id); each entry
+# maps target_chat_id (0 = source-wide default) to its FilterConfig
+_filter_cache = LRUCache(config.FILTER_CACHE_SIZE, config.FILTER_CACHE_TTL)
+
+# Per-user counter bumped by every save()/delete() below; anything derived
+# from a user's targets, sources or filters can be cached under it.
+_config_versions = {}
+
+
+def config_version(user_id: int) -> int:
+    """Current version of a user's target/source/filter configuration"""
+    return _config_versions.get(user_id, 0)
+
+
+def _bump_config_version(user_id: int):
+    _config_versions[user_id] = _config_versions.get(user_id, 0) + 1
+
+
+# Callbacks told (with the user_id) that a user's sources or targets, i.e.
+# the routing topology, changed; running realtime sessions listen here.
+_topology_listeners = []
+
+
+def on_topology_change(callback):
+    """Register callback(user_id), called after a source/target save or delete.
+
+    Callbacks run synchronously inside save()/delete() and must not block;
+    schedule any real work as a task.
+    """
+    _topology_listeners.append(callback)
+    return callback
+
+
+def _notify_topology_change(user_id: int):
+    _bump_config_version(user_id)
+    for callback in _topology_listeners:
+        try:
+            callback(user_id)
+        except Exception as e:
+            print(f"⚠️ Topology listener error for user {user_id}: {e}")
 
 
 class MediaType(Enum):
@@ -17,7 +61,11 @@ class MediaType(Enum):
 
 
 class FilterConfig:
-    """Filter configuration for a source chat"""
+    """Filter configuration for a source chat.
+
+    target_chat_id 0 is the source-wide filter; a row for a specific target
+    overrides it on that (source, target) edge only.
+    """
 
     def __init__(
         self,
@@ -41,9 +89,11 @@ class FilterConfig:
         # Advanced
         only_from_users: list = None,  # Only from specific users
         block_from_users: list = None,  # Block from specific users
+        target_chat_id: int = 0,  # 0 = every target of the source
     ):
         self.user_id = user_id
         self.source_chat_id = source_chat_id
+        self.target_chat_id = target_chat_id
         self.media_types = media_types or [MediaType.ALL]
         self.min_duration = min_duration
         self.max_duration = max_duration
@@ -62,11 +112,13 @@ class FilterConfig:
         # Advanced
         self.only_from_users = only_from_users or []
         self.block_from_users = block_from_users or []
+        self._compiled = None
 
     def to_dict(self):
         return {
             "user_id": self.user_id,
             "source_chat_id": self.source_chat_id,
+            "target_chat_id": self.target_chat_id,
             "media_types": [m.value for m in self.media_types],
             "min_duration": self.min_duration,
             "max_duration": self.max_duration,
@@ -102,6 +154,18 @@ class FilterConfig:
             block_list=data.get("block_list", []),
             only_from_users=data.get("only_from_users", []),
             block_from_users=data.get("block_from_users", []),
+            target_chat_id=data.get("target_chat_id", 0),
+        )
+
+    def copy(self) -> "FilterConfig":
+        """Independent copy to edit and save().
+
+        get() returns the instance shared through the cache with every
+        forwarder, so it must never be modified in place.
+        """
+        data = self.to_dict()
+        return FilterConfig.from_dict(
+            {k: list(v) if isinstance(v, list) else v for k, v in data.items()}
         )
 
     async def save(self):
@@ -110,14 +174,16 @@ class FilterConfig:
         db = await db_module.get_db()
         await db.execute(
             """INSERT OR REPLACE INTO filters
-               (user_id, source_chat_id, media_types, min_duration, max_duration,
-                dc_ids, enabled, remove_caption, remove_forward_header,
-                min_file_size, max_file_size, require_caption, require_hashtags,
-                block_list, only_from_users, block_from_users)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+               (user_id, source_chat_id, target_chat_id, media_types,
+                min_duration, max_duration, dc_ids, enabled, remove_caption,
+                remove_forward_header, min_file_size, max_file_size,
+                require_caption, require_hashtags, block_list,
+                only_from_users, block_from_users)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
             (
                 d["user_id"],
                 d["source_chat_id"],
+                d["target_chat_id"],
                 json.dumps(d["media_types"]),
                 d["min_duration"],
                 d["max_duration"],
@@ -135,87 +201,290 @@ class FilterConfig:
             ),
         )
         await db.commit()
+        self._compiled = None
+        _filter_cache.invalidate((self.user_id, self.source_chat_id))
+        _bump_config_version(self.user_id)
 
-    @staticmethod
-    async def get(user_id: int, source_chat_id: int) -> "FilterConfig":
+    async def delete(self):
+        """Drop this filter row; an edge falls back to the source-wide filter."""
         db = await db_module.get_db()
-        cursor = await db.execute(
-            "SELECT * FROM filters WHERE user_id = ? AND source_chat_id = ?",
-            (user_id, source_chat_id),
+        await db.execute(
+            """DELETE FROM filters
+               WHERE user_id = ? AND source_chat_id = ? AND target_chat_id = ?""",
+            (self.user_id, self.source_chat_id, self.target_chat_id),
         )
-        row = await cursor.fetchone()
-        if row:
-            return FilterConfig.from_dict(_row_to_filter_dict(row))
-        return FilterConfig(user_id=user_id, source_chat_id=source_chat_id)
+        await db.commit()
+        _filter_cache.invalidate((self.user_id, self.source_chat_id))
+        _bump_config_version(self.user_id)
 
     @staticmethod
-    async def get_all(user_id: int) -> list:
+    async def get(
+        user_id: int, source_chat_id: int, target_chat_id: int = 0
+    ) -> "FilterConfig":
+        """Filter for the (source, target) edge, else the source-wide one.
+
+        All rows of a source are loaded and cached together, so a fan-out
+        to many targets costs one query. The result is shared; edit a copy().
+        """
+        key = (user_id, source_chat_id)
+        by_target = _filter_cache.get(key)
+        if by_target is None:
+            generation = _filter_cache.generation
+            async with db_module.reader() as db:
+                cursor = await db.execute(
+                    "SELECT * FROM filters WHERE user_id = ? AND source_chat_id = ?",
+                    (user_id, source_chat_id),
+                )
+                rows = await cursor.fetchall()
+            by_target = {
+                r["target_chat_id"]: FilterConfig.from_dict(_row_to_filter_dict(r))
+                for r in rows
+            }
+            if 0 not in by_target:
+                by_target[0] = FilterConfig(user_id=user_id, source_chat_id=source_chat_id)
+            _filter_cache.set(key, by_target, generation)
+        return by_target.get(target_chat_id) or by_target[0]
+
+    @staticmethod
+    async def bulk_update(user_id: int, target_chat_id: int = None, **fields) -> int:
+        """Apply the same partial update to the filters of many sources at once.
+
+        With target_chat_id None, every source-wide filter of the user is
+        written by one INSERT ... SELECT ... ON CONFLICT statement; sources
+        without a filter row get one with the defaults plus fields, and edge
+        overrides are left alone.
+
+        With a target, only the (source, target) edge filters of that target
+        are written, so the sources' other targets keep their filters. Edges
+        without an override first get a copy of their source-wide filter (or
+        the defaults), then all of them are updated, in one transaction.
+        Returns the number of filters written.
+        """
+        unknown = set(fields) - set(_FILTER_COLUMNS) - {"enabled"}
+        if unknown or not fields:
+            raise ValueError(f"Unknown filter fields: {', '.join(sorted(unknown)) or '(none)'}")
+
+        columns = list(fields)
+        values = [_filter_value_to_db(name, fields[name]) for name in columns]
+        all_columns = ", ".join(_FILTER_COLUMNS + ("enabled",))
+
         db = await db_module.get_db()
-        cursor = await db.execute(
-            "SELECT * FROM filters WHERE user_id = ?", (user_id,)
-        )
-        rows = await cursor.fetchall()
-        return [FilterConfig.from_dict(_row_to_filter_dict(r)) for r in rows]
+        try:
+            if target_chat_id is None:
+                cursor = await db.execute(
+                    f"""INSERT INTO filters (user_id, source_chat_id, {", ".join(columns)})
+                        SELECT DISTINCT user_id, source_chat_id, {", ".join("?" for _ in columns)}
+                        FROM sources WHERE user_id = ?
+                        ON CONFLICT(user_id, source_chat_id, target_chat_id)
+                        DO UPDATE SET {", ".join(f"{c} = excluded.{c}" for c in columns)}
+                        RETURNING source_chat_id""",
+                    values + [user_id],
+                )
+            else:
+                edge = (user_id, target_chat_id)
+                await db.execute(
+                    f"""INSERT OR IGNORE INTO filters
+                            (user_id, source_chat_id, target_chat_id, {all_columns})
+                        SELECT s.user_id, s.source_chat_id, s.target_chat_id,
+                               {", ".join(f"f.{c}" for c in _FILTER_COLUMNS + ("enabled",))}
+                        FROM sources s
+                        JOIN filters f
+                          ON f.user_id = s.user_id AND f.source_chat_id = s.source_chat_id
+                         AND f.target_chat_id = 0
+                        WHERE s.user_id = ? AND s.target_chat_id = ?""",
+                    edge,
+                )
+                await db.execute(
+                    """INSERT OR IGNORE INTO filters (user_id, source_chat_id, target_chat_id)
+                       SELECT user_id, source_chat_id, target_chat_id
+                       FROM sources WHERE user_id = ? AND target_chat_id = ?""",
+                    edge,
+                )
+                cursor = await db.execute(
+                    f"""UPDATE filters SET {", ".join(f"{c} = ?" for c in columns)}
+                        WHERE user_id = ? AND target_chat_id = ?
+                          AND source_chat_id IN (
+                              SELECT source_chat_id FROM sources
+                              WHERE user_id = ? AND target_chat_id = ?)
+                        RETURNING source_chat_id""",
+                    values + list(edge) + list(edge),
+                )
+            updated = [row[0] for row in await cursor.fetchall()]
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+        for source_chat_id in updated:
+            _filter_cache.invalidate((user_id, source_chat_id))
+        _bump_config_version(user_id)
+        return len(updated)
+
+    @staticmethod
+    async def get_overrides(
+        user_id: int, source_chat_id: int = None, target_chat_id: int = None
+    ) -> list:
+        """(source, target) edges that have their own filter, so changes to
+        the source-wide filter do not reach them."""
+        query = "SELECT source_chat_id, target_chat_id FROM filters WHERE user_id = ?"
+        query += " AND target_chat_id != 0"
+        params = [user_id]
+        if source_chat_id is not None:
+            query += " AND source_chat_id = ?"
+            params.append(source_chat_id)
+        if target_chat_id is not None:
+            query += " AND target_chat_id = ?"
+            params.append(target_chat_id)
+        async with db_module.reader() as db:
+            cursor = await db.execute(query + " ORDER BY rowid", params)
+            return [tuple(r) for r in await cursor.fetchall()]
+
+    @staticmethod
+    async def reset_overrides(
+        user_id: int, source_chat_id: int = None, target_chat_id: int = None
+    ) -> int:
+        """Drop edge filters so those edges use the source-wide one again.
+
+        Returns the number of filters dropped.
+        """
+        query = "DELETE FROM filters WHERE user_id = ? AND target_chat_id != 0"
+        params = [user_id]
+        if source_chat_id is not None:
+            query += " AND source_chat_id = ?"
+            params.append(source_chat_id)
+        if target_chat_id is not None:
+            query += " AND target_chat_id = ?"
+            params.append(target_chat_id)
+        db = await db_module.get_db()
+        cursor = await db.execute(query + " RETURNING source_chat_id", params)
+        dropped = [row[0] for row in await cursor.fetchall()]
+        await db.commit()
+        for source in set(dropped):
+            _filter_cache.invalidate((user_id, source))
+        _bump_config_version(user_id)
+        return len(dropped)
+
+    @staticmethod
+    def cache_stats() -> dict:
+        """Hit/miss counters of the filter cache"""
+        return _filter_cache.stats()
+
+    @staticmethod
+    async def get_all(user_id: int) -> list:
+        async with db_module.reader() as db:
+            cursor = await db.execute(
+                "SELECT * FROM filters WHERE user_id = ?", (user_id,)
+            )
+            rows = await cursor.fetchall()
+            return [FilterConfig.from_dict(_row_to_filter_dict(r)) for r in rows]
+
+    def compile(self) -> "CompiledFilter":
+        """Return the precomputed predicate for this config (built once)."""
+        if self._compiled is None:
+            self._compiled = CompiledFilter(self)
+        return self._compiled
+
+    def matches(self, message) -> bool:
+        return self.compile().matches(message)
+
+    def _get_media_type(self, message) -> MediaType:
+        return get_media_type(message)
+
+
+class CompiledFilter:
+    """Immutable predicate built from a FilterConfig.
+
+    Membership tests use frozensets and the block list is a single regex
+    built from a trie of the words, so a check does not grow with the size
+    of the lists.
+    """
+
+    __slots__ = (
+        "enabled",
+        "media_types",
+        "min_duration",
+        "max_duration",
+        "min_file_size",
+        "max_file_size",
+        "require_caption",
+        "require_hashtags",
+        "block_pattern",
+        "only_from_users",
+        "block_from_users",
+    )
+
+    def __init__(self, filter_config: FilterConfig):
+        media_types = filter_config.media_types
+        fields = {
+            "enabled": filter_config.enabled,
+            # None = every media type is accepted
+            "media_types": (
+                None if MediaType.ALL in media_types else frozenset(media_types)
+            ),
+            "min_duration": filter_config.min_duration or 0,
+            "max_duration": filter_config.max_duration or None,
+            "min_file_size": filter_config.min_file_size or 0,
+            "max_file_size": filter_config.max_file_size or None,
+            "require_caption": filter_config.require_caption,
+            "require_hashtags": filter_config.require_hashtags,
+            "block_pattern": _compile_block_list(filter_config.block_list),
+            "only_from_users": frozenset(filter_config.only_from_users),
+            "block_from_users": frozenset(filter_config.block_from_users),
+        }
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledFilter is immutable")
 
     def matches(self, message) -> bool:
         if not self.enabled:
             return False
 
-        media_type = self._get_media_type(message)
+        media_type = get_media_type(message)
 
         # Check media type
-        if MediaType.ALL not in self.media_types:
-            if media_type not in self.media_types:
-                return False
+        if self.media_types is not None and media_type not in self.media_types:
+            return False
 
         # Check video duration
-        if media_type == MediaType.VIDEO:
-            if message.video and message.video.duration:
-                if message.video.duration < self.min_duration:
-                    return False
-                if self.max_duration and message.video.duration > self.max_duration:
-                    return False
+        if media_type == MediaType.VIDEO and message.video.duration:
+            duration = message.video.duration
+            if duration < self.min_duration:
+                return False
+            if self.max_duration and duration > self.max_duration:
+                return False
 
         # Check file size
-        if message.document or message.video or message.audio:
-            file_size = (
-                message.document.file_size
-                or message.video.file_size
-                or message.audio.file_size
-                or 0
-            )
+        media = message.document or message.video or message.audio
+        if media:
+            file_size = media.file_size or 0
             if file_size < self.min_file_size:
                 return False
             if self.max_file_size and file_size > self.max_file_size:
                 return False
 
+        caption = message.caption or ""
+
         # Check require caption
-        if self.require_caption:
-            if not message.caption or not message.caption.text.strip():
-                return False
+        if self.require_caption and not caption.strip():
+            return False
 
         # Check require hashtags
-        if self.require_hashtags:
-            if not message.caption:
-                return False
-            text = message.caption.text or ""
-            if "#" not in text:
-                return False
+        if self.require_hashtags and "#" not in caption:
+            return False
 
         # Check block list
-        if self.block_list and message.caption:
-            text = message.caption.text or ""
-            text_lower = text.lower()
-            for blocked in self.block_list:
-                if blocked.lower() in text_lower:
-                    return False
+        if self.block_pattern and caption:
+            if self.block_pattern.search(caption.lower()):
+                return False
 
         # Check user filters
         if message.from_user:
             user_id = message.from_user.id
 
             # Block from specific users
-            if self.block_from_users and user_id in self.block_from_users:
+            if user_id in self.block_from_users:
                 return False
 
             # Only from specific users
@@ -224,25 +493,26 @@ class FilterConfig:
 
         return True
 
-    def _get_media_type(self, message) -> MediaType:
-        if message.video:
-            return MediaType.VIDEO
-        elif message.photo:
-            return MediaType.PHOTO
-        elif message.document:
-            return MediaType.DOCUMENT
-        elif message.audio:
-            return MediaType.AUDIO
-        elif message.voice:
-            return MediaType.VOICE
-        elif message.video_note:
-            return MediaType.VIDEO_NOTE
-        elif message.sticker:
-            return MediaType.STICKER
-        elif message.animation:
-            return MediaType.ANIMATION
-        else:
-            return MediaType.TEXT
+
+def get_media_type(message) -> MediaType:
+    if message.video:
+        return MediaType.VIDEO
+    elif message.photo:
+        return MediaType.PHOTO
+    elif message.document:
+        return MediaType.DOCUMENT
+    elif message.audio:
+        return MediaType.AUDIO
+    elif message.voice:
+        return MediaType.VOICE
+    elif message.video_note:
+        return MediaType.VIDEO_NOTE
+    elif message.sticker:
+        return MediaType.STICKER
+    elif message.animation:
+        return MediaType.ANIMATION
+    else:
+        return MediaType.TEXT
 
 
 class TargetConfig:
@@ -280,32 +550,117 @@ class TargetConfig:
     async def save(self):
         db = await db_module.get_db()
         await db.execute(
-            """INSERT OR REPLACE INTO targets (user_id, target_chat_id, name, enabled)
-               VALUES (?, ?, ?, ?)""",
+            # Upsert in place: a REPLACE would give the row a new rowid and
+            # move the target to the end of every listing
+            """INSERT INTO targets (user_id, target_chat_id, name, enabled)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(user_id, target_chat_id)
+               DO UPDATE SET name = excluded.name, enabled = excluded.enabled""",
             (self.user_id, self.target_chat_id, self.name, 1 if self.enabled else 0),
         )
         await db.commit()
+        _notify_topology_change(self.user_id)
 
     @staticmethod
     async def get(user_id: int, target_chat_id: int):
-        db = await db_module.get_db()
-        cursor = await db.execute(
-            "SELECT * FROM targets WHERE user_id = ? AND target_chat_id = ?",
-            (user_id, target_chat_id),
-        )
-        row = await cursor.fetchone()
+        async with db_module.reader() as db:
+            cursor = await db.execute(
+                "SELECT * FROM targets WHERE user_id = ? AND target_chat_id = ?",
+                (user_id, target_chat_id),
+            )
+            row = await cursor.fetchone()
         if row:
             return TargetConfig.from_dict(dict(row))
         return None
 
     @staticmethod
     async def get_all(user_id: int) -> list:
-        db = await db_module.get_db()
-        cursor = await db.execute(
-            "SELECT * FROM targets WHERE user_id = ?", (user_id,)
-        )
-        rows = await cursor.fetchall()
-        return [TargetConfig.from_dict(dict(r)) for r in rows]
+        async with db_module.reader() as db:
+            cursor = await db.execute(
+                "SELECT * FROM targets WHERE user_id = ? ORDER BY rowid", (user_id,)
+            )
+            rows = await cursor.fetchall()
+            return [TargetConfig.from_dict(dict(r)) for r in rows]
+
+    @staticmethod
+    async def count(user_id: int) -> int:
+        async with db_module.reader() as db:
+            cursor = await db.execute(
+                "SELECT COUNT(*) FROM targets WHERE user_id = ?", (user_id,)
+            )
+            return (await cursor.fetchone())[0]
+
+    @staticmethod
+    async def get_all_with_sources(
+        user_id: int, target_chat_id: int = None, limit: int = None, offset: int = 0
+    ) -> list:
+        """Targets with their sources and each source's filter, in one query.
+
+        Returns [(TargetConfig, [(SourceConfig, FilterConfig), ...]), ...],
+        optionally for a single target, instead of get_sources() per target
+        plus FilterConfig.get() per source. Each source carries the filter of
+        its edge to that target, else its source-wide filter, else the
+        default FilterConfig. With limit/offset only that page of targets is
+        read, and only their sources are joined.
+        """
+        target_query = """SELECT rowid AS position, user_id, target_chat_id, name, enabled
+                          FROM targets WHERE user_id = ?"""
+        params = [user_id]
+        if target_chat_id is not None:
+            target_query += " AND target_chat_id = ?"
+            params.append(target_chat_id)
+        # Targets in insertion order, like get_all()
+        target_query += " ORDER BY rowid LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+
+        filter_columns = ", ".join(f"f.{c}" for c in _FILTER_COLUMNS)
+        query = f"""WITH t AS ({target_query})
+                    SELECT t.user_id, t.target_chat_id, t.name, t.enabled,
+                           s.source_chat_id, s.enabled AS source_enabled,
+                           f.source_chat_id AS filter_source, f.enabled AS filter_enabled,
+                           f.target_chat_id AS filter_target,
+                           {filter_columns}
+                    FROM t
+                    LEFT JOIN sources s
+                      ON s.user_id = t.user_id AND s.target_chat_id = t.target_chat_id
+                    LEFT JOIN filters f
+                      ON f.user_id = s.user_id AND f.source_chat_id = s.source_chat_id
+                     AND f.target_chat_id IN (0, s.target_chat_id)
+                    ORDER BY t.position, s.rowid, f.target_chat_id = 0"""
+        # f.target_chat_id = 0 sorts the edge's own filter before the source-wide one
+
+        async with db_module.reader() as db:
+            cursor = await db.execute(query, params)
+            rows = await cursor.fetchall()
+
+        targets = {}
+        for r in rows:
+            entry = targets.get(r["target_chat_id"])
+            if entry is None:
+                entry = targets[r["target_chat_id"]] = (TargetConfig.from_dict(dict(r)), [])
+            if r["source_chat_id"] is None:
+                continue  # target without sources
+            if entry[1] and entry[1][-1][0].source_chat_id == r["source_chat_id"]:
+                continue  # source-wide filter shadowed by the edge's own
+            source = SourceConfig(
+                user_id=user_id,
+                source_chat_id=r["source_chat_id"],
+                target_chat_id=r["target_chat_id"],
+                enabled=bool(r["source_enabled"]),
+            )
+            if r["filter_source"] is None:
+                filter_config = FilterConfig(user_id=user_id, source_chat_id=source.source_chat_id)
+            else:
+                data = {c: r[c] for c in _FILTER_COLUMNS}
+                data.update(
+                    user_id=user_id,
+                    source_chat_id=source.source_chat_id,
+                    target_chat_id=r["filter_target"],
+                    enabled=r["filter_enabled"],
+                )
+                filter_config = FilterConfig.from_dict(_row_to_filter_dict(data))
+            entry[1].append((source, filter_config))
+        return list(targets.values())
 
     @staticmethod
     async def delete(user_id: int, target_chat_id: int):
@@ -314,24 +669,36 @@ class TargetConfig:
             "DELETE FROM sources WHERE user_id = ? AND target_chat_id = ?",
             (user_id, target_chat_id),
         )
+        cursor = await db.execute(
+            """DELETE FROM filters WHERE user_id = ? AND target_chat_id = ?
+               RETURNING source_chat_id""",
+            (user_id, target_chat_id),
+        )
+        overridden = [row[0] for row in await cursor.fetchall()]
         await db.execute(
             "DELETE FROM targets WHERE user_id = ? AND target_chat_id = ?",
             (user_id, target_chat_id),
         )
         await db.commit()
+        for source_chat_id in overridden:
+            _filter_cache.invalidate((user_id, source_chat_id))
+        _notify_topology_change(user_id)
 
     async def get_sources(self) -> list:
-        db = await db_module.get_db()
-        cursor = await db.execute(
-            "SELECT * FROM sources WHERE user_id = ? AND target_chat_id = ?",
-            (self.user_id, self.target_chat_id),
-        )
-        rows = await cursor.fetchall()
-        return [SourceConfig.from_dict(dict(r)) for r in rows]
+        async with db_module.reader() as db:
+            cursor = await db.execute(
+                "SELECT * FROM sources WHERE user_id = ? AND target_chat_id = ? ORDER BY rowid",
+                (self.user_id, self.target_chat_id),
+            )
+            rows = await cursor.fetchall()
+            return [SourceConfig.from_dict(dict(r)) for r in rows]
 
 
 class SourceConfig:
-    """Configuration for a source chat"""
+    """One routing edge: messages of source_chat_id go to target_chat_id.
+
+    A source may have an edge to any number of targets.
+    """
 
     def __init__(
         self,
@@ -365,60 +732,111 @@ class SourceConfig:
     async def save(self):
         db = await db_module.get_db()
         await db.execute(
-            """INSERT OR REPLACE INTO sources (user_id, source_chat_id, target_chat_id, enabled)
-               VALUES (?, ?, ?, ?)""",
+            """INSERT INTO sources (user_id, source_chat_id, target_chat_id, enabled)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(user_id, source_chat_id, target_chat_id)
+               DO UPDATE SET enabled = excluded.enabled""",
             (self.user_id, self.source_chat_id, self.target_chat_id, 1 if self.enabled else 0),
         )
         await db.commit()
+        _notify_topology_change(self.user_id)
 
     @staticmethod
-    async def get(user_id: int, source_chat_id: int) -> "SourceConfig":
-        db = await db_module.get_db()
-        cursor = await db.execute(
-            "SELECT * FROM sources WHERE user_id = ? AND source_chat_id = ?",
-            (user_id, source_chat_id),
-        )
-        row = await cursor.fetchone()
+    async def get(
+        user_id: int, source_chat_id: int, target_chat_id: int = None
+    ) -> "SourceConfig":
+        """The edge to target_chat_id, or the source's first edge if None"""
+        query = "SELECT * FROM sources WHERE user_id = ? AND source_chat_id = ?"
+        params = [user_id, source_chat_id]
+        if target_chat_id is not None:
+            query += " AND target_chat_id = ?"
+            params.append(target_chat_id)
+        async with db_module.reader() as db:
+            cursor = await db.execute(query + " ORDER BY rowid LIMIT 1", params)
+            row = await cursor.fetchone()
         if row:
             return SourceConfig.from_dict(dict(row))
         return None
 
     @staticmethod
     async def get_all(user_id: int) -> list:
-        db = await db_module.get_db()
-        cursor = await db.execute(
-            "SELECT * FROM sources WHERE user_id = ?", (user_id,)
-        )
-        rows = await cursor.fetchall()
-        return [SourceConfig.from_dict(dict(r)) for r in rows]
+        async with db_module.reader() as db:
+            cursor = await db.execute(
+                "SELECT * FROM sources WHERE user_id = ? ORDER BY rowid", (user_id,)
+            )
+            rows = await cursor.fetchall()
+            return [SourceConfig.from_dict(dict(r)) for r in rows]
+
+    @staticmethod
+    async def get_routes(user_id: int) -> dict:
+        """{source_chat_id: [target_chat_id, ...]} over the enabled edges
+        into enabled targets"""
+        async with db_module.reader() as db:
+            cursor = await db.execute(
+                """SELECT s.source_chat_id, s.target_chat_id FROM sources s
+                   LEFT JOIN targets t
+                     ON t.user_id = s.user_id AND t.target_chat_id = s.target_chat_id
+                   WHERE s.user_id = ? AND s.enabled = 1
+                     AND COALESCE(t.enabled, 1) = 1
+                   ORDER BY s.rowid""",
+                (user_id,),
+            )
+            rows = await cursor.fetchall()
+        routes = {}
+        for source_chat_id, target_chat_id in rows:
+            routes.setdefault(source_chat_id, []).append(target_chat_id)
+        return routes
 
     @staticmethod
     async def get_by_target(user_id: int, target_chat_id: int) -> list:
-        db = await db_module.get_db()
-        cursor = await db.execute(
-            "SELECT * FROM sources WHERE user_id = ? AND target_chat_id = ?",
-            (user_id, target_chat_id),
-        )
-        rows = await cursor.fetchall()
-        return [SourceConfig.from_dict(dict(r)) for r in rows]
+        async with db_module.reader() as db:
+            cursor = await db.execute(
+                "SELECT * FROM sources WHERE user_id = ? AND target_chat_id = ? ORDER BY rowid",
+                (user_id, target_chat_id),
+            )
+            rows = await cursor.fetchall()
+            return [SourceConfig.from_dict(dict(r)) for r in rows]
 
     @staticmethod
-    async def delete(user_id: int, source_chat_id: int):
+    async def delete(user_id: int, source_chat_id: int, target_chat_id: int = None):
+        """Remove one edge and its filter override, or the whole source with
+        all its edges and filters when target_chat_id is None."""
+        where = "user_id = ? AND source_chat_id = ?"
+        params = [user_id, source_chat_id]
+        if target_chat_id is not None:
+            where += " AND target_chat_id = ?"
+            params.append(target_chat_id)
         db = await db_module.get_db()
-        await db.execute(
-            "DELETE FROM sources WHERE user_id = ? AND source_chat_id = ?",
-            (user_id, source_chat_id),
-        )
-        await db.execute(
-            "DELETE FROM filters WHERE user_id = ? AND source_chat_id = ?",
-            (user_id, source_chat_id),
-        )
+        await db.execute(f"DELETE FROM sources WHERE {where}", params)
+        await db.execute(f"DELETE FROM filters WHERE {where}", params)
         await db.commit()
+        _filter_cache.invalidate((user_id, source_chat_id))
+        _notify_topology_change(user_id)
 
 
 # ─── Helpers ─────────────────────────────────────────────────────
 
 
+# filters columns besides the key and enabled, as selected by joined queries
+_FILTER_COLUMNS = (
+    "media_types", "min_duration", "max_duration", "dc_ids",
+    "remove_caption", "remove_forward_header", "min_file_size", "max_file_size",
+    "require_caption", "require_hashtags", "block_list",
+    "only_from_users", "block_from_users",
+)
+
+
+def _filter_value_to_db(name: str, value):
+    """Encode one FilterConfig attribute the way save() stores it."""
+    if name == "media_types":
+        return json.dumps([m.value if isinstance(m, MediaType) else m for m in value])
+    if isinstance(value, list):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return 1 if value else 0
+    return value
+
+
 def _row_to_filter_dict(row) -> dict:
     """Convert a sqlite Row to a dict with JSON fields decoded."""
     d = dict(row)
@@ -434,6 +852,38 @@ def _row_to_filter_dict(row) -> dict:
     return d
 
 
+def _compile_block_list(words: list):
+    """Compile block words into one case-insensitive substring regex.
+
+    The words are merged into a trie first so shared prefixes are only
+    tried once per position of the caption. A word that has another word
+    as a prefix can never match first, so it is dropped from the trie.
+    """
+    if not words:
+        return None
+
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word.lower():
+            if "" in node:
+                break
+            node = node.setdefault(ch, {})
+        else:
+            node.clear()
+            node[""] = True
+
+    def render(node) -> str:
+        if "" in node:
+            return ""
+        branches = [re.escape(ch) + render(child) for ch, child in sorted(node.items())]
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    return re.compile(render(trie))
+
+
 def format_file_size(bytes_size: int) -> str:
     """Format bytes to human readable size"""
     if bytes_size < 1024:
@@ -0,0 +1,311 @@
+import asyncio
+from collections import deque
+from itertools import islice
+from pyrogram.errors import FloodWait
+import config
+from logger import log_message
+from ratelimit import rate_limiter
+from sync import is_message_forwarded, mark_message_forwarded
+
+# Telegram accepts at most 100 message IDs in one forwardMessages request
+MAX_IDS_PER_REQUEST = 100
+
+
+class ForwardJob:
+    """A message accepted by the filters and waiting to be copied.
+
+    ``done`` resolves to True once the message is delivered (or found already
+    forwarded) and to False if it was dropped after an error or a stop.
+    """
+
+    __slots__ = ("user_id", "source_id", "target_id", "message", "done", "queued_at")
+
+    def __init__(self, user_id: int, source_id: int, target_id: int, message):
+        self.user_id = user_id
+        self.source_id = source_id
+        self.target_id = target_id
+        self.message = message
+        self.done = asyncio.get_running_loop().create_future()
+        self.queued_at = 0.0
+
+    def resolve(self, delivered: bool):
+        if not self.done.done():
+            self.done.set_result(delivered)
+
+
+class ForwardEngine:
+    """Bounded worker pool with one FIFO queue per target chat.
+
+    A target is handed to at most one worker at a time, so messages keep their
+    order within a target while different targets are forwarded in parallel.
+    Workers take one job per turn and put the target back at the end of the
+    ready queue, so a busy target cannot starve the others. A target that is
+    rate limited is parked with ``call_later`` instead of holding a worker, so
+    the other targets keep flowing. A FloodWait pauses the whole account (the
+    rate limiter's client bucket of the user), since Telegram applies it there.
+
+    Messages that queue up behind an in-flight request go out together in one
+    multi-ID request. With ``batch_window`` > 0 an idle target also waits that
+    long after its first message to collect a burst, at the cost of latency.
+
+    Album parts arrive as separate updates, so an album at the end of a queue
+    is held until no new part has come for ``album_window`` seconds; it is
+    then sent in one request and stays grouped in the target.
+    """
+
+    def __init__(
+        self,
+        client,
+        workers: int = config.FORWARD_WORKERS,
+        max_pending: int = config.FORWARD_MAX_PENDING,
+        batch_size: int = config.FORWARD_BATCH_SIZE,
+        batch_window: float = config.FORWARD_BATCH_WINDOW,
+        album_window: float = config.FORWARD_ALBUM_WINDOW,
+    ):
+        self.client = client
+        self.workers = workers
+        self.batch_size = max(1, min(batch_size, MAX_IDS_PER_REQUEST))
+        self.batch_window = batch_window
+        self.album_window = album_window
+        self._queues = {}  # target_id -> deque of ForwardJob
+        self._ready = asyncio.Queue()  # targets with jobs and no worker
+        self._scheduled = set()  # targets in _ready or held by a worker
+        self._slots = asyncio.Semaphore(max_pending)
+        self._unfinished = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = []
+        self._timers = {}  # parked target_id -> call_later handle
+        self._album_holds = set()  # parked targets waiting for album parts
+        self._stopped = False
+
+    def start(self):
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self, drain: bool = True, timeout: float = config.FORWARD_DRAIN_TIMEOUT):
+        """Stop the workers, first waiting up to timeout seconds for the queue.
+
+        Jobs still queued after that, e.g. targets parked by a long FloodWait,
+        are dropped (resolved as not delivered): they were never logged, so
+        /backfill picks them up. So are jobs submitted once stop has begun.
+        """
+        self._stopped = True
+        if not self._tasks:
+            return
+        if drain:
+            try:
+                await asyncio.wait_for(self.join(), timeout)
+            except asyncio.TimeoutError:
+                print(f"⚠️ Stopped with {self._unfinished} messages unsent")
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._album_holds.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        for queue in self._queues.values():
+            for job in queue:
+                job.resolve(False)
+                self._slots.release()  # wakes submitters blocked on a full queue
+        self._queues.clear()
+        self._scheduled.clear()
+        self._unfinished = 0
+        self._idle.set()
+
+    async def join(self):
+        """Wait until every submitted job has been handled."""
+        await self._idle.wait()
+
+    async def submit(self, job: ForwardJob):
+        if self._stopped:
+            job.resolve(False)  # no worker is left to send it
+            return
+        await self._slots.acquire()  # back-pressure when too much is queued
+        if self._stopped:
+            self._slots.release()
+            job.resolve(False)
+            return
+        job.queued_at = asyncio.get_running_loop().time()
+        self._queues.setdefault(job.target_id, deque()).append(job)
+        self._unfinished += 1
+        self._idle.clear()
+        if job.target_id not in self._scheduled:
+            self._scheduled.add(job.target_id)
+            if self.batch_window > 0:
+                self._defer(job.target_id, self.batch_window)
+            else:
+                self._ready.put_nowait(job.target_id)
+        elif job.target_id in self._album_holds:
+            # The new message may complete the held album; let a worker re-check
+            self._timers.pop(job.target_id).cancel()
+            self._wake(job.target_id)
+
+    def pending(self) -> int:
+        return self._unfinished
+
+    def stopped(self) -> bool:
+        return self._stopped
+
+    async def _worker(self):
+        while True:
+            target_id = await self._ready.get()
+            queue = self._queues[target_id]
+            batch = self._take_batch(queue)
+            wait = self._hold_open_album(queue, batch)
+            if wait > 0:
+                self._defer(target_id, wait)
+                self._album_holds.add(target_id)
+                continue
+            delivered = False
+            try:
+                # A gap fill or backfill may have queued the same message twice,
+                # possibly both copies within this batch
+                fresh = []
+                seen = set()
+                for job in batch:
+                    if job.message.id in seen or await is_message_forwarded(
+                        job.user_id, job.source_id, job.target_id, job.message.id
+                    ):
+                        continue
+                    seen.add(job.message.id)
+                    fresh.append(job)
+                if fresh:
+                    # Keyed by account: backfill and realtime clients of one
+                    # user share Telegram's limits
+                    wait = rate_limiter.try_acquire(batch[0].user_id, target_id)
+                    if wait > 0:
+                        self._defer(target_id, wait)
+                        continue
+                    await self._deliver(fresh)
+                delivered = True
+            except FloodWait as e:
+                # The whole account waits; the batch stays at the head of its queue
+                wait = max(e.value, config.FLOOD_WAIT_DELAY)
+                print(f"⏳ FloodWait {wait}s for {self.client.name}")
+                rate_limiter.pause_client(batch[0].user_id, wait)
+                self._defer(target_id, wait)
+                continue
+            except Exception as e:
+                print(f"Forward error: {e}")
+
+            for job in batch:
+                queue.popleft()
+                self._slots.release()
+                job.resolve(delivered)
+            self._unfinished -= len(batch)
+            if not self._unfinished:
+                self._idle.set()
+            if queue:
+                self._ready.put_nowait(target_id)
+            else:
+                del self._queues[target_id]
+                self._scheduled.discard(target_id)
+
+    def _take_batch(self, queue: deque) -> list:
+        """Leading jobs of the queue that share a source, albums kept whole.
+
+        An album cut by batch_size is left for the next request, or, if it
+        starts the batch, taken whole past batch_size (albums hold at most 10
+        messages, far below MAX_IDS_PER_REQUEST).
+        """
+        first = queue[0]
+        batch = [first]
+        for job in islice(queue, 1, self.batch_size):
+            if job.source_id != first.source_id:
+                break
+            batch.append(job)
+
+        if len(queue) == len(batch):
+            return batch
+        group = batch[-1].message.media_group_id
+        following = queue[len(batch)]
+        if not group or following.source_id != first.source_id:
+            return batch
+        if following.message.media_group_id != group:
+            return batch
+
+        album_start = len(batch)
+        while album_start and batch[album_start - 1].message.media_group_id == group:
+            album_start -= 1
+        if album_start:
+            del batch[album_start:]
+            return batch
+        for job in islice(queue, len(batch), MAX_IDS_PER_REQUEST):
+            if job.source_id != first.source_id or job.message.media_group_id != group:
+                break
+            batch.append(job)
+        return batch
+
+    def _hold_open_album(self, queue: deque, batch: list) -> float:
+        """Drop an album that may still be receiving parts off the end of batch.
+
+        The album is complete once a newer message of its source is queued, or
+        when album_window has passed since its last part. Returns how long to
+        wait if nothing else is left to send (0 = send batch now).
+        """
+        last = batch[-1]
+        group = last.message.media_group_id
+        if not group or self.album_window <= 0:
+            return 0.0
+        for job in islice(queue, len(batch), None):
+            if job.source_id == last.source_id:
+                return 0.0
+        wait = last.queued_at + self.album_window - asyncio.get_running_loop().time()
+        if wait <= 0:
+            return 0.0
+        album_start = len(batch)
+        while album_start and batch[album_start - 1].message.media_group_id == group:
+            album_start -= 1
+        del batch[album_start:]
+        return 0.0 if batch else wait
+
+    def _defer(self, target_id: int, delay: float):
+        """Hand the target back to the pool once delay seconds have passed."""
+        loop = asyncio.get_running_loop()
+        self._timers[target_id] = loop.call_later(delay, self._wake, target_id)
+
+    def _wake(self, target_id: int):
+        self._timers.pop(target_id, None)
+        self._album_holds.discard(target_id)
+        self._ready.put_nowait(target_id)
+
+    async def _deliver(self, jobs: list):
+        first = jobs[0]
+        if len(jobs) == 1:
+            await self.client.copy_message(
+                chat_id=first.target_id,
+                from_chat_id=first.source_id,
+                message_id=first.message.id,
+            )
+        else:
+            # drop_author makes this a copy; albums sent together stay grouped
+            await self.client.forward_messages(
+                chat_id=first.target_id,
+                from_chat_id=first.source_id,
+                message_ids=[job.message.id for job in jobs],
+                drop_author=True,
+            )
+
+        for job in jobs:
+            message = job.message
+            await mark_message_forwarded(
+                job.user_id, job.source_id, job.target_id, message.id
+            )
+            await log_message(
+                job.user_id, job.source_id, job.target_id, message.id, _log_media_type(message)
+            )
+
+
+def _log_media_type(message):
+    if message.video:
+        return "video"
+    elif message.photo:
+        return "photo"
+    elif message.document:
+        return "document"
+    elif message.audio:
+        return "audio"
+    return None
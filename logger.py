@@ -1,114 +1,235 @@
 import os
 import json
+import struct
 import asyncio
-import aiofiles
+import zlib
 from datetime import datetime
-from pathlib import Path
+import config
 
-LOG_FILE = os.getenv("LOG_FILE", "message_ids.log")
+# Forwarded messages are appended to rotating segment files in LOG_DIR as
+# length-prefixed binary records. Syncing only moves the "committed" pointer
+# (segment, byte offset) forward; fully synced segments are deleted whole.
+LOG_FILE = config.LOG_FILE  # legacy JSON-lines log, migrated on first use
+LOG_DIR = config.LOG_DIR
 LOG_LOCK = asyncio.Lock()
 
+_HEADER = struct.Struct("<II")  # payload length, crc32 of payload
+_ENTRY = struct.Struct("<qqqqd")  # user_id, source, target, message_id, timestamp
+_COMMITTED_FILE = "committed"
 
-async def log_message(
-    user_id: int,
-    source_chat_id: int,
-    target_chat_id: int,
-    message_id: int,
-    media_type: str = None,
-):
-    """Log message ID to file (async)"""
-    entry = {
-        "timestamp": datetime.now().isoformat(),
+_writer = None  # open handle of the active segment
+_segment = 0  # sequence number of the active segment
+_pending = 0  # entries appended since the log was last drained
+_backlog_threshold = 0
+_backlog_listeners = []
+
+
+def _segment_path(seq: int) -> str:
+    return os.path.join(LOG_DIR, f"{seq:08d}.seg")
+
+
+def _list_segments() -> list:
+    if not os.path.isdir(LOG_DIR):
+        return []
+    return sorted(int(name[:-4]) for name in os.listdir(LOG_DIR) if name.endswith(".seg"))
+
+
+def _encode(user_id, source, target, message_id, timestamp, media_type) -> bytes:
+    payload = _ENTRY.pack(user_id, source, target, message_id, timestamp)
+    if media_type:
+        payload += media_type.encode()
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode(payload: bytes) -> dict:
+    user_id, source, target, message_id, timestamp = _ENTRY.unpack_from(payload)
+    media_type = payload[_ENTRY.size:].decode() or None
+    return {
+        "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
         "user_id": user_id,
-        "source": source_chat_id,
-        "target": target_chat_id,
+        "source": source,
+        "target": target,
         "message_id": message_id,
         "media_type": media_type,
         "synced": False,
     }
 
-    async with LOG_LOCK:
-        async with aiofiles.open(LOG_FILE, "a") as f:
-            await f.write(json.dumps(entry) + "\n")
 
+def _read_records(f):
+    """Yield (payload, end offset) until EOF or a torn/corrupt record."""
+    while True:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return
+        length, crc = _HEADER.unpack(header)
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        yield payload, f.tell()
+
+
+def _read_committed() -> tuple:
+    try:
+        with open(os.path.join(LOG_DIR, _COMMITTED_FILE)) as f:
+            seq, pos = f.read().split()
+            return int(seq), int(pos)
+    except (FileNotFoundError, ValueError):
+        segments = _list_segments()
+        return (segments[0] if segments else 1), 0
+
+
+def _write_committed(seq: int, pos: int):
+    path = os.path.join(LOG_DIR, _COMMITTED_FILE)
+    with open(path + ".tmp", "w") as f:
+        f.write(f"{seq} {pos}")
+    os.replace(path + ".tmp", path)
+
+
+def _open_writer():
+    global _writer, _segment
+    os.makedirs(LOG_DIR, exist_ok=True)
+    segments = _list_segments()
+    _segment = segments[-1] if segments else 1
+    path = _segment_path(_segment)
+
+    # Drop a record torn by a crash so later appends stay readable
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            valid = 0
+            for _, end in _read_records(f):
+                valid = end
+        if valid != os.path.getsize(path):
+            os.truncate(path, valid)
+
+    _writer = open(path, "ab")
+    _migrate_legacy_log()
+
+
+def _append(record: bytes):
+    global _writer, _segment
+    if _writer is None:
+        _open_writer()
+    _writer.write(record)
+    _writer.flush()
+    if _writer.tell() >= config.LOG_SEGMENT_SIZE:
+        _writer.close()
+        _segment += 1
+        _writer = open(_segment_path(_segment), "ab")
+
+
+def _migrate_legacy_log():
+    """Move unsynced entries of the old JSON-lines log into the segments."""
+    if not os.path.isfile(LOG_FILE):
+        return
+    with open(LOG_FILE) as f:
+        for line in f:
+            try:
+                entry = json.loads(line.strip())
+            except json.JSONDecodeError:
+                continue
+            if entry.get("synced", False):
+                continue
+            _append(
+                _encode(
+                    entry["user_id"],
+                    entry["source"],
+                    entry["target"],
+                    entry["message_id"],
+                    datetime.fromisoformat(entry["timestamp"]).timestamp(),
+                    entry.get("media_type"),
+                )
+            )
+    os.replace(LOG_FILE, LOG_FILE + ".migrated")
 
-async def get_unsynced_messages() -> list:
-    """Get all unsynced messages from log file"""
-    unsynced = []
-    if not os.path.exists(LOG_FILE):
-        return unsynced
 
-    async with LOG_LOCK:
-        async with aiofiles.open(LOG_FILE, "r") as f:
-            async for line in f:
-                try:
-                    entry = json.loads(line.strip())
-                    if not entry.get("synced", False):
-                        unsynced.append(entry)
-                except json.JSONDecodeError:
-                    continue
+async def log_message(
+    user_id: int,
+    source_chat_id: int,
+    target_chat_id: int,
+    message_id: int,
+    media_type: str = None,
+):
+    """Append a forwarded message to the log"""
+    record = _encode(
+        user_id,
+        source_chat_id,
+        target_chat_id,
+        message_id,
+        datetime.now().timestamp(),
+        media_type,
+    )
+    _append(record)
+
+    global _pending
+    _pending += 1
+    if _backlog_listeners and _pending >= _backlog_threshold:
+        for listener in _backlog_listeners:
+            listener()
+
+
+def on_backlog(threshold: int, listener):
+    """Call listener() whenever at least threshold entries await syncing."""
+    global _backlog_threshold
+    _backlog_threshold = threshold
+    if listener not in _backlog_listeners:
+        _backlog_listeners.append(listener)
+
+
+def pending_count() -> int:
+    """Approximate number of entries appended but not yet read by a sync."""
+    return _pending
+
+
+def _read_unsynced(limit: int = None) -> list:
+    seq, pos = _read_committed()
+    unsynced = []
+    for segment in _list_segments():
+        if segment < seq:
+            continue
+        with open(_segment_path(segment), "rb") as f:
+            if segment == seq:
+                f.seek(pos)
+            for payload, end in _read_records(f):
+                entry = _decode(payload)
+                entry["offset"] = (segment, end)
+                unsynced.append(entry)
+                if limit and len(unsynced) >= limit:
+                    return unsynced
     return unsynced
 
 
-async def mark_synced(message_ids: list):
-    """Mark messages as synced in log file"""
-    if not message_ids:
-        return
-
-    temp_file = LOG_FILE + ".tmp"
+async def get_unsynced_messages(limit: int = None) -> list:
+    """Get entries after the committed offset, oldest first (at most limit).
 
+    Each entry carries its log "offset"; pass it to mark_synced() to
+    acknowledge that entry and everything before it.
+    """
+    if _writer is None:
+        _open_writer()
+    global _pending
     async with LOG_LOCK:
-        # Read all entries
-        all_entries = []
-        if os.path.exists(LOG_FILE):
-            async with aiofiles.open(LOG_FILE, "r") as f:
-                async for line in f:
-                    try:
-                        entry = json.loads(line.strip())
-                        if entry.get("message_id") in message_ids:
-                            entry["synced"] = True
-                            entry["synced_at"] = datetime.now().isoformat()
-                        all_entries.append(entry)
-                    except json.JSONDecodeError:
-                        continue
-
-        # Write back
-        async with aiofiles.open(temp_file, "w") as f:
-            for entry in all_entries:
-                await f.write(json.dumps(entry) + "\n")
-
-        os.replace(temp_file, LOG_FILE)
+        unsynced = await asyncio.to_thread(_read_unsynced, limit)
+    if not unsynced:
+        _pending = 0
+    return unsynced
 
 
-async def cleanup_synced_messages():
-    """Remove synced messages older than 7 days"""
-    if not os.path.exists(LOG_FILE):
+async def mark_synced(offset: tuple):
+    """Move the committed pointer past the entry at offset"""
+    if not offset:
         return
+    async with LOG_LOCK:
+        _write_committed(*offset)
 
-    temp_file = LOG_FILE + ".tmp"
-    cutoff = datetime.now().timestamp() - (7 * 24 * 60 * 60)  # 7 days
 
+async def cleanup_synced_messages():
+    """Delete segments that lie entirely before the committed pointer"""
     async with LOG_LOCK:
-        async with aiofiles.open(LOG_FILE, "r") as f:
-            async with aiofiles.open(temp_file, "w") as out:
-                async for line in f:
-                    try:
-                        entry = json.loads(line.strip())
-                        # Keep if not synced OR recently synced (within 24h)
-                        if not entry.get("synced"):
-                            await out.write(line)
-                        else:
-                            # Check if synced within 24h
-                            if entry.get("synced_at"):
-                                synced_time = datetime.fromisoformat(
-                                    entry["synced_at"]
-                                ).timestamp()
-                                if datetime.now().timestamp() - synced_time < 86400:
-                                    await out.write(line)
-                    except json.JSONDecodeError:
-                        continue
-
-        os.replace(temp_file, LOG_FILE)
+        seq, _ = _read_committed()
+        for segment in _list_segments():
+            if segment >= seq or segment == _segment:
+                break
+            os.remove(_segment_path(segment))
 
 
 async def get_all_forwarded_ids(user_id: int = None) -> dict:
@@ -1,8 +1,52 @@
+import functools
+import inspect
 from pyrogram import types
-from filters import FilterConfig, MediaType, SourceConfig, TargetConfig
+import config
+from cache import LRUCache
+from callbacks import CallbackRouter
+from filters import FilterConfig, MediaType, SourceConfig, TargetConfig, config_version
 
 PAGE_SIZE = 5
 
+router = CallbackRouter()
+
+# Rendered keyboards keyed by (builder, user_id, args, config version). Any
+# save/delete moves the user to a new version, so stale entries are never
+# served again and simply age out of the LRU.
+_keyboard_cache = LRUCache(config.KEYBOARD_CACHE_SIZE)
+
+
+def _cached_keyboard(builder):
+    params = list(inspect.signature(builder).parameters.values())[1:]
+
+    @functools.wraps(builder)
+    async def wrapper(user_id: int, *args):
+        # Fill defaults so build(u) and build(u, 0) share an entry
+        args += tuple(p.default for p in params[len(args) :])
+        # Read the version before building: a save racing the build then
+        # leaves the result under the old, already superseded version
+        key = (builder.__name__, user_id, args, config_version(user_id))
+        keyboard = _keyboard_cache.get(key)
+        if keyboard is None:
+            keyboard = await builder(user_id, *args)
+            _keyboard_cache.set(key, keyboard)
+        return keyboard
+
+    return wrapper
+
+
+def keyboard_cache_stats() -> dict:
+    """Hit/miss counters of the rendered keyboard cache"""
+    return _keyboard_cache.stats()
+
+
+# Names used in the "set all" confirmations
+_MEDIA_LABELS = {
+    MediaType.VIDEO: "Video",
+    MediaType.PHOTO: "Ảnh",
+    MediaType.DOCUMENT: "Document",
+}
+
 
 def get_media_icon(media_types: list) -> str:
     if MediaType.ALL in media_types:
@@ -28,54 +72,79 @@ def get_media_icon(media_types: list) -> str:
 
 def build_main_menu_keyboard():
     keyboard = [
-        [types.InlineKeyboardButton("📂 Quản lý Target", callback_data="menu_targets")],
         [
-            types.InlineKeyboardButton("📹 Video", callback_data="main_video"),
-            types.InlineKeyboardButton("📷 Ảnh", callback_data="main_photo"),
-            types.InlineKeyboardButton("📄 Doc", callback_data="main_doc"),
+            types.InlineKeyboardButton(
+                "📂 Quản lý Target", callback_data=router.pack("menu_targets")
+            )
+        ],
+        [
+            types.InlineKeyboardButton(
+                "📹 Video",
+                callback_data=router.pack("main_media", MediaType.VIDEO.value),
+            ),
+            types.InlineKeyboardButton(
+                "📷 Ảnh", callback_data=router.pack("main_media", MediaType.PHOTO.value)
+            ),
+            types.InlineKeyboardButton(
+                "📄 Doc",
+                callback_data=router.pack("main_media", MediaType.DOCUMENT.value),
+            ),
+        ],
+        [
+            types.InlineKeyboardButton(
+                "⏱ Duration", callback_data=router.pack("main_duration")
+            ),
+            types.InlineKeyboardButton(
+                "⚡ Realtime", callback_data=router.pack("main_realtime")
+            ),
         ],
         [
-            types.InlineKeyboardButton("⏱ Duration", callback_data="main_duration"),
-            types.InlineKeyboardButton("⚡ Realtime", callback_data="main_realtime"),
+            types.InlineKeyboardButton(
+                "📊 Thống kê", callback_data=router.pack("menu_stats")
+            )
         ],
-        [types.InlineKeyboardButton("📊 Thống kê", callback_data="menu_stats")],
     ]
     return types.InlineKeyboardMarkup(keyboard)
 
 
+@_cached_keyboard
 async def build_target_keyboard(user_id: int, page: int = 0):
-    targets = await TargetConfig.get_all(user_id)
-    total_pages = max(1, (len(targets) + PAGE_SIZE - 1) // PAGE_SIZE)
+    total = await TargetConfig.count(user_id)
+    total_pages = max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
+    # Only the visible page is loaded with its sources and filters
+    targets = await TargetConfig.get_all_with_sources(
+        user_id, limit=PAGE_SIZE, offset=page * PAGE_SIZE
+    )
 
     keyboard = []
     keyboard.append(
-        [types.InlineKeyboardButton("📂 DANH SÁCH TARGET", callback_data="noop")]
+        [
+            types.InlineKeyboardButton(
+                "📂 DANH SÁCH TARGET", callback_data=router.pack("noop")
+            )
+        ]
     )
 
-    start = page * PAGE_SIZE
-    end = start + PAGE_SIZE
-
-    for target in targets[start:end]:
-        sources = await target.get_sources()
+    for target, sources in targets:
         status = "🟢" if target.enabled else "🔴"
         keyboard.append(
             [
                 types.InlineKeyboardButton(
                     f"{status} {target.name} ({len(sources)} nguồn)",
-                    callback_data=f"target_view_{target.target_chat_id}",
+                    callback_data=router.pack("target_view", target.target_chat_id),
                 )
             ]
         )
 
-        for src in sources[:3]:
+        for src, filter_cfg in sources[:3]:
             src_status = "🟢" if src.enabled else "🔴"
-            filter_cfg = await FilterConfig.get(user_id, src.source_chat_id)
             media_icon = get_media_icon(filter_cfg.media_types)
             keyboard.append(
                 [
                     types.InlineKeyboardButton(
-                        f"  {src_status} {media_icon} {src.source_chat_id}",
-                        callback_data=f"src_edit_{src.source_chat_id}",
+                        f"  {src_status} {media_icon} {src.source_chat_id}"
+                        + _override_mark(filter_cfg),
+                        callback_data=router.pack("src_edit", src.source_chat_id),
                     )
                 ]
             )
@@ -85,7 +154,7 @@ async def build_target_keyboard(user_id: int, page: int = 0):
                 [
                     types.InlineKeyboardButton(
                         f"  +{len(sources) - 3} nguồn khác...",
-                        callback_data=f"target_view_{target.target_chat_id}",
+                        callback_data=router.pack("target_view", target.target_chat_id),
                     )
                 ]
             )
@@ -94,13 +163,14 @@ async def build_target_keyboard(user_id: int, page: int = 0):
             [
                 types.InlineKeyboardButton(
                     "➕ Thêm nguồn",
-                    callback_data=f"target_add_src_{target.target_chat_id}",
+                    callback_data=router.pack("target_add_src", target.target_chat_id),
                 ),
                 types.InlineKeyboardButton(
-                    "⚙️", callback_data=f"target_config_{target.target_chat_id}"
+                    "⚙️",
+                    callback_data=router.pack("target_config", target.target_chat_id),
                 ),
                 types.InlineKeyboardButton(
-                    "🗑️", callback_data=f"target_del_{target.target_chat_id}"
+                    "🗑️", callback_data=router.pack("target_del", target.target_chat_id)
                 ),
             ]
         )
@@ -108,47 +178,63 @@ async def build_target_keyboard(user_id: int, page: int = 0):
     nav = []
     if page > 0:
         nav.append(
-            types.InlineKeyboardButton("◀", callback_data=f"target_page_{page - 1}")
+            types.InlineKeyboardButton(
+                "◀", callback_data=router.pack("target_page", page - 1)
+            )
         )
     nav.append(
-        types.InlineKeyboardButton(f"{page + 1}/{total_pages}", callback_data="noop")
+        types.InlineKeyboardButton(
+            f"{page + 1}/{total_pages}", callback_data=router.pack("noop")
+        )
     )
     if page < total_pages - 1:
         nav.append(
-            types.InlineKeyboardButton("▶", callback_data=f"target_page_{page + 1}")
+            types.InlineKeyboardButton(
+                "▶", callback_data=router.pack("target_page", page + 1)
+            )
         )
     if nav:
         keyboard.append(nav)
 
     keyboard.append(
-        [types.InlineKeyboardButton("➕ Thêm Target mới", callback_data="target_add")]
+        [
+            types.InlineKeyboardButton(
+                "➕ Thêm Target mới", callback_data=router.pack("target_add")
+            )
+        ]
     )
     keyboard.append(
-        [types.InlineKeyboardButton("🔙 Quay lại", callback_data="menu_main")]
+        [
+            types.InlineKeyboardButton(
+                "🔙 Quay lại", callback_data=router.pack("menu_main")
+            )
+        ]
     )
     return types.InlineKeyboardMarkup(keyboard)
 
 
+@_cached_keyboard
 async def build_target_detail_keyboard(user_id: int, target_chat_id: int):
-    target = await TargetConfig.get(user_id, target_chat_id)
-    if not target:
+    found = await TargetConfig.get_all_with_sources(user_id, target_chat_id)
+    if not found:
         return await build_target_keyboard(user_id)
 
-    sources = await target.get_sources()
+    target, sources = found[0]
     keyboard = []
     status = "🟢" if target.enabled else "🔴"
     keyboard.append(
         [
             types.InlineKeyboardButton(
                 f"{status} 📂 {target.name}",
-                callback_data=f"target_toggle_{target_chat_id}",
+                callback_data=router.pack("target_toggle", target_chat_id),
             )
         ]
     )
-    keyboard.append([types.InlineKeyboardButton("📨 NGUỒN:", callback_data="noop")])
+    keyboard.append(
+        [types.InlineKeyboardButton("📨 NGUỒN:", callback_data=router.pack("noop"))]
+    )
 
-    for src in sources:
-        filter_cfg = await FilterConfig.get(user_id, src.source_chat_id)
+    for src, filter_cfg in sources:
         src_status = "🟢" if src.enabled else "🔴"
         media_icon = get_media_icon(filter_cfg.media_types)
         min_dur = filter_cfg.min_duration or 0
@@ -157,66 +243,110 @@ async def build_target_detail_keyboard(user_id: int, target_chat_id: int):
         keyboard.append(
             [
                 types.InlineKeyboardButton(
-                    f"{src_status} {media_icon} {src.source_chat_id}",
-                    callback_data=f"src_edit_{src.source_chat_id}",
+                    f"{src_status} {media_icon} {src.source_chat_id}"
+                    + _override_mark(filter_cfg),
+                    callback_data=router.pack("src_edit", src.source_chat_id),
                 ),
                 types.InlineKeyboardButton(
                     f"⏱{min_dur}-{max_dur}",
-                    callback_data=f"src_dur_{src.source_chat_id}",
+                    callback_data=router.pack("src_dur", src.source_chat_id),
                 ),
                 types.InlineKeyboardButton(
-                    "❌", callback_data=f"src_del_{src.source_chat_id}"
+                    "❌",
+                    callback_data=router.pack(
+                        "src_del", src.source_chat_id, target_chat_id
+                    ),
                 ),
             ]
         )
 
+    overridden = sum(1 for _, filter_cfg in sources if filter_cfg.target_chat_id)
+    if overridden:
+        keyboard.append(
+            [
+                types.InlineKeyboardButton(
+                    f"♻️ Bỏ filter riêng 🎯 ({overridden} nguồn)",
+                    callback_data=router.pack("target_reset_filters", target_chat_id),
+                )
+            ]
+        )
+
     keyboard.append(
         [
             types.InlineKeyboardButton(
                 "➕ Thêm nguồn vào target",
-                callback_data=f"target_add_src_{target_chat_id}",
+                callback_data=router.pack("target_add_src", target_chat_id),
             )
         ]
     )
     keyboard.append(
         [
             types.InlineKeyboardButton(
-                "🎯 Set all → Video", callback_data=f"target_set_video_{target_chat_id}"
+                "🎯 Set all → Video",
+                callback_data=router.pack(
+                    "target_set_media", MediaType.VIDEO.value, target_chat_id
+                ),
             )
         ]
     )
     keyboard.append(
         [
             types.InlineKeyboardButton(
-                "📷 Set all → Ảnh", callback_data=f"target_set_photo_{target_chat_id}"
+                "📷 Set all → Ảnh",
+                callback_data=router.pack(
+                    "target_set_media", MediaType.PHOTO.value, target_chat_id
+                ),
             )
         ]
     )
     keyboard.append(
-        [types.InlineKeyboardButton("🔙 Quay lại", callback_data="menu_targets")]
+        [
+            types.InlineKeyboardButton(
+                "🔙 Quay lại", callback_data=router.pack("menu_targets")
+            )
+        ]
     )
     return types.InlineKeyboardMarkup(keyboard)
 
 
+@_cached_keyboard
 async def build_filter_keyboard(user_id: int, source_chat_id: int, page: int = 0):
     filter_config = await FilterConfig.get(user_id, source_chat_id)
     source_config = await SourceConfig.get(user_id, source_chat_id)
     if not source_config:
         return await build_target_keyboard(user_id)
 
-    if page == 0:
-        return _build_filter_page_media(user_id, source_chat_id, filter_config)
-    elif page == 1:
-        return _build_filter_page_forward(user_id, source_chat_id, filter_config)
+    if page == 1:
+        markup = _build_filter_page_forward(user_id, source_chat_id, filter_config)
     elif page == 2:
-        return _build_filter_page_content(user_id, source_chat_id, filter_config)
+        markup = _build_filter_page_content(user_id, source_chat_id, filter_config)
     else:
-        return _build_filter_page_media(user_id, source_chat_id, filter_config)
+        markup = _build_filter_page_media(user_id, source_chat_id, filter_config)
+
+    # This editor changes the source-wide filter; say which targets ignore it
+    overrides = await FilterConfig.get_overrides(user_id, source_chat_id)
+    if overrides:
+        markup.inline_keyboard.insert(
+            1,
+            [
+                types.InlineKeyboardButton(
+                    f"🎯 {len(overrides)} target có filter riêng ➔ ♻️ Bỏ",
+                    callback_data=router.pack("src_reset_filters", source_chat_id),
+                )
+            ],
+        )
+    return markup
+
+
+def _override_mark(filter_config) -> str:
+    """Marks a source whose edge to the target has its own filter."""
+    return " 🎯" if filter_config.target_chat_id else ""
 
 
 def _get_target_id_for_back(user_id: int, source_chat_id: int):
     """Helper to get target_chat_id for back button without async."""
     import asyncio
+
     try:
         loop = asyncio.get_running_loop()
         if loop.is_running():
@@ -233,20 +363,22 @@ def _build_filter_page_media(user_id, source_chat_id, filter_config):
     keyboard.append(
         [
             types.InlineKeyboardButton(
-                f"📨 MEDIA - {source_chat_id}", callback_data="noop"
+                f"📨 MEDIA - {source_chat_id}", callback_data=router.pack("noop")
             )
         ]
     )
     keyboard.append(
         [
             types.InlineKeyboardButton(
-                "📨 Media", callback_data=f"filter_page_0_{source_chat_id}"
+                "📨 Media", callback_data=router.pack("filter_page", 0, source_chat_id)
             ),
             types.InlineKeyboardButton(
-                "📤 Forward", callback_data=f"filter_page_1_{source_chat_id}"
+                "📤 Forward",
+                callback_data=router.pack("filter_page", 1, source_chat_id),
             ),
             types.InlineKeyboardButton(
-                "📝 Content", callback_data=f"filter_page_2_{source_chat_id}"
+                "📝 Content",
+                callback_data=router.pack("filter_page", 2, source_chat_id),
             ),
         ]
     )
@@ -255,11 +387,14 @@ def _build_filter_page_media(user_id, source_chat_id, filter_config):
     keyboard.append(
         [
             types.InlineKeyboardButton(
-                f"▶️ {status}", callback_data=f"filter_toggle_{source_chat_id}"
+                f"▶️ {status}",
+                callback_data=router.pack("filter_toggle", source_chat_id),
             )
         ]
     )
-    keyboard.append([types.InlineKeyboardButton("Chọn loại:", callback_data="noop")])
+    keyboard.append(
+        [types.InlineKeyboardButton("Chọn loại:", callback_data=router.pack("noop"))]
+    )
 
     media_options = [
         (MediaType.VIDEO, "📹 Video"),
@@ -283,7 +418,7 @@ def _build_filter_page_media(user_id, source_chat_id, filter_config):
         row.append(
             types.InlineKeyboardButton(
                 f"{icon} {label}",
-                callback_data=f"media_toggle_{media.value}_{source_chat_id}",
+                callback_data=router.pack("media_toggle", media.value, source_chat_id),
             )
         )
         if len(row) == 2:
@@ -297,37 +432,39 @@ def _build_filter_page_media(user_id, source_chat_id, filter_config):
         [
             types.InlineKeyboardButton(
                 f"{'✅' if all_selected else '⬜'} Tất cả",
-                callback_data=f"media_all_{source_chat_id}",
+                callback_data=router.pack("media_all", source_chat_id),
             )
         ]
     )
 
-    keyboard.append([types.InlineKeyboardButton("⏱ THỜI LƯỢNG", callback_data="noop")])
+    keyboard.append(
+        [types.InlineKeyboardButton("⏱ THỜI LƯỢNG", callback_data=router.pack("noop"))]
+    )
     min_dur = filter_config.min_duration or 0
     max_dur = filter_config.max_duration or "∞"
     keyboard.append(
         [
             types.InlineKeyboardButton(
-                f"Min: {min_dur}s", callback_data=f"dur_min_{source_chat_id}"
+                f"Min: {min_dur}s", callback_data=router.pack("dur_min", source_chat_id)
             ),
             types.InlineKeyboardButton(
-                f"Max: {max_dur}s", callback_data=f"dur_max_{source_chat_id}"
+                f"Max: {max_dur}s", callback_data=router.pack("dur_max", source_chat_id)
             ),
         ]
     )
     keyboard.append(
         [
             types.InlineKeyboardButton(
-                "1m+", callback_data=f"dur_preset_60_{source_chat_id}"
+                "1m+", callback_data=router.pack("dur_preset", 60, source_chat_id)
             ),
             types.InlineKeyboardButton(
-                "3m+", callback_data=f"dur_preset_180_{source_chat_id}"
+                "3m+", callback_data=router.pack("dur_preset", 180, source_chat_id)
             ),
             types.InlineKeyboardButton(
-                "5m+", callback_data=f"dur_preset_300_{source_chat_id}"
+                "5m+", callback_data=router.pack("dur_preset", 300, source_chat_id)
             ),
             types.InlineKeyboardButton(
-                "Clear", callback_data=f"dur_clear_{source_chat_id}"
+                "Clear", callback_data=router.pack("dur_clear", source_chat_id)
             ),
         ]
     )
@@ -336,7 +473,7 @@ def _build_filter_page_media(user_id, source_chat_id, filter_config):
         [
             types.InlineKeyboardButton(
                 "🔙 Quay lại",
-                callback_data=f"src_edit_{source_chat_id}",
+                callback_data=router.pack("src_edit", source_chat_id),
             )
         ]
     )
@@ -348,32 +485,39 @@ def _build_filter_page_forward(user_id, source_chat_id, filter_config):
     keyboard.append(
         [
             types.InlineKeyboardButton(
-                f"📤 FORWARD - {source_chat_id}", callback_data="noop"
+                f"📤 FORWARD - {source_chat_id}", callback_data=router.pack("noop")
             )
         ]
     )
     keyboard.append(
         [
             types.InlineKeyboardButton(
-                "📨 Media", callback_data=f"filter_page_0_{source_chat_id}"
+                "📨 Media", callback_data=router.pack("filter_page", 0, source_chat_id)
             ),
             types.InlineKeyboardButton(
-                "📤 Forward", callback_data=f"filter_page_1_{source_chat_id}"
+                "📤 Forward",
+                callback_data=router.pack("filter_page", 1, source_chat_id),
             ),
             types.InlineKeyboardButton(
-                "📝 Content", callback_data=f"filter_page_2_{source_chat_id}"
+                "📝 Content",
+                callback_data=router.pack("filter_page", 2, source_chat_id),
             ),
         ]
     )
 
     keyboard.append(
-        [types.InlineKeyboardButton("Tùy chọn copy/forward:", callback_data="noop")]
+        [
+            types.InlineKeyboardButton(
+                "Tùy chọn copy/forward:", callback_data=router.pack("noop")
+            )
+        ]
     )
     cap_icon = "✅" if filter_config.remove_caption else "⬜"
     keyboard.append(
         [
             types.InlineKeyboardButton(
-                f"{cap_icon} Xóa caption", callback_data=f"opt_cap_{source_chat_id}"
+                f"{cap_icon} Xóa caption",
+                callback_data=router.pack("opt_cap", source_chat_id),
             )
         ]
     )
@@ -382,13 +526,18 @@ def _build_filter_page_forward(user_id, source_chat_id, filter_config):
     keyboard.append(
         [
             types.InlineKeyboardButton(
-                f"{fwd_icon} Xóa tên nguồn", callback_data=f"opt_fwd_{source_chat_id}"
+                f"{fwd_icon} Xóa tên nguồn",
+                callback_data=router.pack("opt_fwd", source_chat_id),
             )
         ]
     )
 
     keyboard.append(
-        [types.InlineKeyboardButton("📦 KÍCH THƯỚC FILE", callback_data="noop")]
+        [
+            types.InlineKeyboardButton(
+                "📦 KÍCH THƯỚC FILE", callback_data=router.pack("noop")
+            )
+        ]
     )
     min_size = filter_config.min_file_size or 0
     max_size = filter_config.max_file_size
@@ -396,27 +545,27 @@ def _build_filter_page_forward(user_id, source_chat_id, filter_config):
         [
             types.InlineKeyboardButton(
                 f"Min: {min_size / 1024 / 1024:.1f}MB",
-                callback_data=f"size_min_{source_chat_id}",
+                callback_data=router.pack("size_min", source_chat_id),
             ),
             types.InlineKeyboardButton(
                 f"Max: {max_size / 1024 / 1024:.1f}MB" if max_size else "Max: ∞",
-                callback_data=f"size_max_{source_chat_id}",
+                callback_data=router.pack("size_max", source_chat_id),
             ),
         ]
     )
     keyboard.append(
         [
             types.InlineKeyboardButton(
-                "5MB+", callback_data=f"size_5m_{source_chat_id}"
+                "5MB+", callback_data=router.pack("size_preset", 5, source_chat_id)
             ),
             types.InlineKeyboardButton(
-                "10MB+", callback_data=f"size_10m_{source_chat_id}"
+                "10MB+", callback_data=router.pack("size_preset", 10, source_chat_id)
             ),
             types.InlineKeyboardButton(
-                "20MB+", callback_data=f"size_20m_{source_chat_id}"
+                "20MB+", callback_data=router.pack("size_preset", 20, source_chat_id)
             ),
             types.InlineKeyboardButton(
-                "Clear", callback_data=f"size_clear_{source_chat_id}"
+                "Clear", callback_data=router.pack("size_clear", source_chat_id)
             ),
         ]
     )
@@ -425,7 +574,7 @@ def _build_filter_page_forward(user_id, source_chat_id, filter_config):
         [
             types.InlineKeyboardButton(
                 "🔙 Quay lại",
-                callback_data=f"src_edit_{source_chat_id}",
+                callback_data=router.pack("src_edit", source_chat_id),
             )
         ]
     )
@@ -437,31 +586,35 @@ def _build_filter_page_content(user_id, source_chat_id, filter_config):
     keyboard.append(
         [
             types.InlineKeyboardButton(
-                f"📝 CONTENT - {source_chat_id}", callback_data="noop"
+                f"📝 CONTENT - {source_chat_id}", callback_data=router.pack("noop")
             )
         ]
     )
     keyboard.append(
         [
             types.InlineKeyboardButton(
-                "📨 Media", callback_data=f"filter_page_0_{source_chat_id}"
+                "📨 Media", callback_data=router.pack("filter_page", 0, source_chat_id)
             ),
             types.InlineKeyboardButton(
-                "📤 Forward", callback_data=f"filter_page_1_{source_chat_id}"
+                "📤 Forward",
+                callback_data=router.pack("filter_page", 1, source_chat_id),
             ),
             types.InlineKeyboardButton(
-                "📝 Content", callback_data=f"filter_page_2_{source_chat_id}"
+                "📝 Content",
+                callback_data=router.pack("filter_page", 2, source_chat_id),
             ),
         ]
     )
 
-    keyboard.append([types.InlineKeyboardButton("Lọc nội dung:", callback_data="noop")])
+    keyboard.append(
+        [types.InlineKeyboardButton("Lọc nội dung:", callback_data=router.pack("noop"))]
+    )
     req_cap_icon = "✅" if filter_config.require_caption else "⬜"
     keyboard.append(
         [
             types.InlineKeyboardButton(
                 f"{req_cap_icon} Bắt buộc có caption",
-                callback_data=f"req_cap_{source_chat_id}",
+                callback_data=router.pack("req_cap", source_chat_id),
             )
         ]
     )
@@ -471,13 +624,17 @@ def _build_filter_page_content(user_id, source_chat_id, filter_config):
         [
             types.InlineKeyboardButton(
                 f"{req_tag_icon} Bắt buộc có #hashtag",
-                callback_data=f"req_tag_{source_chat_id}",
+                callback_data=router.pack("req_tag", source_chat_id),
             )
         ]
     )
 
     keyboard.append(
-        [types.InlineKeyboardButton("🚫 TỪ KHÓA BLOCK:", callback_data="noop")]
+        [
+            types.InlineKeyboardButton(
+                "🚫 TỪ KHÓA BLOCK:", callback_data=router.pack("noop")
+            )
+        ]
     )
     block_text = (
         ", ".join(filter_config.block_list) if filter_config.block_list else "(trống)"
@@ -486,17 +643,17 @@ def _build_filter_page_content(user_id, source_chat_id, filter_config):
         [
             types.InlineKeyboardButton(
                 f"📝 {block_text[:30]}{'...' if len(block_text) > 30 else ''}",
-                callback_data=f"block_edit_{source_chat_id}",
+                callback_data=router.pack("block_edit", source_chat_id),
             )
         ]
     )
     keyboard.append(
         [
             types.InlineKeyboardButton(
-                "➕ Thêm từ", callback_data=f"block_add_{source_chat_id}"
+                "➕ Thêm từ", callback_data=router.pack("block_add", source_chat_id)
             ),
             types.InlineKeyboardButton(
-                "🗑️ Xóa all", callback_data=f"block_clear_{source_chat_id}"
+                "🗑️ Xóa all", callback_data=router.pack("block_clear", source_chat_id)
             ),
         ]
     )
@@ -505,7 +662,7 @@ def _build_filter_page_content(user_id, source_chat_id, filter_config):
         [
             types.InlineKeyboardButton(
                 "🔙 Quay lại",
-                callback_data=f"src_edit_{source_chat_id}",
+                callback_data=router.pack("src_edit", source_chat_id),
             )
         ]
     )
@@ -514,63 +671,125 @@ def _build_filter_page_content(user_id, source_chat_id, filter_config):
 
 def build_realtime_keyboard(user_id: int):
     keyboard = [
-        [types.InlineKeyboardButton("▶️ BẬT REALTIME", callback_data="realtime_on")],
-        [types.InlineKeyboardButton("⏹ TẮT REALTIME", callback_data="realtime_off")],
-        [types.InlineKeyboardButton("🔙 Quay lại", callback_data="menu_main")],
+        [
+            types.InlineKeyboardButton(
+                "▶️ BẬT REALTIME", callback_data=router.pack("realtime_on")
+            )
+        ],
+        [
+            types.InlineKeyboardButton(
+                "⏹ TẮT REALTIME", callback_data=router.pack("realtime_off")
+            )
+        ],
+        [
+            types.InlineKeyboardButton(
+                "🔙 Quay lại", callback_data=router.pack("menu_main")
+            )
+        ],
     ]
     return types.InlineKeyboardMarkup(keyboard)
 
 
 def build_stats_keyboard(user_id: int):
     keyboard = [
-        [types.InlineKeyboardButton("🔄 Làm mới", callback_data="menu_stats")],
-        [types.InlineKeyboardButton("🔙 Quay lại", callback_data="menu_main")],
+        [
+            types.InlineKeyboardButton(
+                "🔄 Làm mới", callback_data=router.pack("menu_stats")
+            )
+        ],
+        [
+            types.InlineKeyboardButton(
+                "🔙 Quay lại", callback_data=router.pack("menu_main")
+            )
+        ],
     ]
     return types.InlineKeyboardMarkup(keyboard)
 
 
-async def handle_callback(client, callback_query):
-    data = callback_query.data
-    user_id = callback_query.from_user.id
+# ============ CALLBACK ROUTES ============
+# Buttons that only prompt for a command, or are not wired up yet, are
+# declared without a handler so their callback data still packs.
 
-    if data == "noop":
-        await callback_query.answer()
-        return
+router.define("target_config", "tc", int)
+router.define("src_dur", "su", int)
+router.define("dur_min", "dn", int)
+router.define("dur_max", "dx", int)
+router.define("size_min", "zn", int)
+router.define("size_max", "zx", int)
+router.define("block_edit", "be", int)
+router.define("block_add", "ba", int)
 
-    if data == "menu_main":
-        await callback_query.message.edit(
-            "⚙️ **Menu cấu hình:**",
-            reply_markup=build_main_menu_keyboard(),
-            parse_mode="markdown",
-        )
-        await callback_query.answer()
-        return
 
-    if data == "menu_targets":
-        await callback_query.message.edit(
-            "📂 **Danh sách Target:**",
-            reply_markup=await build_target_keyboard(user_id),
-            parse_mode="markdown",
-        )
-        await callback_query.answer()
-        return
+async def _show_main_menu(callback_query):
+    await callback_query.message.edit(
+        "⚙️ **Menu cấu hình:**",
+        reply_markup=build_main_menu_keyboard(),
+        parse_mode="markdown",
+    )
+
+
+async def _show_targets(callback_query, user_id: int, page: int = 0):
+    await callback_query.message.edit(
+        "📂 **Danh sách Target:**",
+        reply_markup=await build_target_keyboard(user_id, page),
+        parse_mode="markdown",
+    )
+
+
+async def _show_target(callback_query, user_id: int, target_id: int):
+    await callback_query.message.edit(
+        f"📂 **Target {target_id}:**",
+        reply_markup=await build_target_detail_keyboard(user_id, target_id),
+        parse_mode="markdown",
+    )
+
+
+async def _show_filter(callback_query, user_id: int, source_id: int, page: int = 0):
+    await callback_query.message.edit(
+        f"⚙️ **Cấu hình {source_id}:**",
+        reply_markup=await build_filter_keyboard(user_id, source_id, page),
+        parse_mode="markdown",
+    )
 
-    if data == "menu_stats":
-        import db as db_module
 
-        total = await db_module.count_forwarded_messages(user_id)
-        targets = await TargetConfig.get_all(user_id)
-        sources = await SourceConfig.get_all(user_id)
-        enabled_sources = sum(1 for s in sources if s.enabled)
-        media_stats = {}
-        all_msgs = await db_module.get_all_forwarded_messages(user_id)
-        for doc in all_msgs:
-            mt = doc.get("media_type", "unknown")
-            media_stats[mt] = media_stats.get(mt, 0) + 1
-        from bot import realtime_running
+async def _show_realtime(callback_query, user_id: int, status: str = ""):
+    await callback_query.message.edit(
+        "⚡ **Realtime Forward**" + (f"\n\n{status}" if status else ""),
+        reply_markup=build_realtime_keyboard(user_id),
+        parse_mode="markdown",
+    )
+
+
+@router.route("noop", "n")
+async def _noop(client, callback_query, user_id):
+    await callback_query.answer()
+
+
+@router.route("menu_main", "m")
+async def _menu_main(client, callback_query, user_id):
+    await _show_main_menu(callback_query)
+    await callback_query.answer()
+
+
+@router.route("menu_targets", "t")
+async def _menu_targets(client, callback_query, user_id):
+    await _show_targets(callback_query, user_id)
+    await callback_query.answer()
+
+
+@router.route("menu_stats", "s")
+async def _menu_stats(client, callback_query, user_id):
+    import db as db_module
+    from realtime import realtime_running
+
+    media_stats = await db_module.count_forwarded_by(user_id, "media_type")
+    total = sum(media_stats.values())
+    targets = await TargetConfig.get_all(user_id)
+    sources = await SourceConfig.get_all(user_id)
+    enabled_sources = len({s.source_chat_id for s in sources if s.enabled})
 
-        rt_status = "✅ Đang chạy" if realtime_running.get(user_id) else "❌ Đã dừng"
-        text = f"""📊 **Thống kê**
+    rt_status = "✅ Đang chạy" if realtime_running.get(user_id) else "❌ Đã dừng"
+    text = f"""📊 **Thống kê**
 
 • Tổng tin nhắn: **{total}**
 • Targets: **{len(targets)}**
@@ -580,393 +799,272 @@ async def handle_callback(client, callback_query):
 📹 Video: {media_stats.get("video", 0)}
 📷 Ảnh: {media_stats.get("photo", 0)}
 📄 Doc: {media_stats.get("document", 0)}"""
-        await callback_query.message.edit(
-            text, reply_markup=build_stats_keyboard(user_id), parse_mode="markdown"
-        )
-        await callback_query.answer()
-        return
+    await callback_query.message.edit(
+        text, reply_markup=build_stats_keyboard(user_id), parse_mode="markdown"
+    )
+    await callback_query.answer()
 
-    # Filter page navigation
-    if data.startswith("filter_page_"):
-        parts = data.split("_")
-        page = int(parts[2])
-        source_id = int(parts[3])
-        await callback_query.message.edit(
-            "⚙️",
-            reply_markup=await build_filter_keyboard(user_id, source_id, page),
-            parse_mode="markdown",
-        )
-        await callback_query.answer()
-        return
 
-    # Target operations
-    if data.startswith("target_page_"):
-        page = int(data.split("_")[-1])
-        await callback_query.message.edit(
-            "📂 **Danh sách Target:**",
-            reply_markup=await build_target_keyboard(user_id, page),
-            parse_mode="markdown",
-        )
-        return
+# Filter page navigation
+@router.route("filter_page", "fp", int, int)
+async def _filter_page(client, callback_query, user_id, page, source_id):
+    await callback_query.message.edit(
+        "⚙️",
+        reply_markup=await build_filter_keyboard(user_id, source_id, page),
+        parse_mode="markdown",
+    )
+    await callback_query.answer()
 
-    if data.startswith("target_view_"):
-        target_id = int(data.split("_")[-1])
-        await callback_query.message.edit(
-            f"📂 **Target {target_id}:**",
-            reply_markup=await build_target_detail_keyboard(user_id, target_id),
-            parse_mode="markdown",
-        )
-        return
 
-    if data.startswith("target_toggle_"):
-        target_id = int(data.split("_")[-1])
-        target = await TargetConfig.get(user_id, target_id)
-        if target:
-            target.enabled = not target.enabled
-            await target.save()
-        await callback_query.message.edit(
-            f"📂 **Target {target_id}:**",
-            reply_markup=await build_target_detail_keyboard(user_id, target_id),
-            parse_mode="markdown",
-        )
-        return
+# Target operations
+@router.route("target_page", "tp", int)
+async def _target_page(client, callback_query, user_id, page):
+    await _show_targets(callback_query, user_id, page)
 
-    if data.startswith("target_add_src_"):
-        target_id = int(data.split("_")[-1])
-        await callback_query.message.edit(
-            f"➕ **Thêm nguồn vào Target {target_id}:**\n\nGửi: `/addsource [source_id]`",
-            parse_mode="markdown",
-        )
-        return
 
-    if data.startswith("target_set_video_"):
-        target_id = int(data.split("_")[-1])
-        sources = await SourceConfig.get_by_target(user_id, target_id)
-        for src in sources:
-            filter_cfg = await FilterConfig.get(user_id, src.source_chat_id)
-            filter_cfg.media_types = [MediaType.VIDEO]
-            await filter_cfg.save()
-        await callback_query.answer("✅ All → Video")
-        await callback_query.message.edit(
-            f"📂 **Target {target_id}:**",
-            reply_markup=await build_target_detail_keyboard(user_id, target_id),
-            parse_mode="markdown",
-        )
-        return
+@router.route("target_view", "tv", int)
+async def _target_view(client, callback_query, user_id, target_id):
+    await _show_target(callback_query, user_id, target_id)
 
-    if data.startswith("target_set_photo_"):
-        target_id = int(data.split("_")[-1])
-        sources = await SourceConfig.get_by_target(user_id, target_id)
-        for src in sources:
-            filter_cfg = await FilterConfig.get(user_id, src.source_chat_id)
-            filter_cfg.media_types = [MediaType.PHOTO]
-            await filter_cfg.save()
-        await callback_query.answer("✅ All → Ảnh")
-        await callback_query.message.edit(
-            f"📂 **Target {target_id}:**",
-            reply_markup=await build_target_detail_keyboard(user_id, target_id),
-            parse_mode="markdown",
-        )
-        return
 
-    if data.startswith("target_del_"):
-        target_id = int(data.split("_")[-1])
-        await TargetConfig.delete(user_id, target_id)
-        await callback_query.answer("✅ Đã xóa target")
-        await callback_query.message.edit(
-            "📂 **Danh sách Target:**",
-            reply_markup=await build_target_keyboard(user_id),
-            parse_mode="markdown",
-        )
-        return
+@router.route("target_toggle", "tt", int)
+async def _target_toggle(client, callback_query, user_id, target_id):
+    target = await TargetConfig.get(user_id, target_id)
+    if target:
+        target.enabled = not target.enabled
+        await target.save()
+    await _show_target(callback_query, user_id, target_id)
 
-    # Source operations
-    if data.startswith("src_edit_"):
-        source_id = int(data.split("_")[-1])
-        await callback_query.message.edit(
-            f"⚙️ **Cấu hình {source_id}:**",
-            reply_markup=await build_filter_keyboard(user_id, source_id, 0),
-            parse_mode="markdown",
-        )
-        return
 
-    if data.startswith("src_del_"):
-        source_id = int(data.split("_")[-1])
-        await SourceConfig.delete(user_id, source_id)
-        source = await SourceConfig.get(user_id, source_id)
-        if source:
-            await callback_query.message.edit(
-                f"📂 **Target {source.target_chat_id}:**",
-                reply_markup=await build_target_detail_keyboard(
-                    user_id, source.target_chat_id
-                ),
-                parse_mode="markdown",
-            )
-        else:
-            await callback_query.message.edit(
-                "📂 **Danh sách Target:**",
-                reply_markup=await build_target_keyboard(user_id),
-                parse_mode="markdown",
-            )
-        return
+@router.route("target_add_src", "ta", int)
+async def _target_add_src(client, callback_query, user_id, target_id):
+    await callback_query.message.edit(
+        f"➕ **Thêm nguồn vào Target {target_id}:**\n\nGửi: `/addsource [source_id]`",
+        parse_mode="markdown",
+    )
 
-    # Filter toggle
-    if data.startswith("filter_toggle_"):
-        source_id = int(data.split("_")[-1])
-        filter_cfg = await FilterConfig.get(user_id, source_id)
-        filter_cfg.enabled = not filter_cfg.enabled
-        await filter_cfg.save()
-        await callback_query.message.edit(
-            f"⚙️ **Cấu hình {source_id}:**",
-            reply_markup=await build_filter_keyboard(user_id, source_id, 0),
-            parse_mode="markdown",
-        )
-        return
 
-    # Media toggle
-    if data.startswith("media_toggle_") or data.startswith("media_all_"):
-        parts = data.split("_")
-        if parts[0] == "media" and parts[1] == "all":
-            source_id = int(parts[-1])
-            filter_cfg = await FilterConfig.get(user_id, source_id)
-            filter_cfg.media_types = [MediaType.ALL]
-            await filter_cfg.save()
-            await callback_query.answer("✅ All media types")
-        else:
-            media_type = parts[2]
-            source_id = int(parts[-1])
-            filter_cfg = await FilterConfig.get(user_id, source_id)
-            media_enum = MediaType(media_type)
-            if media_enum in filter_cfg.media_types:
-                filter_cfg.media_types.remove(media_enum)
-            else:
-                if MediaType.ALL in filter_cfg.media_types:
-                    filter_cfg.media_types = [media_enum]
-                else:
-                    filter_cfg.media_types.append(media_enum)
-            if not filter_cfg.media_types:
-                filter_cfg.media_types = [MediaType.ALL]
-            await filter_cfg.save()
-        await callback_query.message.edit(
-            f"⚙️ **Cấu hình {source_id}:**",
-            reply_markup=await build_filter_keyboard(user_id, source_id, 0),
-            parse_mode="markdown",
-        )
-        return
+@router.route("target_set_media", "tm", str, int)
+async def _target_set_media(client, callback_query, user_id, media, target_id):
+    media_type = MediaType(media)
+    await FilterConfig.bulk_update(user_id, target_id, media_types=[media_type])
+    await callback_query.answer(
+        f"✅ All → {_MEDIA_LABELS[media_type]} (filter riêng 🎯 của target này)"
+    )
+    await _show_target(callback_query, user_id, target_id)
 
-    # Duration presets
-    if data.startswith("dur_preset_"):
-        parts = data.split("_")
-        duration = int(parts[2])
-        source_id = int(parts[-1])
-        filter_cfg = await FilterConfig.get(user_id, source_id)
-        filter_cfg.min_duration = duration
-        await filter_cfg.save()
-        await callback_query.answer(f"✅ Min: {duration}s")
-        await callback_query.message.edit(
-            f"⚙️ **Cấu hình {source_id}:**",
-            reply_markup=await build_filter_keyboard(user_id, source_id, 0),
-            parse_mode="markdown",
-        )
-        return
 
-    if data.startswith("dur_clear_"):
-        source_id = int(data.split("_")[-1])
-        filter_cfg = await FilterConfig.get(user_id, source_id)
-        filter_cfg.min_duration = 0
-        filter_cfg.max_duration = None
-        await filter_cfg.save()
-        await callback_query.answer("✅ Đã clear")
-        await callback_query.message.edit(
-            f"⚙️ **Cấu hình {source_id}:**",
-            reply_markup=await build_filter_keyboard(user_id, source_id, 0),
-            parse_mode="markdown",
-        )
-        return
+@router.route("target_reset_filters", "tr", int)
+async def _target_reset_filters(client, callback_query, user_id, target_id):
+    await FilterConfig.reset_overrides(user_id, target_chat_id=target_id)
+    await callback_query.answer("✅ Target dùng lại filter chung của từng nguồn")
+    await _show_target(callback_query, user_id, target_id)
 
-    # Forward options
-    if data.startswith("opt_cap_"):
-        source_id = int(data.split("_")[-1])
-        filter_cfg = await FilterConfig.get(user_id, source_id)
-        filter_cfg.remove_caption = not filter_cfg.remove_caption
-        await filter_cfg.save()
-        await callback_query.message.edit(
-            f"⚙️ **Cấu hình {source_id}:**",
-            reply_markup=await build_filter_keyboard(user_id, source_id, 1),
-            parse_mode="markdown",
-        )
-        return
 
-    if data.startswith("opt_fwd_"):
-        source_id = int(data.split("_")[-1])
-        filter_cfg = await FilterConfig.get(user_id, source_id)
-        filter_cfg.remove_forward_header = not filter_cfg.remove_forward_header
-        await filter_cfg.save()
-        await callback_query.message.edit(
-            f"⚙️ **Cấu hình {source_id}:**",
-            reply_markup=await build_filter_keyboard(user_id, source_id, 1),
-            parse_mode="markdown",
-        )
-        return
+@router.route("target_del", "td", int)
+async def _target_del(client, callback_query, user_id, target_id):
+    await TargetConfig.delete(user_id, target_id)
+    await callback_query.answer("✅ Đã xóa target")
+    await _show_targets(callback_query, user_id)
 
-    # File size
-    if data.startswith("size_"):
-        parts = data.split("_")
-        size_type = parts[1]
-        source_id = int(parts[-1])
-        filter_cfg = await FilterConfig.get(user_id, source_id)
-        if size_type == "5m":
-            filter_cfg.min_file_size = 5 * 1024 * 1024
-        elif size_type == "10m":
-            filter_cfg.min_file_size = 10 * 1024 * 1024
-        elif size_type == "20m":
-            filter_cfg.min_file_size = 20 * 1024 * 1024
-        elif size_type == "clear":
-            filter_cfg.min_file_size = 0
-            filter_cfg.max_file_size = None
-        await filter_cfg.save()
-        await callback_query.answer("✅ Size updated")
-        await callback_query.message.edit(
-            f"⚙️ **Cấu hình {source_id}:**",
-            reply_markup=await build_filter_keyboard(user_id, source_id, 1),
-            parse_mode="markdown",
-        )
-        return
 
-    # Content options
-    if data.startswith("req_cap_"):
-        source_id = int(data.split("_")[-1])
-        filter_cfg = await FilterConfig.get(user_id, source_id)
-        filter_cfg.require_caption = not filter_cfg.require_caption
-        await filter_cfg.save()
-        await callback_query.message.edit(
-            f"⚙️ **Cấu hình {source_id}:**",
-            reply_markup=await build_filter_keyboard(user_id, source_id, 2),
-            parse_mode="markdown",
-        )
-        return
+@router.route("target_add", "tn")
+async def _target_add(client, callback_query, user_id):
+    await callback_query.message.edit(
+        "➕ **Thêm Target mới:**\n\nGửi: `/addtarget [target_id] [tên]`",
+        parse_mode="markdown",
+    )
 
-    if data.startswith("req_tag_"):
-        source_id = int(data.split("_")[-1])
-        filter_cfg = await FilterConfig.get(user_id, source_id)
-        filter_cfg.require_hashtags = not filter_cfg.require_hashtags
-        await filter_cfg.save()
-        await callback_query.message.edit(
-            f"⚙️ **Cấu hình {source_id}:**",
-            reply_markup=await build_filter_keyboard(user_id, source_id, 2),
-            parse_mode="markdown",
-        )
-        return
 
-    if data.startswith("block_clear_"):
-        source_id = int(data.split("_")[-1])
-        filter_cfg = await FilterConfig.get(user_id, source_id)
-        filter_cfg.block_list = []
-        await filter_cfg.save()
-        await callback_query.answer("✅ Đã clear")
-        await callback_query.message.edit(
-            f"⚙️ **Cấu hình {source_id}:**",
-            reply_markup=await build_filter_keyboard(user_id, source_id, 2),
-            parse_mode="markdown",
-        )
-        return
+# Source operations
+@router.route("src_edit", "se", int)
+async def _src_edit(client, callback_query, user_id, source_id):
+    await _show_filter(callback_query, user_id, source_id)
 
-    if data == "target_add":
-        await callback_query.message.edit(
-            "➕ **Thêm Target mới:**\n\nGửi: `/addtarget [target_id] [tên]`",
-            parse_mode="markdown",
-        )
-        return
 
-    # Main menu quick filters
-    if data == "main_video":
-        sources = await SourceConfig.get_all(user_id)
-        for src in sources:
-            filter_cfg = await FilterConfig.get(user_id, src.source_chat_id)
-            filter_cfg.media_types = [MediaType.VIDEO]
-            await filter_cfg.save()
-        await callback_query.answer("✅ All → Video")
-        await callback_query.message.edit(
-            "⚙️ **Menu cấu hình:**",
-            reply_markup=build_main_menu_keyboard(),
-            parse_mode="markdown",
-        )
-        return
+@router.route("src_reset_filters", "sr", int)
+async def _src_reset_filters(client, callback_query, user_id, source_id):
+    await FilterConfig.reset_overrides(user_id, source_chat_id=source_id)
+    await callback_query.answer("✅ Mọi target dùng lại filter này")
+    await _show_filter(callback_query, user_id, source_id)
 
-    if data == "main_photo":
-        sources = await SourceConfig.get_all(user_id)
-        for src in sources:
-            filter_cfg = await FilterConfig.get(user_id, src.source_chat_id)
-            filter_cfg.media_types = [MediaType.PHOTO]
-            await filter_cfg.save()
-        await callback_query.answer("✅ All → Ảnh")
-        await callback_query.message.edit(
-            "⚙️ **Menu cấu hình:**",
-            reply_markup=build_main_menu_keyboard(),
-            parse_mode="markdown",
-        )
-        return
 
-    if data == "main_doc":
-        sources = await SourceConfig.get_all(user_id)
-        for src in sources:
-            filter_cfg = await FilterConfig.get(user_id, src.source_chat_id)
-            filter_cfg.media_types = [MediaType.DOCUMENT]
-            await filter_cfg.save()
-        await callback_query.answer("✅ All → Document")
-        await callback_query.message.edit(
-            "⚙️ **Menu cấu hình:**",
-            reply_markup=build_main_menu_keyboard(),
-            parse_mode="markdown",
-        )
-        return
+@router.route("src_del", "sd", int, int)
+async def _src_del(client, callback_query, user_id, source_id, target_id):
+    # Only this edge; the source keeps forwarding to its other targets
+    await SourceConfig.delete(user_id, source_id, target_id)
+    await _show_target(callback_query, user_id, target_id)
 
-    if data == "main_duration":
-        await callback_query.message.edit(
-            "⏱ **Cấu hình Duration mặc định:**\n\nGửi: `/default [min]_[max]`",
-            parse_mode="markdown",
-        )
-        return
 
-    if data == "main_realtime":
-        await callback_query.message.edit(
-            "⚡ **Realtime Forward**",
-            reply_markup=build_realtime_keyboard(user_id),
-            parse_mode="markdown",
-        )
-        return
+# Filter toggle
+@router.route("filter_toggle", "ft", int)
+async def _filter_toggle(client, callback_query, user_id, source_id):
+    filter_cfg = (await FilterConfig.get(user_id, source_id)).copy()
+    filter_cfg.enabled = not filter_cfg.enabled
+    await filter_cfg.save()
+    await _show_filter(callback_query, user_id, source_id)
 
-    if data == "realtime_on":
-        import db as db_module
-        from bot import realtime_running
-
-        user_data = await db_module.get_user(user_id)
-        if not user_data or not user_data.get("session_string"):
-            await callback_query.answer("❗ Cần /login trước!", show_alert=True)
-            return
-        realtime_running[user_id] = True
-        await callback_query.answer("✅ Realtime đã bật!")
-        await callback_query.message.edit(
-            "⚡ **Realtime Forward**\n\n✅ Đang chạy",
-            reply_markup=build_realtime_keyboard(user_id),
-            parse_mode="markdown",
-        )
-        import asyncio
-        from bot import start_realtime_forward
 
-        asyncio.create_task(start_realtime_forward(user_id))
-        return
+# Media toggle
+@router.route("media_all", "ma", int)
+async def _media_all(client, callback_query, user_id, source_id):
+    filter_cfg = (await FilterConfig.get(user_id, source_id)).copy()
+    filter_cfg.media_types = [MediaType.ALL]
+    await filter_cfg.save()
+    await callback_query.answer("✅ All media types")
+    await _show_filter(callback_query, user_id, source_id)
 
-    if data == "realtime_off":
-        from bot import realtime_running
 
-        realtime_running[user_id] = False
-        await callback_query.answer("❎ Realtime đã tắt")
-        await callback_query.message.edit(
-            "⚡ **Realtime Forward**\n\n❌ Đã dừng",
-            reply_markup=build_realtime_keyboard(user_id),
-            parse_mode="markdown",
-        )
+@router.route("media_toggle", "mt", str, int)
+async def _media_toggle(client, callback_query, user_id, media, source_id):
+    filter_cfg = (await FilterConfig.get(user_id, source_id)).copy()
+    media_enum = MediaType(media)
+    if media_enum in filter_cfg.media_types:
+        filter_cfg.media_types.remove(media_enum)
+    else:
+        if MediaType.ALL in filter_cfg.media_types:
+            filter_cfg.media_types = [media_enum]
+        else:
+            filter_cfg.media_types.append(media_enum)
+    if not filter_cfg.media_types:
+        filter_cfg.media_types = [MediaType.ALL]
+    await filter_cfg.save()
+    await _show_filter(callback_query, user_id, source_id)
+
+
+# Duration presets
+@router.route("dur_preset", "dp", int, int)
+async def _dur_preset(client, callback_query, user_id, duration, source_id):
+    filter_cfg = (await FilterConfig.get(user_id, source_id)).copy()
+    filter_cfg.min_duration = duration
+    await filter_cfg.save()
+    await callback_query.answer(f"✅ Min: {duration}s")
+    await _show_filter(callback_query, user_id, source_id)
+
+
+@router.route("dur_clear", "dc", int)
+async def _dur_clear(client, callback_query, user_id, source_id):
+    filter_cfg = (await FilterConfig.get(user_id, source_id)).copy()
+    filter_cfg.min_duration = 0
+    filter_cfg.max_duration = None
+    await filter_cfg.save()
+    await callback_query.answer("✅ Đã clear")
+    await _show_filter(callback_query, user_id, source_id)
+
+
+# Forward options
+@router.route("opt_cap", "oc", int)
+async def _opt_cap(client, callback_query, user_id, source_id):
+    filter_cfg = (await FilterConfig.get(user_id, source_id)).copy()
+    filter_cfg.remove_caption = not filter_cfg.remove_caption
+    await filter_cfg.save()
+    await _show_filter(callback_query, user_id, source_id, 1)
+
+
+@router.route("opt_fwd", "of", int)
+async def _opt_fwd(client, callback_query, user_id, source_id):
+    filter_cfg = (await FilterConfig.get(user_id, source_id)).copy()
+    filter_cfg.remove_forward_header = not filter_cfg.remove_forward_header
+    await filter_cfg.save()
+    await _show_filter(callback_query, user_id, source_id, 1)
+
+
+# File size
+@router.route("size_preset", "zp", int, int)
+async def _size_preset(client, callback_query, user_id, megabytes, source_id):
+    filter_cfg = (await FilterConfig.get(user_id, source_id)).copy()
+    filter_cfg.min_file_size = megabytes * 1024 * 1024
+    await filter_cfg.save()
+    await callback_query.answer("✅ Size updated")
+    await _show_filter(callback_query, user_id, source_id, 1)
+
+
+@router.route("size_clear", "zc", int)
+async def _size_clear(client, callback_query, user_id, source_id):
+    filter_cfg = (await FilterConfig.get(user_id, source_id)).copy()
+    filter_cfg.min_file_size = 0
+    filter_cfg.max_file_size = None
+    await filter_cfg.save()
+    await callback_query.answer("✅ Size updated")
+    await _show_filter(callback_query, user_id, source_id, 1)
+
+
+# Content options
+@router.route("req_cap", "rc", int)
+async def _req_cap(client, callback_query, user_id, source_id):
+    filter_cfg = (await FilterConfig.get(user_id, source_id)).copy()
+    filter_cfg.require_caption = not filter_cfg.require_caption
+    await filter_cfg.save()
+    await _show_filter(callback_query, user_id, source_id, 2)
+
+
+@router.route("req_tag", "rt", int)
+async def _req_tag(client, callback_query, user_id, source_id):
+    filter_cfg = (await FilterConfig.get(user_id, source_id)).copy()
+    filter_cfg.require_hashtags = not filter_cfg.require_hashtags
+    await filter_cfg.save()
+    await _show_filter(callback_query, user_id, source_id, 2)
+
+
+@router.route("block_clear", "bc", int)
+async def _block_clear(client, callback_query, user_id, source_id):
+    filter_cfg = (await FilterConfig.get(user_id, source_id)).copy()
+    filter_cfg.block_list = []
+    await filter_cfg.save()
+    await callback_query.answer("✅ Đã clear")
+    await _show_filter(callback_query, user_id, source_id, 2)
+
+
+# Main menu quick filters
+@router.route("main_media", "mm", str)
+async def _main_media(client, callback_query, user_id, media):
+    media_type = MediaType(media)
+    await FilterConfig.bulk_update(user_id, media_types=[media_type])
+    text = f"✅ All → {_MEDIA_LABELS[media_type]}"
+    overrides = await FilterConfig.get_overrides(user_id)
+    if overrides:
+        text += f" (trừ {len(overrides)} filter riêng 🎯)"
+    await callback_query.answer(text)
+    await _show_main_menu(callback_query)
+
+
+@router.route("main_duration", "md")
+async def _main_duration(client, callback_query, user_id):
+    await callback_query.message.edit(
+        "⏱ **Cấu hình Duration mặc định:**\n\nGửi: `/default [min]_[max]`",
+        parse_mode="markdown",
+    )
+
+
+@router.route("main_realtime", "mr")
+async def _main_realtime(client, callback_query, user_id):
+    await _show_realtime(callback_query, user_id)
+
+
+@router.route("realtime_on", "r1")
+async def _realtime_on(client, callback_query, user_id):
+    import asyncio
+    import db as db_module
+    from realtime import realtime_running, start_realtime_forward
+
+    user_data = await db_module.get_user(user_id)
+    if not user_data or not user_data.get("session_string"):
+        await callback_query.answer("❗ Cần /login trước!", show_alert=True)
         return
+    realtime_running[user_id] = True
+    await callback_query.answer("✅ Realtime đã bật!")
+    await _show_realtime(callback_query, user_id, "✅ Đang chạy")
+    asyncio.create_task(start_realtime_forward(user_id))
 
-    await callback_query.answer()
+
+@router.route("realtime_off", "r0")
+async def _realtime_off(client, callback_query, user_id):
+    from realtime import realtime_running
+
+    realtime_running[user_id] = False
+    await callback_query.answer("❎ Realtime đã tắt")
+    await _show_realtime(callback_query, user_id, "❌ Đã dừng")
+
+
+async def handle_callback(client, callback_query):
+    await router.dispatch(client, callback_query)
@@ -0,0 +1,104 @@
+import time
+import config
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens/second up to ``capacity``"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "paused_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token can be taken (0 = available now)."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rate <= 0:
+            return 0.0  # unlimited
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        if self.rate > 0:
+            self.tokens -= 1
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    """Global, per-account and per-target token buckets shared by all forwarders.
+
+    Client buckets are keyed by user_id, so every client of one Telegram
+    account (realtime and backfill) draws from and is paused by the same one.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = config.RATE_LIMIT_GLOBAL,
+        client_rate: float = config.RATE_LIMIT_CLIENT,
+        target_rate: float = 1 / config.MESSAGE_DELAY if config.MESSAGE_DELAY > 0 else 0,
+        target_burst: float = config.RATE_LIMIT_TARGET_BURST,
+    ):
+        self.client_rate = client_rate
+        self.target_rate = target_rate
+        self.target_burst = target_burst
+        self.global_bucket = TokenBucket(global_rate, max(1, global_rate))
+        self._clients = {}  # user_id -> TokenBucket
+        self._targets = {}  # target chat id -> TokenBucket
+
+    def client_bucket(self, client_key) -> TokenBucket:
+        bucket = self._clients.get(client_key)
+        if bucket is None:
+            bucket = TokenBucket(self.client_rate, max(1, self.client_rate))
+            self._clients[client_key] = bucket
+        return bucket
+
+    def target_bucket(self, target_id: int) -> TokenBucket:
+        bucket = self._targets.get(target_id)
+        if bucket is None:
+            bucket = TokenBucket(self.target_rate, max(1, self.target_burst))
+            self._targets[target_id] = bucket
+        return bucket
+
+    def try_acquire(self, client_key, target_id: int) -> float:
+        """Take a token from all three buckets, or return how long to wait.
+
+        Nothing is taken unless every bucket can serve the request, so a caller
+        that is told to wait can go and serve another target meanwhile.
+        """
+        now = time.monotonic()
+        buckets = (
+            self.global_bucket,
+            self.client_bucket(client_key),
+            self.target_bucket(target_id),
+        )
+        wait = max(bucket.delay(now) for bucket in buckets)
+        if wait > 0:
+            return wait
+        for bucket in buckets:
+            bucket.take()
+        return 0.0
+
+    def pause_client(self, client_key, seconds: float):
+        # FloodWait applies to the whole account, not just one target chat
+        self.client_bucket(client_key).pause(seconds)
+
+    def client_delay(self, client_key) -> float:
+        """Seconds the account is still paused by a FloodWait (0 = not paused)."""
+        bucket = self.client_bucket(client_key)
+        return max(0.0, bucket.paused_until - time.monotonic())
+
+
+rate_limiter = RateLimiter()
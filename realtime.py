@@ -0,0 +1,273 @@
+import asyncio
+from pyrogram import Client, filters
+from pyrogram.enums import ChatType
+from pyrogram.handlers import MessageHandler
+import config
+import db as db_module
+from dedup import dedup_index
+from filters import FilterConfig, SourceConfig, on_topology_change
+from forwarder import ForwardEngine, ForwardJob
+from sync import is_message_forwarded
+
+realtime_running = {}
+sessions = {}  # user_id -> RealtimeSession
+_starting = set()  # user_ids whose session is being set up
+
+# Message IDs are sequential per chat only in channels/supergroups, so a jump in
+# the ID sequence is only meaningful (and worth a gap fill) for those chats.
+GAP_CHECK_CHAT_TYPES = (ChatType.CHANNEL, ChatType.SUPERGROUP)
+
+
+def user_client(user_id: int, session_string: str, purpose: str = "realtime") -> Client:
+    return Client(
+        name=f"{purpose}_{user_id}",
+        api_id=config.API_ID,
+        api_hash=config.API_HASH,
+        session_string=session_string,
+        workdir=config.SESSIONS_FOLDER,
+    )
+
+
+async def forward_message(
+    engine: ForwardEngine, source_id: int, target_id: int, message, user_id: int
+):
+    """Queue a message for its target if it is new and passes the filter.
+
+    Returns the queued ForwardJob, or None if the message was skipped.
+    """
+    # Check if already forwarded
+    if await is_message_forwarded(user_id, source_id, target_id, message.id):
+        return None
+
+    # Get filter config (the edge's own, else the source-wide one)
+    filter_config = await FilterConfig.get(user_id, source_id, target_id)
+
+    # Check if message matches filter
+    if not filter_config.matches(message):
+        return None
+
+    job = ForwardJob(user_id, source_id, target_id, message)
+    await engine.submit(job)
+    return job
+
+
+async def fan_out(
+    engine: ForwardEngine, source_id: int, target_ids: list, message, user_id: int
+) -> list:
+    """Offer one fetched message to every target of its source concurrently.
+
+    Returns the ForwardJobs queued for it.
+    """
+    jobs = await asyncio.gather(
+        *(
+            forward_message(engine, source_id, target_id, message, user_id)
+            for target_id in target_ids
+        )
+    )
+    return [job for job in jobs if job]
+
+
+class RealtimeSession:
+    """Push-based forwarding for one user client.
+
+    New messages arrive through an ``on_message`` handler filtered by the
+    enabled source chats, so an idle session makes no API calls. History is
+    only fetched to fill a hole in a source's message ID sequence. Each
+    message is received once per source and fanned out to all its targets.
+
+    Source/target changes are applied to the running session by
+    apply_routes(), which edits the routing table and the handler's chat
+    filter in place instead of reconnecting the client.
+    """
+
+    def __init__(
+        self, user_id: int, client: Client, engine: ForwardEngine, source_targets: dict
+    ):
+        self.user_id = user_id
+        self.client = client
+        self.engine = engine
+        self.source_targets = source_targets  # source_id -> [target_id, ...]
+        self.last_ids = {}  # source_id -> highest message id handled
+        self._locks = {}  # source_id -> asyncio.Lock, keeps per-source order
+        self._chat_filter = filters.chat(list(source_targets))
+        self._handler = MessageHandler(self._on_message, self._chat_filter)
+        self._reload_task = None
+        self._reload_pending = False
+        self._stopped = False
+
+    async def start(self):
+        for source_id, target_ids in self.source_targets.items():
+            await self._prepare(source_id, target_ids)
+        self.client.add_handler(self._handler)
+
+    def stop(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        self.client.remove_handler(self._handler)
+        if self._reload_task:
+            self._reload_task.cancel()
+
+    async def _prepare(self, source_id: int, target_ids):
+        """Warm dedup for new edges and read the source's latest message ID"""
+        for target_id in target_ids:
+            await dedup_index.warm(self.user_id, source_id, target_id)
+        if source_id in self.last_ids:
+            return
+        try:
+            self.last_ids[source_id] = await self._latest_message_id(source_id)
+        except Exception as e:
+            print(f"Error reading {source_id}: {e}")
+
+    def schedule_reload(self):
+        """Coalesce change notifications into one background reload."""
+        self._reload_pending = True
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._reload_loop())
+
+    async def _reload_loop(self):
+        while self._reload_pending:
+            self._reload_pending = False
+            try:
+                await self.apply_routes(await SourceConfig.get_routes(self.user_id))
+            except Exception as e:
+                print(f"⚠️ Route reload error for user {self.user_id}: {e}")
+
+    async def apply_routes(self, routes: dict):
+        """Switch to a new {source: [targets]} table without reconnecting.
+
+        New edges are prepared before they become visible, so their first
+        message already sees a warm dedup index and a known last ID.
+        """
+        for source_id, target_ids in routes.items():
+            new_targets = set(target_ids).difference(self.source_targets.get(source_id, ()))
+            if new_targets:
+                await self._prepare(source_id, new_targets)
+
+        removed = self.source_targets.keys() - routes.keys()
+        added = routes.keys() - self.source_targets.keys()
+        self.source_targets = routes
+        self._chat_filter.difference_update(removed)
+        self._chat_filter.update(added)
+        for source_id in removed:
+            # Re-read on a later re-add rather than gap-filling the interval
+            self.last_ids.pop(source_id, None)
+            # A message still being handled holds the lock; dropping it would
+            # let a quick re-add run a second, unordered lock for the source
+            lock = self._locks.get(source_id)
+            if lock and not lock.locked():
+                del self._locks[source_id]
+
+        if added or removed:
+            print(
+                f"🔀 Routes updated for user {self.user_id}: "
+                f"+{len(added)} / -{len(removed)} sources"
+            )
+
+    async def _latest_message_id(self, source_id: int) -> int:
+        async for msg in self.client.get_chat_history(source_id, limit=1):
+            return msg.id
+        return 0
+
+    async def _on_message(self, client, message):
+        if not realtime_running.get(self.user_id, False):
+            return
+
+        source_id = message.chat.id
+        target_ids = self.source_targets.get(source_id)
+        if not target_ids:
+            return
+
+        lock = self._locks.setdefault(source_id, asyncio.Lock())
+        async with lock:
+            last_id = self.last_ids.get(source_id, 0)
+            if message.id <= last_id:
+                return  # already delivered by a gap fill
+
+            if (
+                last_id
+                and message.id > last_id + 1
+                and message.chat.type in GAP_CHECK_CHAT_TYPES
+            ):
+                await self._fill_gap(source_id, target_ids, last_id, message.id)
+
+            self.last_ids[source_id] = message.id
+            await fan_out(self.engine, source_id, target_ids, message, self.user_id)
+
+    async def _fill_gap(self, source_id: int, target_ids: list, after_id: int, before_id: int):
+        """Forward messages strictly between after_id and before_id, oldest first."""
+        missed = []
+        try:
+            async for msg in self.client.get_chat_history(
+                source_id,
+                limit=config.REALTIME_GAP_LIMIT,
+                min_id=after_id,
+                max_id=before_id,
+            ):
+                missed.append(msg)
+        except Exception as e:
+            print(f"Gap fill error {source_id}: {e}")
+            return
+
+        for msg in reversed(missed):
+            await fan_out(self.engine, source_id, target_ids, msg, self.user_id)
+
+
+async def stop_all_sessions(timeout: float = config.FORWARD_DRAIN_TIMEOUT):
+    """Stop every session on shutdown: no new messages are taken, then the
+    engines drain for at most timeout seconds (concurrently)."""
+    stopping = list(sessions.values())
+    for session in stopping:
+        realtime_running[session.user_id] = False
+        session.stop()
+    await asyncio.gather(*(session.engine.stop(timeout=timeout) for session in stopping))
+
+
+@on_topology_change
+def _on_topology_change(user_id: int):
+    session = sessions.get(user_id)
+    if session:
+        session.schedule_reload()
+
+
+async def start_realtime_forward(user_id: int):
+    """Background task for realtime message forwarding"""
+    # Claim the user before the first await so a second /realtime on
+    # cannot open another client and forward every message twice
+    if user_id in sessions or user_id in _starting:
+        return
+    _starting.add(user_id)
+    try:
+        await _run_session(user_id)
+    finally:
+        _starting.discard(user_id)
+
+
+async def _run_session(user_id: int):
+    user_data = await db_module.get_user(user_id)
+    session_string = user_data["session_string"]
+
+    async with user_client(user_id, session_string) as client:
+        # Get routes: every enabled source with all of its targets
+        source_targets = await SourceConfig.get_routes(user_id)
+
+        if not source_targets:
+            # Stay connected: sources added later are picked up by reload
+            print(f"⚠️ No enabled sources for user {user_id}, waiting for routes")
+
+        engine = ForwardEngine(client)
+        session = RealtimeSession(user_id, client, engine, source_targets)
+        sessions[user_id] = session
+        engine.start()
+        try:
+            await session.start()
+            print(f"📡 Realtime forwarding started for user {user_id}")
+
+            while realtime_running.get(user_id, False):
+                await asyncio.sleep(config.REALTIME_CHECK_INTERVAL)
+        finally:
+            session.stop()
+            await engine.stop()
+            sessions.pop(user_id, None)
+
+        print(f"⏹ Realtime forwarding stopped for user {user_id}")
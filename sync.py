@@ -1,46 +1,143 @@
+import time
 import asyncio
 from datetime import datetime
-from logger import get_unsynced_messages, mark_synced, cleanup_synced_messages
+from logger import (
+    get_unsynced_messages,
+    mark_synced,
+    cleanup_synced_messages,
+    on_backlog,
+    pending_count,
+)
 import config
 import db as db_module
+from dedup import dedup_index
 
+_sync_task = None
+_stopping = False
+_wakeup = asyncio.Event()  # set when the log backlog needs an early flush
+_next_maintenance = 0.0  # monotonic time of the next retention/vacuum pass (set on start)
 
-async def sync_to_database():
-    """Background task: sync logged messages to database"""
+
+def _entry_key(entry: dict) -> tuple:
+    return (entry["user_id"], entry["source"], entry["target"], entry["message_id"])
+
+
+async def sync_pending() -> int:
+    """Stream unsynced log entries into the database, one chunk at a time.
+
+    Entries are keyed by (user_id, source, target, message_id), never by
+    message_id alone, and the log is acknowledged by offset only after the
+    chunk is committed, so a failure part-way loses nothing.
+    """
+    synced = 0
     while True:
+        chunk = await get_unsynced_messages(config.SYNC_BATCH_SIZE)
+        if not chunk:
+            return synced
+
+        # One row per key; the log may repeat an entry (e.g. a migrated one)
+        latest = {_entry_key(entry): entry for entry in chunk}
+        synced_at = datetime.now().isoformat()
+        rows = (
+            {
+                "user_id": entry["user_id"],
+                "source": entry["source"],
+                "target": entry["target"],
+                "message_id": entry["message_id"],
+                "forwarded_at": entry["timestamp"],
+                "media_type": entry.get("media_type"),
+                "synced_at": synced_at,
+            }
+            for entry in latest.values()
+        )
+        await db_module.upsert_forwarded_messages(rows, chunk_size=config.SYNC_BATCH_SIZE)
+
+        await mark_synced(chunk[-1]["offset"])
+        synced += len(latest)
+
+
+async def run_maintenance():
+    """Prune old forwarded rows, release free pages and checkpoint the WAL"""
+    removed = await db_module.prune_forwarded_messages(
+        config.FORWARDED_RETENTION_DAYS, config.ARCHIVE_DIR
+    )
+    if removed:
+        print(f"🧹 Pruned {removed} forwarded messages older than {config.FORWARDED_RETENTION_DAYS} days")
+    result = await db_module.compact_db(config.VACUUM_PAGES)
+    if result["free_pages"] and not result["incremental"]:
+        print("⚠️ Free pages cannot be released until an admin runs /vacuum once")
+    if result["checkpoint_busy"]:
+        print("⚠️ WAL checkpoint could not finish, readers were busy")
+
+
+async def sync_to_database():
+    """Background task: sync logged messages to database until stopped.
+
+    Runs every SYNC_INTERVAL seconds, or sooner once SYNC_FLUSH_THRESHOLD
+    entries are waiting in the log. Database maintenance piggybacks on the
+    loop every MAINTENANCE_INTERVAL seconds, starting one interval after the
+    task starts, and only when FORWARDED_RETENTION_DAYS is set.
+    """
+    global _next_maintenance
+    while not _stopping:
         try:
-            unsynced = await get_unsynced_messages()
-
-            if unsynced:
-                for entry in unsynced:
-                    await db_module.upsert_forwarded_message(
-                        user_id=entry["user_id"],
-                        source=entry["source"],
-                        target=entry["target"],
-                        message_id=entry["message_id"],
-                        forwarded_at=entry["timestamp"],
-                        media_type=entry.get("media_type"),
-                        synced_at=datetime.now().isoformat(),
-                    )
-
-                message_ids = [e["message_id"] for e in unsynced]
-                await mark_synced(message_ids)
-                print(f"✅ Synced {len(message_ids)} messages to database")
-
-            # Cleanup old synced messages
+            synced = await sync_pending()
+            if synced:
+                print(f"✅ Synced {synced} messages to database")
+
+            # Drop fully synced log segments
             await cleanup_synced_messages()
 
+            if config.FORWARDED_RETENTION_DAYS > 0 and time.monotonic() >= _next_maintenance:
+                _next_maintenance = time.monotonic() + config.MAINTENANCE_INTERVAL
+                await run_maintenance()
+
         except Exception as e:
             print(f"❌ Sync error: {e}")
 
-        await asyncio.sleep(config.SYNC_INTERVAL)
+        _wakeup.clear()
+        if pending_count() < config.SYNC_FLUSH_THRESHOLD and not _stopping:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=config.SYNC_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def _supervise():
+    """Keep the sync loop alive, restarting it if it ever crashes."""
+    while not _stopping:
+        try:
+            await sync_to_database()
+        except Exception as e:
+            print(f"❌ Sync task crashed: {e}, restarting")
+            await asyncio.sleep(config.SYNC_RESTART_DELAY)
+
+
+def start_sync_task() -> asyncio.Task:
+    """Start the sync loop as a background task on the running event loop"""
+    global _sync_task, _stopping, _next_maintenance
+    if _sync_task is None or _sync_task.done():
+        _stopping = False
+        # Never right at boot, when realtime sessions are starting up
+        _next_maintenance = time.monotonic() + config.MAINTENANCE_INTERVAL
+        on_backlog(config.SYNC_FLUSH_THRESHOLD, _wakeup.set)
+        _sync_task = asyncio.create_task(_supervise())
+    return _sync_task
+
 
+async def stop_sync_task():
+    """Let the current pass finish, then flush whatever is still pending"""
+    global _sync_task, _stopping
+    if _sync_task is None:
+        return
+    _stopping = True
+    _wakeup.set()
+    await _sync_task
+    _sync_task = None
 
-def start_sync_task():
-    """Start the sync background task"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(sync_to_database())
+    synced = await sync_pending()
+    if synced:
+        print(f"✅ Synced {synced} messages to database")
 
 
 async def get_forwarded_message_ids(
@@ -54,6 +151,11 @@ async def is_message_forwarded(
     user_id: int, source: int, target: int, message_id: int
 ) -> bool:
     """Check if a message was already forwarded"""
-    return (
-        await db_module.get_forwarded_message(user_id, source, target, message_id)
-    ) is not None
+    return await dedup_index.contains(user_id, source, target, message_id)
+
+
+async def mark_message_forwarded(
+    user_id: int, source: int, target: int, message_id: int
+):
+    """Record a successful forward in the dedup index"""
+    await dedup_index.add(user_id, source, target, message_id)
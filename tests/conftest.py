@@ -0,0 +1,48 @@
+import os
+import sys
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import db as db_module
+import logger
+from dedup import dedup_index
+from filters import _filter_cache
+from ratelimit import RateLimiter, rate_limiter
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    """Run a coroutine against a fresh database and message log in tmp_path"""
+    monkeypatch.setattr(config, "SQLITE_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setattr(logger, "LOG_DIR", str(tmp_path / "log"))
+    monkeypatch.setattr(logger, "_writer", None)
+    monkeypatch.setattr(logger, "_pending", 0)
+    # Module-level locks and caches must not leak between event loops/tests
+    monkeypatch.setattr(logger, "LOG_LOCK", asyncio.Lock())
+    monkeypatch.setattr(db_module, "_init_lock", asyncio.Lock())
+    monkeypatch.setattr(dedup_index, "_routes", {})
+    monkeypatch.setattr(dedup_index, "_locks", {})
+    monkeypatch.setattr(dedup_index, "_pending", None)
+    fresh_limiter = RateLimiter()
+    for name in ("global_bucket", "_clients", "_targets"):
+        monkeypatch.setattr(rate_limiter, name, getattr(fresh_limiter, name))
+    _filter_cache.clear()
+    db_module._settings_cache.clear()
+
+    def runner(coro):
+        async def main():
+            try:
+                return await coro
+            finally:
+                await db_module.close_db()
+                if logger._writer:
+                    logger._writer.close()
+                    logger._writer = None
+
+        return asyncio.run(main())
+
+    yield runner
+    _filter_cache.clear()
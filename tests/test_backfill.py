@@ -0,0 +1,82 @@
+import asyncio
+from types import SimpleNamespace
+import config
+import db as db_module
+from backfill import backfill_source
+from forwarder import ForwardEngine
+
+MEDIA = ("video", "photo", "document", "audio", "voice", "video_note", "sticker", "animation")
+
+
+def _message(message_id):
+    return SimpleNamespace(
+        id=message_id,
+        empty=False,
+        service=None,
+        media_group_id=None,
+        caption=None,
+        from_user=None,
+        **dict.fromkeys(MEDIA),
+    )
+
+
+class _FakeClient:
+    name = "backfill_1"
+
+    def __init__(self, on_fetch=None):
+        self.fetches = 0
+        self.sent = []
+        self.on_fetch = on_fetch
+
+    async def get_messages(self, chat_id, message_ids):
+        self.fetches += 1
+        if self.on_fetch:
+            await self.on_fetch(self.fetches)
+        return [_message(i) for i in message_ids]
+
+    async def copy_message(self, chat_id, from_chat_id, message_id):
+        self.sent.append(message_id)
+
+    async def forward_messages(self, chat_id, from_chat_id, message_ids, drop_author):
+        self.sent.extend(message_ids)
+
+
+def test_backfill_checkpoints_each_target(run, monkeypatch):
+    monkeypatch.setattr(config, "BACKFILL_PAGE_SIZE", 2)
+
+    async def scenario():
+        client = _FakeClient()
+        engine = ForwardEngine(client, batch_window=0)
+        engine.start()
+        stats = await backfill_source(client, engine, 1, -100, [-200], to_id=5)
+        await engine.stop()
+        checkpoint = await db_module.get_backfill_checkpoint(1, -100, -200)
+        return stats, checkpoint["last_message_id"], client.sent
+
+    stats, last_id, sent = run(scenario())
+    assert (stats["scanned"], stats["failed"], stats["stopped"]) == (5, 0, False)
+    assert last_id == 5
+    assert sorted(sent) == [1, 2, 3, 4, 5]
+
+
+def test_backfill_stops_with_its_engine(run, monkeypatch):
+    monkeypatch.setattr(config, "BACKFILL_PAGE_SIZE", 2)
+
+    async def scenario():
+        async def stop_on_second_page(fetches):
+            if fetches == 2:  # e.g. /realtime off on the shared session
+                await engine.stop()
+
+        client = _FakeClient(stop_on_second_page)
+        engine = ForwardEngine(client, batch_window=0)
+        engine.start()
+        stats = await asyncio.wait_for(
+            backfill_source(client, engine, 1, -100, [-200], to_id=6), 1
+        )
+        checkpoint = await db_module.get_backfill_checkpoint(1, -100, -200)
+        return stats, checkpoint["last_message_id"], client.fetches
+
+    stats, last_id, fetches = run(scenario())
+    assert stats["stopped"] and stats["failed"] == 2
+    assert last_id == 2  # the undelivered page is fetched again next time
+    assert fetches == 2
@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from callbacks import MAX_CALLBACK_DATA, CallbackRouter
+
+
+def _router():
+    router = CallbackRouter()
+    router.define("noop", "n")
+    router.define("filter_page", "fp", int, int)
+    router.define("media_toggle", "mt", str, int)
+    return router
+
+
+def test_pack_unpack_round_trip():
+    router = _router()
+    chat_id = -1001234567890123
+    for name, values in [
+        ("noop", ()),
+        ("filter_page", (2, chat_id)),
+        ("media_toggle", ("video_note", chat_id)),
+    ]:
+        data = router.pack(name, *values)
+        assert len(data.encode()) <= MAX_CALLBACK_DATA
+        route, args = router.unpack(data)
+        assert (route.name, args) == (name, values)
+
+
+def test_ints_are_packed_compactly():
+    assert _router().pack("filter_page", 0, -1001234567890123) == "fp:0:-9uwot6m097"
+
+
+def test_pack_rejects_bad_input():
+    router = _router()
+    with pytest.raises(ValueError):
+        router.pack("filter_page", 1)  # missing field
+    with pytest.raises(ValueError):
+        router.pack("media_toggle", "a:b", 1)  # separator in a field
+    with pytest.raises(ValueError):
+        router.pack("media_toggle", "x" * MAX_CALLBACK_DATA, 1)
+    with pytest.raises(ValueError):
+        router.define("other", "fp")  # duplicate code
+
+
+def test_unpack_unknown_or_malformed_data():
+    router = _router()
+    for data in ("", "zz:1", "fp:1", "fp:1:2:3", "fp:1:!"):
+        assert router.unpack(data) == (None, ())
+
+
+def test_dispatch_calls_handler_and_records_stats():
+    router = _router()
+    calls = []
+
+    @router.route("target_view", "tv", int)
+    async def target_view(client, callback_query, user_id, target_id):
+        calls.append((user_id, target_id))
+
+    class Query:
+        def __init__(self, data):
+            self.data = data
+            self.from_user = SimpleNamespace(id=7)
+            self.answered = False
+
+        async def answer(self):
+            self.answered = True
+
+    async def scenario():
+        await router.dispatch(None, Query(router.pack("target_view", -100)))
+        unknown = Query("nope")
+        await router.dispatch(None, unknown)
+        return unknown.answered
+
+    assert asyncio.run(scenario()) is True
+    assert calls == [(7, -100)]
+    assert router.stats()["target_view"]["calls"] == 1
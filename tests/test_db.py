@@ -0,0 +1,137 @@
+import sqlite3
+import config
+import db as db_module
+
+# Schema of the original release, before versioned migrations existed
+BASELINE_SCHEMA = """
+CREATE TABLE users (
+    user_id INTEGER PRIMARY KEY,
+    session_string TEXT,
+    default_min_duration INTEGER DEFAULT 0,
+    default_max_duration INTEGER
+);
+CREATE TABLE targets (
+    user_id INTEGER NOT NULL,
+    target_chat_id INTEGER NOT NULL,
+    name TEXT,
+    enabled INTEGER DEFAULT 1,
+    PRIMARY KEY (user_id, target_chat_id)
+);
+CREATE TABLE sources (
+    user_id INTEGER NOT NULL,
+    source_chat_id INTEGER NOT NULL,
+    target_chat_id INTEGER NOT NULL,
+    enabled INTEGER DEFAULT 1,
+    PRIMARY KEY (user_id, source_chat_id)
+);
+CREATE TABLE filters (
+    user_id INTEGER NOT NULL,
+    source_chat_id INTEGER NOT NULL,
+    media_types TEXT DEFAULT '["all"]',
+    min_duration INTEGER DEFAULT 0,
+    max_duration INTEGER,
+    dc_ids TEXT DEFAULT '[]',
+    enabled INTEGER DEFAULT 1,
+    remove_caption INTEGER DEFAULT 0,
+    remove_forward_header INTEGER DEFAULT 0,
+    min_file_size INTEGER DEFAULT 0,
+    max_file_size INTEGER,
+    require_caption INTEGER DEFAULT 0,
+    require_hashtags INTEGER DEFAULT 0,
+    block_list TEXT DEFAULT '[]',
+    only_from_users TEXT DEFAULT '[]',
+    block_from_users TEXT DEFAULT '[]',
+    PRIMARY KEY (user_id, source_chat_id)
+);
+CREATE TABLE settings (
+    key TEXT PRIMARY KEY,
+    enabled INTEGER DEFAULT 0
+);
+CREATE TABLE forwarded_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    source INTEGER NOT NULL,
+    target INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    forwarded_at TEXT,
+    media_type TEXT,
+    synced_at TEXT,
+    UNIQUE(user_id, source, target, message_id)
+);
+INSERT INTO targets (user_id, target_chat_id, name) VALUES (1, -200, 'main');
+INSERT INTO sources (user_id, source_chat_id, target_chat_id) VALUES (1, -100, -200);
+INSERT INTO filters (user_id, source_chat_id, media_types, min_duration)
+    VALUES (1, -100, '["video"]', 60);
+INSERT INTO forwarded_messages (user_id, source, target, message_id, forwarded_at, media_type)
+    VALUES (1, -100, -200, 1, '2026-01-01T10:00:00', 'video'),
+           (1, -100, -200, 2, '2026-01-01T11:00:00', 'video'),
+           (1, -100, -200, 3, '2026-01-02T10:00:00', 'photo');
+"""
+
+
+def _baseline_db():
+    conn = sqlite3.connect(config.SQLITE_PATH)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.close()
+
+
+def test_migrations_upgrade_a_baseline_database(run):
+    _baseline_db()
+
+    async def upgrade():
+        conn = await db_module.get_db()
+        cursor = await conn.execute("PRAGMA user_version")
+        return (await cursor.fetchone())[0]
+
+    assert run(upgrade()) == len(db_module._MIGRATIONS)
+
+    conn = sqlite3.connect(config.SQLITE_PATH)
+    try:
+        indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"idx_forwarded_user_media", "idx_forwarded_user_target",
+                "idx_sources_target", "idx_forwarded_at"} <= indexes
+
+        # 2: the rollup is seeded from existing rows
+        assert conn.execute(
+            """SELECT media_type, SUM(count) FROM forwarded_stats
+               GROUP BY media_type ORDER BY media_type"""
+        ).fetchall() == [("photo", 1), ("video", 2)]
+
+        # 4: old rows survive the rebuilds, filters become source-wide
+        assert conn.execute("SELECT * FROM sources").fetchall() == [(1, -100, -200, 1)]
+        assert conn.execute(
+            "SELECT source_chat_id, target_chat_id, media_types, min_duration FROM filters"
+        ).fetchall() == [(-100, 0, '["video"]', 60)]
+        # ...and a source may now feed a second target
+        conn.execute("INSERT INTO sources (user_id, source_chat_id, target_chat_id) VALUES (1, -100, -300)")
+    finally:
+        conn.close()
+
+
+def test_migrations_are_not_reapplied(run):
+    _baseline_db()
+
+    async def open_twice():
+        await db_module.get_db()
+        await db_module.close_db()
+        conn = await db_module.get_db()
+        cursor = await conn.execute("SELECT SUM(count) FROM forwarded_stats")
+        return (await cursor.fetchone())[0]
+
+    assert run(open_twice()) == 3  # seeded once, not doubled
+
+
+def test_stats_triggers_follow_inserts_and_updates(run):
+    async def scenario():
+        await db_module.upsert_forwarded_messages(
+            {"user_id": 1, "source": -100, "target": -200, "message_id": i,
+             "forwarded_at": "2026-01-01T00:00:00", "media_type": "video"}
+            for i in range(5)
+        )
+        # Re-syncing a row with another media type moves it between groups
+        await db_module.upsert_forwarded_message(
+            1, -100, -200, 0, forwarded_at="2026-01-01T00:00:00", media_type="photo"
+        )
+        return await db_module.count_forwarded_by(1, "media_type")
+
+    assert run(scenario()) == {"video": 4, "photo": 1}
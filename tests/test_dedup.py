@@ -0,0 +1,48 @@
+import db as db_module
+import logger
+from dedup import DedupIndex
+
+ROUTE = (1, -100, -200)
+
+
+async def _forwarded(message_ids):
+    await db_module.upsert_forwarded_messages(
+        {"user_id": 1, "source": -100, "target": -200, "message_id": i} for i in message_ids
+    )
+
+
+def test_full_window_answers_old_ids_from_db(run):
+    async def scenario():
+        await _forwarded(range(10, 21))
+        index = DedupIndex(window=3)
+        route = await index.warm(*ROUTE)
+        assert route.low == 18
+        return [await index.contains(*ROUTE, i) for i in (12, 19, 21, 5)]
+
+    assert run(scenario()) == [True, True, False, False]
+
+
+def test_pending_ids_below_full_window(run):
+    async def scenario():
+        await _forwarded(range(10, 21))
+        # Logged but not yet synced, and older than the DB window
+        await logger.log_message(*ROUTE, 2)
+        index = DedupIndex(window=3)
+        await index.warm(*ROUTE)
+        return await index.contains(*ROUTE, 2), await index.contains(*ROUTE, 3)
+
+    assert run(scenario()) == (True, False)
+
+
+def test_add_and_trim(run):
+    async def scenario():
+        index = DedupIndex(window=2)
+        for i in range(1, 6):
+            await index.add(*ROUTE, i)
+        route = await index.warm(*ROUTE)
+        return sorted(route.ids), route.high, await index.contains(*ROUTE, 6)
+
+    ids, high, contains_new = run(scenario())
+    assert high == 5
+    assert ids[-1] == 5 and len(ids) <= 4
+    assert contains_new is False
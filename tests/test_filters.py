@@ -0,0 +1,113 @@
+import pytest
+from filters import FilterConfig, MediaType, SourceConfig, TargetConfig
+
+
+async def _topology():
+    """Source -100 feeds targets -200 and -300, source -101 feeds -200 only."""
+    for target_id in (-200, -300):
+        await TargetConfig(1, target_id).save()
+    for source_id, target_id in ((-100, -200), (-100, -300), (-101, -200)):
+        await SourceConfig(1, source_id, target_id).save()
+    await FilterConfig(1, -100, media_types=[MediaType.VIDEO], min_duration=60).save()
+
+
+def _summary(filter_config):
+    return (
+        filter_config.target_chat_id,
+        [m.value for m in filter_config.media_types],
+        filter_config.min_duration,
+    )
+
+
+def test_bulk_update_all_writes_source_wide_rows_once(run):
+    async def scenario():
+        await _topology()
+        updated = await FilterConfig.bulk_update(1, min_duration=5)
+        return updated, [
+            _summary(await FilterConfig.get(1, source_id, target_id))
+            for source_id, target_id in ((-100, -200), (-100, -300), (-101, -200))
+        ]
+
+    updated, filters = run(scenario())
+    assert updated == 2  # one row per source, not per edge
+    assert filters == [(0, ["video"], 5), (0, ["video"], 5), (0, ["all"], 5)]
+
+
+def test_bulk_update_target_writes_only_its_edges(run):
+    async def scenario():
+        await _topology()
+        updated = await FilterConfig.bulk_update(1, -200, media_types=[MediaType.PHOTO])
+        return updated, [
+            _summary(await FilterConfig.get(1, source_id, target_id))
+            for source_id, target_id in ((-100, -200), (-100, -300), (-101, -200))
+        ]
+
+    updated, filters = run(scenario())
+    assert updated == 2
+    assert filters == [
+        (-200, ["photo"], 60),  # copied from the source-wide filter, then updated
+        (0, ["video"], 60),  # the source's other target is untouched
+        (-200, ["photo"], 0),  # no source-wide filter: defaults, then updated
+    ]
+
+
+def test_bulk_update_target_updates_existing_edge_override(run):
+    async def scenario():
+        await _topology()
+        edge = (await FilterConfig.get(1, -100, -200)).copy()
+        edge.target_chat_id = -200
+        edge.require_caption = True
+        await edge.save()
+        await FilterConfig.bulk_update(1, -200, min_duration=10)
+        result = await FilterConfig.get(1, -100, -200)
+        return result.min_duration, result.require_caption
+
+    assert run(scenario()) == (10, True)
+
+
+def test_bulk_update_rejects_unknown_fields(run):
+    with pytest.raises(ValueError):
+        run(FilterConfig.bulk_update(1, colour="red"))
+
+
+def test_get_returns_a_shared_instance_and_copy_is_independent(run):
+    async def scenario():
+        await _topology()
+        shared = await FilterConfig.get(1, -100)
+        edited = shared.copy()
+        edited.media_types.append(MediaType.PHOTO)
+        return shared is await FilterConfig.get(1, -100), shared.media_types
+
+    same, media_types = run(scenario())
+    assert same and media_types == [MediaType.VIDEO]
+
+
+def test_get_all_with_sources_pages_targets_in_insertion_order(run):
+    async def scenario():
+        await _topology()
+        await TargetConfig(1, -150).save()
+        await TargetConfig(1, -200, name="renamed").save()  # keeps its position
+        page = await TargetConfig.get_all_with_sources(1, limit=2, offset=1)
+        return await TargetConfig.count(1), [
+            (target.target_chat_id, [(s.source_chat_id, f.target_chat_id) for s, f in sources])
+            for target, sources in page
+        ]
+
+    count, page = run(scenario())
+    assert count == 3
+    assert page == [(-300, [(-100, 0)]), (-150, [])]
+
+
+def test_reset_overrides_returns_edges_to_the_source_wide_filter(run):
+    async def scenario():
+        await _topology()
+        await FilterConfig.bulk_update(1, -200, min_duration=1)
+        before = await FilterConfig.get_overrides(1)
+        dropped = await FilterConfig.reset_overrides(1, source_chat_id=-100)
+        after = await FilterConfig.get_overrides(1)
+        return before, dropped, after, _summary(await FilterConfig.get(1, -100, -200))
+
+    before, dropped, after, edge = run(scenario())
+    assert before == [(-100, -200), (-101, -200)]
+    assert dropped == 1 and after == [(-101, -200)]
+    assert edge == (0, ["video"], 60)
@@ -0,0 +1,158 @@
+import asyncio
+from collections import deque
+from types import SimpleNamespace
+from forwarder import ForwardEngine, ForwardJob
+
+
+def _message(message_id, group=None):
+    return SimpleNamespace(
+        id=message_id,
+        media_group_id=group,
+        video=None,
+        photo=None,
+        document=None,
+        audio=None,
+    )
+
+
+def _batch_ids(engine, jobs):
+    async def take():
+        queue = deque(
+            ForwardJob(1, source, -200, _message(message_id, group))
+            for message_id, group, source in jobs
+        )
+        return [job.message.id for job in engine._take_batch(queue)]
+
+    return asyncio.run(take())
+
+
+def test_batch_stops_at_size_and_source():
+    engine = ForwardEngine(None, batch_size=3)
+    assert _batch_ids(engine, [(i, None, -100) for i in range(1, 6)]) == [1, 2, 3]
+    assert _batch_ids(engine, [(1, None, -100), (2, None, -101)]) == [1]
+
+
+def test_album_cut_by_size_waits_for_next_request():
+    engine = ForwardEngine(None, batch_size=3)
+    jobs = [(1, None, -100), (2, "a", -100), (3, "a", -100), (4, "a", -100)]
+    assert _batch_ids(engine, jobs) == [1]
+
+
+def test_album_larger_than_batch_size_is_sent_whole():
+    engine = ForwardEngine(None, batch_size=2)
+    jobs = [(1, "a", -100), (2, "a", -100), (3, "a", -100), (4, "a", -100), (5, None, -100)]
+    assert _batch_ids(engine, jobs) == [1, 2, 3, 4]
+
+
+def test_album_of_another_source_is_not_joined():
+    engine = ForwardEngine(None, batch_size=2)
+    jobs = [(1, "a", -100), (2, "a", -100), (3, "a", -101)]
+    assert _batch_ids(engine, jobs) == [1, 2]
+
+
+class _FakeClient:
+    name = "test"
+
+    def __init__(self, fail_ids=()):
+        self.requests = []
+        self.fail_ids = set(fail_ids)
+
+    async def copy_message(self, chat_id, from_chat_id, message_id):
+        await self.forward_messages(chat_id, from_chat_id, [message_id], True)
+
+    async def forward_messages(self, chat_id, from_chat_id, message_ids, drop_author):
+        if self.fail_ids.intersection(message_ids):
+            raise RuntimeError("forward failed")
+        self.requests.append(list(message_ids))
+
+
+def test_engine_batches_a_burst_and_resolves_jobs(run):
+    async def scenario():
+        client = _FakeClient(fail_ids={6})
+        engine = ForwardEngine(client, workers=1, batch_size=5, batch_window=0.05)
+        engine.start()
+        jobs = [ForwardJob(1, -100, -200, _message(i)) for i in range(1, 7)]
+        for job in jobs:
+            await engine.submit(job)
+        results = [await job.done for job in jobs]
+        await engine.stop()
+        return client.requests, results
+
+    requests, results = run(scenario())
+    assert requests == [[1, 2, 3, 4, 5]]
+    assert results == [True] * 5 + [False]
+
+
+def test_duplicate_jobs_in_one_batch_are_sent_once(run):
+    async def scenario():
+        client = _FakeClient()
+        engine = ForwardEngine(client, workers=1, batch_size=5, batch_window=0.05)
+        engine.start()
+        # Backfill and realtime queued message 1 on the same engine
+        jobs = [ForwardJob(1, -100, -200, _message(i)) for i in (1, 1, 2)]
+        for job in jobs:
+            await engine.submit(job)
+        results = [await job.done for job in jobs]
+        await engine.stop()
+        return client.requests, results
+
+    requests, results = run(scenario())
+    assert requests == [[1, 2]]
+    assert results == [True, True, True]
+
+
+def test_album_parts_arriving_staggered_are_sent_together(run):
+    async def scenario():
+        client = _FakeClient()
+        engine = ForwardEngine(client, workers=1, batch_size=5, batch_window=0, album_window=0.2)
+        engine.start()
+        jobs = [ForwardJob(1, -100, -200, _message(1))]
+        await engine.submit(jobs[0])
+        # Realtime updates bring each album part on its own
+        for i in (2, 3, 4):
+            await asyncio.sleep(0.05)
+            jobs.append(ForwardJob(1, -100, -200, _message(i, "a")))
+            await engine.submit(jobs[-1])
+        results = [await job.done for job in jobs]
+        await engine.stop()
+        return client.requests, results
+
+    requests, results = run(scenario())
+    assert requests == [[1], [2, 3, 4]]
+    assert results == [True] * 4
+
+
+def test_album_followed_by_a_newer_message_is_not_held(run):
+    async def scenario():
+        client = _FakeClient()
+        engine = ForwardEngine(client, workers=1, batch_size=5, batch_window=0, album_window=60)
+        engine.start()
+        jobs = [ForwardJob(1, -100, -200, _message(i, "a")) for i in (1, 2)]
+        jobs.append(ForwardJob(1, -100, -200, _message(3)))
+        for job in jobs:
+            await engine.submit(job)
+        await asyncio.wait_for(asyncio.gather(*(job.done for job in jobs)), 1)
+        await engine.stop()
+        return client.requests
+
+    assert run(scenario()) == [[1, 2, 3]]
+
+
+def test_jobs_submitted_after_stop_resolve_as_not_delivered(run):
+    async def scenario():
+        client = _FakeClient()
+        engine = ForwardEngine(client, workers=1, max_pending=1, batch_window=60)
+        engine.start()
+        parked = ForwardJob(1, -100, -200, _message(1))
+        await engine.submit(parked)
+        # The queue is full, so this submit waits for a slot
+        blocked = ForwardJob(1, -100, -200, _message(2))
+        blocked_submit = asyncio.create_task(engine.submit(blocked))
+        await asyncio.sleep(0)
+        await engine.stop(timeout=0.05)
+        late = ForwardJob(1, -100, -200, _message(3))
+        await engine.submit(late)
+        await asyncio.wait_for(blocked_submit, 1)
+        return [await job.done for job in (parked, blocked, late)], engine.pending()
+
+    assert run(scenario()) == ([False, False, False], 0)